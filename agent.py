@@ -2,11 +2,31 @@
 
 import logging
 import os
-from anthropic import Anthropic
-from utensils import get_utensils_system_prompt, execute_utensil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+from utensils import REGISTRY, get_tools_system_prompt, get_utensils_system_prompt, execute_utensil
+from registry import CALL_ERRORS, PARALLEL
 from streaming_parser import StreamingUtensilParser
+from tool_use import ToolUseParser
 from colors import Colors
 from model_manager import ModelManager
+from client import get_client
+from metrics import Metrics, MetricsObserver
+from events import EventBus
+from history import elide_stale_results, result_block, tool_result_block
+from generation import GenerationControl, GenerationSavings
+from prefetch import Prefetcher
+from hedging import HedgedStream, open_hedged_stream
+from router import ModelRouter
+from retry import RetryPolicy
+from ratelimit import Priority, estimate_input_tokens, get_rate_limiter
+from edits import EditCompactor
+from journal import DEFAULT_DIRECTORY as JOURNAL_DIRECTORY, blob_directory
+from output_filter import OutputPolicy, compressing
+from pyworkers import get_pool
+from retrieval import format_hits, get_index
+from subagents import TokenBudget, acting_for
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
@@ -19,27 +39,164 @@ if not logger.handlers:
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
+# How the model calls utensils: the UTENSIL: text format parsed from the stream, or native tool use
+UTENSILS_PROTOCOL = "utensils"
+TOOLS_PROTOCOL = "tools"
+PROTOCOLS = (UTENSILS_PROTOCOL, TOOLS_PROTOCOL)
+
 
 class Agent:
-    def __init__(self):
-        """Initialize the agent with an Anthropic client."""
-        api_key = os.environ.get("ANTHROPIC_API_KEY")
-        if not api_key:
-            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+    def __init__(self, model_manager: Optional[ModelManager] = None, metrics: Optional[Metrics] = None):
+        """
+        Initialize the agent with the shared Anthropic client.
 
-        self.client = Anthropic(api_key=api_key)
+        Args:
+            model_manager: Model settings to share with another agent (default: load config.toml)
+            metrics: Metrics registry to share with another agent
+        """
+        owns_config = model_manager is None
+        self.model_manager = model_manager or ModelManager()
+        # One client (and connection pool) is shared by every component in the process;
+        # it is created on first use so startup does not wait for the SDK import
+        self._client = None
         self.message_history = []
-        self.model_manager = ModelManager()
         self.model = self.model_manager.get_current_model()
+        self.events = EventBus()
+        self.metrics = metrics or Metrics()
+        self.metrics_config = self.model_manager.config.get("metrics", {})
+        self.events.attach(MetricsObserver(self.metrics))
+        self.router = ModelRouter(self.model_manager, self.metrics,
+                                  self.model_manager.config.get("routing", {}))
+        self.events.attach(self.router)
+        self.retry_policy = RetryPolicy.from_config(self.model_manager.config.get("retry", {}))
+        # Shared with every other session and /compact in this process
+        self.rate_limiter = get_rate_limiter(self.model_manager.config.get("rate_limit", {}))
+        self.priority = Priority.INTERACTIVE
+        # Sub-agent settings: nesting level, console output and an optional token limit
+        self.depth = 0
+        self.quiet = False
+        self.token_budget: Optional[TokenBudget] = None
+        self.elision_config = self.model_manager.config.get("elision", {})
+        self.generation = GenerationControl.from_config(self.model_manager.config.get("generation", {}))
+        self.turn_savings = GenerationSavings()
+        prefetch_config = self.model_manager.config.get("prefetch", {})
+        self.prefetcher = (
+            Prefetcher(execute_utensil, max_workers=prefetch_config.get("max_workers", 4))
+            if prefetch_config.get("enabled", True) else None
+        )
+        for name, target in self.model_manager.config.get("utensils", {}).get("plugins", {}).items():
+            REGISTRY.add_plugin(name, target)
+        # Configures the shared worker pool without starting it; the REPL starts it in the background
+        # once its prompt is shown ([python] prestart), otherwise it starts when run_python is first used
+        get_pool(self.model_manager.config.get("python", {}))
+        self.retrieval_config = self.model_manager.config.get("retrieval", {})
+        # Configures the shared workspace index; it is loaded and updated on first use
+        get_index(".", self.retrieval_config)
+        protocol_config = self.model_manager.config.get("protocol", {})
+        self.protocol = protocol_config.get("backend", UTENSILS_PROTOCOL)
+        if self.protocol not in PROTOCOLS:
+            logger.warning(f"Unknown protocol backend '{self.protocol}', using '{UTENSILS_PROTOCOL}'")
+            self.protocol = UTENSILS_PROTOCOL
+        self.parallel_calls = protocol_config.get("parallel_calls", True)
+        self.max_parallel_calls = protocol_config.get("max_parallel_calls", 8)
+        self.output_policy = OutputPolicy.from_config(self.model_manager.config.get("output", {}))
+        journal_config = self.model_manager.config.get("journal", {})
+        self.blob_directory = blob_directory(journal_config.get("directory", JOURNAL_DIRECTORY))
+        self.edit_compactor = EditCompactor.from_config(self.model_manager.config.get("edits", {}),
+                                                        self.blob_directory)
+        # Built on first use and rebuilt after a model switch
+        self._system_prompt = None
+        if owns_config:
+            self.model_manager.on_reload(self._on_config_reload)
+
+    @property
+    def client(self):
+        """The shared Anthropic client, created (and the SDK imported) on first access."""
+        if self._client is None:
+            self._client = get_client(self.model_manager.config.get("client", {}))
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def spawn_child(self, token_budget: int = 0) -> "Agent":
+        """
+        Create a sub-agent with its own history.
+
+        It shares this agent's client, model settings and metrics, and like every
+        agent in the process the rate limiter and utensil caches. Its requests
+        run at bulk priority and its output is not printed.
+
+        Args:
+            token_budget: Tokens the child may use before it is stopped (0 for no limit)
+        """
+        child = Agent(model_manager=self.model_manager, metrics=self.metrics)
+        child.client = self.client
+        child.model = self.model
+        child.protocol = self.protocol
+        child.depth = self.depth + 1
+        child.priority = Priority.BULK
+        child.quiet = True
+        # The parent exports the shared metrics
+        child.metrics_config = {}
+        child.token_budget = TokenBudget(token_budget)
+        child.events.attach(child.token_budget)
+        return child
+
+    def _print(self, *args, **kwargs):
+        if not self.quiet:
+            print(*args, **kwargs)
+
+    @property
+    def system_prompt(self) -> str:
+        """The system prompt for the current model, built on first use."""
+        if self._system_prompt is None:
+            self._system_prompt = self._build_system_prompt()
+            logger.debug("System prompt built")
+        return self._system_prompt
+
+    def _on_config_reload(self, manager):
+        """Pick up a reloaded config.toml: current model, routing and the system prompt."""
+        self.model = manager.get_current_model()
+        self.router.configure(manager.config.get("routing", {}))
+        self._system_prompt = None
+        self.events.emit("on_config_reload", model=self.model)
+
+    @property
+    def native_tools(self) -> bool:
+        """Whether utensils are offered as native tools rather than the UTENSIL: text format."""
+        return self.protocol == TOOLS_PROTOCOL
+
+    def set_protocol(self, protocol: str) -> bool:
+        """
+        Switch between the "utensils" and "tools" protocols.
 
-        # Load system prompt at initialization so it's always available before user's first message
-        self.system_prompt = self._build_system_prompt()
-        logger.debug("System prompt loaded during agent initialization")
+        The two protocols store calls differently in the history, so a switch
+        with a non-empty history starts a new conversation.
+
+        Returns:
+            True if successful, False if the protocol is unknown
+        """
+        if protocol not in PROTOCOLS:
+            return False
+        if protocol != self.protocol:
+            self.protocol = protocol
+            self._system_prompt = None
+            if self.message_history:
+                self.reset()
+            self.events.emit("on_protocol_change", protocol=protocol)
+        return True
+
+    def _new_parser(self):
+        """A parser for one response in the current protocol."""
+        on_param = self.prefetcher.on_param if self.prefetcher else None
+        return ToolUseParser(on_param=on_param) if self.native_tools else StreamingUtensilParser(on_param=on_param)
 
     def _build_system_prompt(self) -> str:
         """Build the full system prompt with orientation context and utensil instructions."""
         cwd = os.getcwd()
-        utensil_prompt = get_utensils_system_prompt()
+        utensil_prompt = get_tools_system_prompt() if self.native_tools else get_utensils_system_prompt()
         orientation = f"""You are an interactive coding agent. You help the user complete software engineering tasks.
 
 Current working directory: {cwd}
@@ -63,87 +220,438 @@ When you start a new conversation, briefly orient yourself by reading relevant f
         Returns:
             The final response from Claude
         """
-        # Add user prompt to conversation history
-        # System prompt is already loaded in __init__ and will be used for all messages
-        self.message_history.append(
-            {"role": "user", "content": user_prompt}
+        # Add user prompt to conversation history, with relevant workspace excerpts on the first turn
+        content = user_prompt
+        if not self.message_history and self.retrieval_config.get("attach_on_first_turn", False):
+            content = self._with_retrieved_context(user_prompt)
+        self._append_message({"role": "user", "content": content})
+
+        self._print(f"\n{Colors.separator('='*60)}")
+        self._print(f"User: {user_prompt}")
+        self._print(f"{'='*60}\n")
+
+        self.events.emit("on_turn_start", prompt=user_prompt)
+        self.turn_savings = GenerationSavings()
+        turn_start = time.perf_counter()
+        final_response = None
+        try:
+            final_response = self._agentic_loop()
+            return final_response
+        finally:
+            self.events.emit("on_turn_end", response=final_response,
+                             seconds=time.perf_counter() - turn_start)
+            self._export_metrics()
+
+    def _with_retrieved_context(self, user_prompt: str) -> str:
+        """Append the workspace chunks that best match the prompt, so the model need not search for them."""
+        try:
+            hits = get_index().retrieve(user_prompt, self.retrieval_config.get("attach_top_k", 3))
+        except OSError as e:
+            logger.debug(f"Could not retrieve context: {e}")
+            return user_prompt
+        hits = [hit for hit in hits if hit.score >= self.retrieval_config.get("attach_min_score", 2.0)]
+        if not hits:
+            return user_prompt
+        excerpts = format_hits(hits, self.retrieval_config.get("attach_max_chars", 6000))
+        return (f"{user_prompt}\n\n[Workspace excerpts retrieved automatically for this request; they may "
+                f"not all be relevant. Use retrieve or read_file for more.]\n{excerpts}")
+
+    def _agentic_loop(self) -> str:
+        """Stream requests and execute utensils until the agent stops calling them."""
+        while True:
+            if self.token_budget is not None:
+                self.token_budget.check()
+            try:
+                parser = self._stream_request()
+                return_value = self._handle_response(parser)
+            finally:
+                # Prefetches for calls that never completed or were never used are discarded
+                if self.prefetcher:
+                    self.prefetcher.clear()
+            if return_value is not None:
+                return return_value
+
+    def _handle_response(self, parser) -> Optional[str]:
+        """
+        Execute the utensil calls of one response, or finish the turn.
+
+        Returns:
+            The final response text if the agent is done, None to keep looping
+        """
+        # Check if there are utensil calls to execute
+        if parser.has_utensil_call():
+            utensil_calls = parser.get_all_utensil_calls()
+            logger.debug(f"Detected {len(utensil_calls)} utensil call(s)")
+
+            # Execute the utensils, keeping each edited file's prior state for a compact history entry
+            outcomes = self._execute_calls(utensil_calls)
+            if self.native_tools:
+                self._append_tool_use(parser.get_text(), utensil_calls, outcomes)
+                return None
+
+            results = []
+            history_texts = []
+            for utensil_call, (before, result) in zip(utensil_calls, outcomes):
+                results.append(result_block(utensil_call["name"], result))
+                history_texts.append(
+                    self.edit_compactor.compact(utensil_call, before, result)
+                    if self.edit_compactor else utensil_call["text"])
+
+            # Build the full assistant response (text + all utensil calls); file bodies
+            # written by edits are stored as diffs or hashes rather than resent every request
+            assistant_text = parser.get_text()
+            if assistant_text:
+                full_response = assistant_text + \
+                    "\n\n" + "\n\n".join(history_texts)
+            else:
+                full_response = "\n\n".join(history_texts)
+
+            # Add assistant message with all utensil calls to history
+            self._append_message({
+                "role": "assistant",
+                "content": full_response
+            })
+
+            # Add results as a user message, one text block per utensil call
+            self._append_message({
+                "role": "user",
+                "content": results
+            })
+
+            # Continue the agentic loop
+            return None
+
+        # No utensil call - agent is done
+        final_response = parser.get_text()
+
+        if final_response:
+            self._print(f"\nAgent: {final_response}\n")
+
+        if self.turn_savings.tokens:
+            self._print(Colors.separator(
+                f"✂️  Stopped invented results early: ~{self.turn_savings.tokens} output tokens, "
+                f"~{self.turn_savings.seconds:.1f}s saved this turn\n"))
+
+        return final_response
+
+    def _execute_calls(self, calls: list) -> List[Tuple[Optional[str], str]]:
+        """
+        Execute one response's utensil calls.
+
+        Consecutive calls to PARALLEL utensils run concurrently, up to
+        ``max_parallel_calls`` at a time; any other call runs alone, after
+        every call before it has finished.
+
+        Returns:
+            (content of the edited file before the call, result) for each call, in order
+        """
+        outcomes: List[Optional[Tuple[Optional[str], str]]] = [None] * len(calls)
+        batch: List[int] = []
+
+        def run(i: int):
+            name, params = calls[i]["name"], calls[i]["params"]
+            before = self.edit_compactor.before(name, params) if self.edit_compactor else None
+            outcomes[i] = (before, self._execute_utensil(name, params))
+
+        def run_batch():
+            if len(batch) > 1:
+                with ThreadPoolExecutor(max_workers=min(len(batch), self.max_parallel_calls)) as executor:
+                    list(executor.map(run, batch))
+            elif batch:
+                run(batch[0])
+            batch.clear()
+
+        for i, call in enumerate(calls):
+            utensil = REGISTRY.get(call["name"])
+            parallel = self.parallel_calls and utensil is not None and utensil.concurrency == PARALLEL
+            if not parallel:
+                run_batch()
+            self._print(
+                f"{Colors.utensil('🔧 Utensil Call:')} {Colors.BOLD}{call['name']}{Colors.RESET}")
+            self._print(f"Parameters: {call['params']}")
+            if parallel:
+                batch.append(i)
+            else:
+                run(i)
+        run_batch()
+        return outcomes
+
+    def _append_tool_use(self, text: str, calls: list, outcomes: list):
+        """Add a native tool use response and its tool_result blocks to the history."""
+        content = [{"type": "text", "text": text}] if text else []
+        for call, (before, result) in zip(calls, outcomes):
+            params = self.edit_compactor.compact_params(call, before, result) if self.edit_compactor else None
+            content.append({"type": "tool_use", "id": call["id"], "name": call["name"],
+                            "input": params if params is not None else call["params"]})
+        self._append_message({"role": "assistant", "content": content})
+        self._append_message({
+            "role": "user",
+            "content": [tool_result_block(call["id"], result) for call, (_, result) in zip(calls, outcomes)],
+        })
+
+    def _append_message(self, message: dict):
+        """Append a message to the history and notify observers."""
+        self.message_history.append(message)
+        self.events.emit("on_message", message=message)
+
+    def replace_history(self, history: list):
+        """Replace the message history wholesale (e.g. after compaction or resume)."""
+        self.message_history = history
+        self.events.emit("on_history_reset", history=history)
+
+    def _request_messages(self) -> list:
+        """Return the messages to send, with stale utensil results elided if enabled."""
+        config = self.elision_config
+        if not config.get("enabled", True):
+            return self.message_history
+        return elide_stale_results(
+            self.message_history,
+            max_age_turns=config.get("max_age_turns", 4),
+            min_chars=config.get("min_chars", 200),
         )
 
-        print(f"\n{Colors.separator('='*60)}")
-        print(f"User: {user_prompt}")
-        print(f"{'='*60}\n")
+    def _stream_request(self) -> StreamingUtensilParser:
+        """
+        Send one streaming request and feed every token through a fresh parser.
+
+        Emits request, first-token, token and utensil-parsed events along the way,
+        and an ``on_request_end`` event carrying the timings and token usage.
+        Transient errors are retried with backoff; if the stream broke mid-response,
+        the retry resends the partial text as an assistant prefill and continues it.
 
-        # Agentic loop
+        Returns:
+            The finalized parser for this response
+        """
+        events = self.events
+        want_tokens = events.wants("on_token")
+        want_parsed = events.wants("on_utensil_parsed")
+        parser = self._new_parser()
+        parser_seconds = 0.0
+        first_token_at = None
+        parsed_count = 0
+
+        messages = self._request_messages()
+        decision = self.router.choose(messages)
+        request = {
+            "model": decision.model,
+            "max_tokens": 4096,
+            "system": self.system_prompt,
+            "messages": messages,
+        }
+        if self.native_tools:
+            request["tools"] = REGISTRY.tool_definitions()
+        else:
+            stop_sequences = self.generation.stop_sequences()
+            if stop_sequences:
+                request["stop_sequences"] = stop_sequences
+        cancelled = False
+
+        events.emit("on_request_start", model=decision.model, messages=messages)
+        input_estimate = estimate_input_tokens(request)
+        rate_limit_wait = 0.0
+        received = ""
+        attempt = 0
         while True:
-            # Create streaming request using the pre-loaded system prompt
-            with self.client.messages.stream(
-                model=self.model,
-                max_tokens=4096,
-                system=self.system_prompt,
-                messages=self.message_history
-            ) as stream:
-                # Initialize parser for this stream
-                parser = StreamingUtensilParser()
-
-                # Process all tokens - no early break, collect all utensil calls
-                for token in stream.text_stream:
-                    parser.add_token(token)
-
-            # Finalize parser to process any remaining tokens (handles END_UTENSIL without trailing newline)
-            parser.finalize()
-
-            # Check if there are utensil calls to execute
-            if parser.has_utensil_call():
-                utensil_calls = parser.get_all_utensil_calls()
-                logger.debug(f"Detected {len(utensil_calls)} utensil call(s)")
-
-                # Build the full assistant response (text + all utensil calls)
-                assistant_text = parser.get_text()
-                utensil_texts = [call["text"] for call in utensil_calls]
-
-                if assistant_text:
-                    full_response = assistant_text + \
-                        "\n\n" + "\n\n".join(utensil_texts)
-                else:
-                    full_response = "\n\n".join(utensil_texts)
-
-                # Add assistant message with all utensil calls to history
-                self.message_history.append({
-                    "role": "assistant",
-                    "content": full_response
-                })
-
-                # Execute utensils sequentially and collect results
-                results = []
-                for utensil_call in utensil_calls:
-                    utensil_name = utensil_call["name"]
-                    utensil_params = utensil_call["params"]
-
-                    print(
-                        f"{Colors.utensil('🔧 Utensil Call:')} {Colors.BOLD}{utensil_name}{Colors.RESET}")
-                    print(f"Parameters: {utensil_params}")
-
-                    # Execute the utensil
-                    result = execute_utensil(utensil_name, utensil_params)
-                    results.append(f"[Result of {utensil_name}]\n{result}")
-
-                # Add combined results as user message
-                combined_results = "\n\n".join(results)
-                self.message_history.append({
-                    "role": "user",
-                    "content": combined_results
-                })
-
-                # Continue the agentic loop
-                continue
-
-            # No utensil call - agent is done
-            final_response = parser.get_text()
-
-            if final_response:
-                print(f"\nAgent: {final_response}\n")
+            # Every attempt is a request against the shared rate limits
+            reservation = self.rate_limiter.acquire(decision.model, input_estimate, priority=self.priority)
+            rate_limit_wait += reservation.waited
+            attempt_start = time.perf_counter()
+            if attempt == 0:
+                request_start = attempt_start
+
+            # After a mid-stream failure, the text received so far is sent back as an
+            # assistant prefill so generation continues from the break
+            prefill = received
+            attempt_request = request
+            if prefill:
+                attempt_request = {
+                    **request, "messages": messages + [{"role": "assistant", "content": prefill}]}
+            try:
+                # Create streaming request using the pre-loaded system prompt
+                with self._open_stream(attempt_request, reservation) as stream:
+                    stream_open = time.perf_counter()
+                    # A hedged request may have been served by the fallback model
+                    model = getattr(stream, "model", decision.model)
+                    hedged = getattr(stream, "hedged", False)
+                    # If the hedge won, settle its reservation; the loser's was released
+                    reservation = getattr(stream, "reservation", reservation)
+                    # A hedged race records each request's TTFT from its own start
+                    record_ttft = not isinstance(stream, HedgedStream)
+                    response = getattr(stream, "response", None)
+                    self.rate_limiter.observe(model, getattr(response, "headers", None), reservation)
+                    events.emit("on_stream_open", model=model, elapsed=stream_open - request_start)
+
+                    # Process all tokens, collecting every utensil call, until the model
+                    # stops or starts inventing results after a complete batch
+                    tokens = parser.text_tokens(stream) if self.native_tools else stream.text_stream
+                    for token in tokens:
+                        token_start = time.perf_counter()
+                        if first_token_at is None:
+                            first_token_at = token_start
+                            if record_ttft:
+                                self.model_manager.latency.record(model, first_token_at - attempt_start)
+                            events.emit("on_first_token", model=model,
+                                        elapsed=first_token_at - request_start)
+                        received += token
+                        parser.add_token(token)
+                        parser_seconds += time.perf_counter() - token_start
+
+                        if want_tokens:
+                            events.emit("on_token", token=token)
+                        if want_parsed and parser.utensil_count() > parsed_count:
+                            for call in parser.utensil_queue[parsed_count:]:
+                                events.emit("on_utensil_parsed", call=call)
+                            parsed_count = parser.utensil_count()
+                        if self.generation.should_cancel(parser):
+                            cancelled = True
+                            break
+
+                    stream_end = time.perf_counter()
+                    # After a cancel, the final message is never completed; use what has arrived so far
+                    message = stream.current_message_snapshot if cancelled else stream.get_final_message()
+                    usage = message.usage
+                    stop_reason = "client_cancel" if cancelled else message.stop_reason
+                self.rate_limiter.settle(reservation, usage)
+                break
+            except Exception as e:
+                # A 429 reports the exhausted limits, which every other session should honor too
+                self.rate_limiter.observe(decision.model, getattr(getattr(e, "response", None), "headers", None))
+                if not self.retry_policy.should_retry(attempt, e):
+                    raise
+                wait = self.retry_policy.delay(attempt, e)
+                attempt += 1
+                # The API rejects a prefill that ends in whitespace; a native tool_use block
+                # cannot be continued, so that protocol starts the response over
+                received = "" if self.native_tools else received.rstrip()
+                self._print(Colors.separator(
+                    f"⚠️  {type(e).__name__}: retrying in {wait:.1f}s "
+                    f"(attempt {attempt + 1}/{self.retry_policy.max_attempts}"
+                    f"{', resuming after ' + str(len(received)) + ' chars' if received else ''})"))
+                events.emit("on_retry", model=decision.model, attempt=attempt, error=e,
+                            delay=wait, resumed_chars=len(received))
+                time.sleep(wait)
+
+                # Rebuild the parser from the text kept as prefill; the continuation follows it
+                parser = self._new_parser()
+                if received:
+                    parser.add_token(received)
+
+        if cancelled:
+            discarded = parser.discard_trailing_text()
+            logger.debug(f"Cancelled stream after invented result: {discarded!r}")
+
+        # Finalize parser to process any remaining tokens (handles END_UTENSIL without trailing newline)
+        finalize_start = time.perf_counter()
+        parser.finalize()
+        parser_seconds += time.perf_counter() - finalize_start
+        if getattr(parser, "incomplete_calls", 0):
+            events.emit("on_parse_failure", protocol=self.protocol, reason="incomplete_call", name=None)
+        if want_parsed:
+            for call in parser.utensil_queue[parsed_count:]:
+                events.emit("on_utensil_parsed", call=call)
+
+        generation_seconds = stream_end - (first_token_at or stream_open)
+        stopped_early = parser.completed_utensils > 0 and stop_reason in ("client_cancel", "stop_sequence")
+        savings = self.generation.estimate_savings(
+            stopped_early, usage.output_tokens if usage else 0, generation_seconds)
+        self.turn_savings.tokens += savings.tokens
+        self.turn_savings.seconds += savings.seconds
+
+        events.emit(
+            "on_request_end",
+            model=model,
+            hedged=hedged,
+            setup_seconds=stream_open - request_start,
+            ttft_seconds=None if first_token_at is None else first_token_at - request_start,
+            stream_seconds=stream_end - request_start,
+            generation_seconds=generation_seconds,
+            parser_seconds=parser_seconds,
+            usage=usage,
+            stop_reason=stop_reason,
+            savings=savings,
+            rate_limit_wait_seconds=rate_limit_wait,
+            priority=self.priority.name.lower(),
+        )
+        return parser
 
-            return final_response
+    def _open_stream(self, request: dict, reservation=None):
+        """
+        Open a streaming request, hedging it if enabled in config.
+
+        With hedging, a second request (to the same or a faster model) is sent
+        when the first token is slower than the model's current threshold, and
+        the slower of the two is cancelled and its reservation released. Each
+        request's time to first token is recorded from its own start.
+
+        Args:
+            request: The request parameters
+            reservation: The request's rate-limit reservation
+        """
+        # A hedged stream relays text only, so native tool use is never hedged
+        if self.native_tools or not self.model_manager.get_hedging_config().get("enabled", False):
+            return self.client.messages.stream(**request)
+
+        model = request["model"]
+        input_estimate = estimate_input_tokens(request)
+        return open_hedged_stream(
+            lambda m: self.client.messages.stream(**{**request, "model": m}),
+            model,
+            hedge_model=self.model_manager.hedge_model(model),
+            threshold=self.model_manager.hedge_threshold(model),
+            reservation=reservation,
+            # The hedge is extra load, so it only goes out if the shared limits have room for it now
+            reserve=lambda m: self.rate_limiter.try_acquire(m, input_estimate, priority=Priority.BULK),
+            release=self.rate_limiter.release,
+            record_ttft=self.model_manager.latency.record,
+        )
+
+    def _execute_utensil(self, name: str, params: dict) -> str:
+        """
+        Execute a utensil, emitting start and end events around it.
+
+        Read-only utensils use the speculative prefetch result when it is still valid.
+        The result is normalized and compressed according to the ``[output]`` config.
+        """
+        self.events.emit("on_utensil_start", name=name, params=params)
+        start = time.perf_counter()
+        result = self.prefetcher.take(name, params) if self.prefetcher else None
+        prefetched = result is not None
+        compressor = self.output_policy.compressor(name) if self.output_policy else None
+        if not prefetched:
+            # Utensils that act on the agent itself (spawn_agents) find it through acting_for;
+            # those that produce large output (execute_command) stream it into the compressor
+            with acting_for(self), compressing(compressor):
+                result = execute_utensil(name, params)
+            utensil = REGISTRY.get(name)
+            if self.prefetcher and not (utensil and utensil.read_only):
+                # The utensil may have changed files that were read ahead
+                self.prefetcher.invalidate()
+            for reason, prefix in CALL_ERRORS.items():
+                if result.startswith(prefix):
+                    self.events.emit("on_parse_failure", protocol=self.protocol, reason=reason, name=name)
+        saved_bytes = 0
+        if compressor:
+            if not compressor.finished:
+                # Not streamed (or the utensil stopped partway, e.g. on a timeout): compress the result
+                compressor = compressor.fresh()
+                result = compressor.compress(result)
+            saved_bytes = compressor.saved_bytes
+        self.events.emit("on_utensil_end", name=name, params=params, result=result,
+                         seconds=time.perf_counter() - start, prefetched=prefetched,
+                         saved_bytes=saved_bytes)
+        return result
+
+    def _export_metrics(self):
+        """Write metrics to the configured export file, if any."""
+        fmt = self.metrics_config.get("export")
+        if not fmt:
+            return
+        path = self.metrics_config.get(
+            "path", ".agent/metrics.prom" if fmt == "prometheus" else ".agent/metrics.jsonl")
+        try:
+            self.metrics.export(path, fmt)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Failed to export metrics: {e}")
 
     def switch_model(self, new_model: str) -> bool:
         """Switch to a different model.
@@ -153,14 +661,14 @@ When you start a new conversation, briefly orient yourself by reading relevant f
         """
         if self.model_manager.switch_model(new_model):
             self.model = new_model
-            self.system_prompt = self._build_system_prompt()
+            self._system_prompt = None
             return True
         return False
 
     def reset(self):
         """Clear the message history for a new conversation.
 
-        Note: The system prompt remains loaded and will be used for the next conversation.
+        Note: The system prompt is kept and will be used for the next conversation.
         """
-        self.message_history = []
+        self.replace_history([])
         logger.debug("Message history cleared, system prompt preserved")
\ No newline at end of file
@@ -0,0 +1,109 @@
+"""
+Shared Anthropic API client.
+Resolves the API key once, tunes the connection pool for keepalive, and warms the connection in the background.
+"""
+
+import logging
+import os
+import threading
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Union
+
+# The SDK takes over a second to import; it is loaded on first use (or by warm_up's thread)
+if TYPE_CHECKING:
+    import anthropic
+
+logger = logging.getLogger(__name__)
+
+_client: Optional["anthropic.Anthropic"] = None
+_api_key: Optional[str] = None
+_lock = threading.Lock()
+
+
+def get_api_key() -> str:
+    """
+    Return the API key from the environment, resolved once per process.
+
+    Raises:
+        ValueError: If ANTHROPIC_API_KEY is not set
+    """
+    global _api_key
+    if _api_key is None:
+        api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            # Only pay for python-dotenv when the key is not already in the environment
+            from dotenv import load_dotenv
+            load_dotenv()
+            api_key = os.environ.get("ANTHROPIC_API_KEY")
+        if not api_key:
+            raise ValueError("ANTHROPIC_API_KEY environment variable not set")
+        _api_key = api_key
+    return _api_key
+
+
+def _build_client(config: Dict) -> "anthropic.Anthropic":
+    import anthropic
+
+    # Limits is httpx.Limits; take the class from the SDK's own default so we
+    # use whichever httpx build the SDK was installed with
+    limits_class = type(anthropic.DEFAULT_CONNECTION_LIMITS)
+    limits = limits_class(
+        max_connections=config.get("max_connections", 20),
+        max_keepalive_connections=config.get("max_keepalive_connections", 10),
+        # Keep idle connections long enough to survive the user typing the next prompt
+        keepalive_expiry=config.get("keepalive_expiry", 300),
+    )
+    return anthropic.Anthropic(
+        api_key=get_api_key(),
+        http_client=anthropic.DefaultHttpxClient(limits=limits),
+        timeout=config.get("timeout", 600),
+        max_retries=config.get("max_retries", 0),
+    )
+
+
+def get_client(config: Optional[Dict] = None) -> "anthropic.Anthropic":
+    """
+    Return the process-wide client, creating it on first use.
+
+    Args:
+        config: The [client] section of config.toml; only used by the first call
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = _build_client(config or {})
+    return _client
+
+
+def warm_up(client: Union["anthropic.Anthropic", Callable[[], "anthropic.Anthropic"]]) -> threading.Thread:
+    """
+    Open a pooled connection in the background so the first real request skips DNS, TCP and TLS setup.
+
+    Sends a minimal models.list request; failures are logged and otherwise ignored.
+
+    Args:
+        client: The client, or a function returning it; a function is called on the
+            background thread, so importing the SDK and building the client happen
+            there too instead of delaying the prompt
+
+    Returns:
+        The started daemon thread
+    """
+    def run():
+        try:
+            (client() if callable(client) else client).models.list(limit=1)
+            logger.debug("API connection warmed up")
+        except Exception as e:
+            logger.debug(f"Connection warm-up failed: {e}")
+
+    thread = threading.Thread(target=run, name="api-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def reset_client():
+    """Forget the shared client and API key (used by tests and after credential changes)."""
+    global _client, _api_key
+    with _lock:
+        _client = None
+        _api_key = None
@@ -2,8 +2,8 @@
 
 import logging
 from typing import Optional, Tuple
-from anthropic import Anthropic
-import os
+from journal import list_sessions, resume_session
+from compaction import Compactor, SUMMARY_PREFIX, format_history
 
 logger = logging.getLogger(__name__)
 
@@ -11,14 +11,41 @@ logger = logging.getLogger(__name__)
 class CommandHandler:
     """Handles special commands that start with '/'."""
 
-    def __init__(self, agent):
+    def __init__(self, agent, journal=None):
         """Initialize the command handler with a reference to the agent.
 
         Args:
             agent: The Agent instance to operate on
+            journal: The SessionJournal recording this session, if enabled
         """
         self.agent = agent
-        self.client = Anthropic(api_key=os.environ.get("ANTHROPIC_API_KEY"))
+        self.journal = journal
+        self._compactor = None
+        self._compactor_settings = None
+
+    @property
+    def client(self):
+        """The agent's shared client (created on first use)."""
+        return self.agent.client
+
+    @property
+    def compactor(self) -> Compactor:
+        """The /compact summarizer, rebuilt when the config or the agent's model changes."""
+        config = self.agent.model_manager.config
+        settings = (config, self.agent.model, self.client)
+        if self._compactor is None or settings != self._compactor_settings:
+            compact_config = config.get("compact", {})
+            self._compactor = Compactor(
+                self.client,
+                model=compact_config.get("model", self.agent.model),
+                merge_model=compact_config.get("merge_model"),
+                chunk_chars=compact_config.get("chunk_chars", 40000),
+                max_workers=compact_config.get("max_workers", 4),
+                retry_policy=self.agent.retry_policy,
+                rate_limiter=self.agent.rate_limiter,
+            )
+            self._compactor_settings = settings
+        return self._compactor
 
     def is_command(self, user_input: str) -> bool:
         """Check if the input is a command (starts with '/').
@@ -68,6 +95,12 @@ class CommandHandler:
             return self._handle_models()
         elif command_name == "model":
             return self._handle_model(arguments)
+        elif command_name == "protocol":
+            return self._handle_protocol(arguments)
+        elif command_name == "stats":
+            return self._handle_stats()
+        elif command_name == "resume":
+            return self._handle_resume(arguments)
         else:
             print(f"\n❌ Unknown command: /{command_name}")
             print("Type /help to see available commands.\n")
@@ -85,37 +118,17 @@ class CommandHandler:
 
         print("\n🔄 Compacting conversation history...")
 
-        # Build a prompt to summarize the conversation
-        conversation_text = self._format_history_for_summary()
-
-        summary_prompt = f"""Please provide a succinct summary of the following conversation history.
-The summary should preserve key context, decisions made, and important information, but be much shorter than the original.
-Focus on what's essential for continuing the conversation effectively.
-
-Conversation history:
-{conversation_text}
-
-Please respond with ONLY the summary, no preamble or explanation."""
-
         try:
-            # Call Claude to generate summary
-            response = self.client.messages.create(
-                model=self.agent.model,
-                max_tokens=2048,
-                messages=[
-                    {"role": "user", "content": summary_prompt}
-                ]
-            )
-
-            summary = response.content[0].text
+            # Summarize the history chunk by chunk and merge the partial summaries
+            summary = self.compactor.compact(self.agent.message_history)
 
             # Replace conversation history with summary
-            self.agent.message_history = [
+            self.agent.replace_history([
                 {
                     "role": "user",
-                    "content": f"[Previous conversation summary]: {summary}"
+                    "content": f"{SUMMARY_PREFIX}{summary}"
                 }
-            ]
+            ])
 
             print(f"\n✅ Conversation compacted. Summary:\n")
             print(f"{summary}\n")
@@ -148,22 +161,32 @@ Please respond with ONLY the summary, no preamble or explanation."""
         print("/compact  - Summarize conversation history to save tokens")
         print("/clear    - Erase conversation history and start fresh")
         print("/models   - List available models")
-        print("/model    - Show or switch the current model")
+        print("/model    - Show or pin the current model (/model auto to unpin)")
+        print("/protocol - Show or switch how utensils are called (utensils or tools)")
+        print("/stats    - Show latency, throughput and token metrics for this session")
+        print("/resume   - List recent sessions or resume one by id")
         print("/help     - Display this help message")
         print("="*60 + "\n")
         return True
 
     def _handle_models(self) -> bool:
         """List available models."""
-        models = self.agent.model_manager.list_available_models()
+        manager = self.agent.model_manager
         current = self.agent.model
         print("\n" + "="*60)
         print("📋 Available Models")
         print("="*60)
-        for model_id, info in models.items():
+        for model_id in manager.list_available_models():
+            spec = manager.spec(model_id)
             marker = " ← current" if model_id == current else ""
             print(f"  {model_id}")
-            print(f"    {info['display_name']} - {info['description']}{marker}")
+            print(f"    {spec.display_name} - {spec.description}{marker}")
+            details = [f"{spec.context_window // 1000}K context"]
+            if spec.input_price is not None and spec.output_price is not None:
+                details.append(f"${spec.input_price:g}/${spec.output_price:g} per MTok in/out")
+            if spec.ttft_target_ms:
+                details.append(f"TTFT target {spec.ttft_target_ms / 1000:g}s")
+            print(f"    {', '.join(details)}")
         print("="*60)
         print("Use /model <id> to switch.\n")
         return True
@@ -171,11 +194,18 @@ Please respond with ONLY the summary, no preamble or explanation."""
     def _handle_model(self, arguments: list) -> bool:
         """Switch to a specified model."""
         if not arguments:
-            print(f"\n📋 Current model: {self.agent.model}")
-            print("Use /model <id> to switch or /models to list available models.\n")
+            mode = "pinned" if self.agent.model_manager.pinned else "auto-routed per request"
+            print(f"\n📋 Current model: {self.agent.model} ({mode})")
+            print("Use /model <id> to switch, /model auto to re-enable routing, "
+                  "or /models to list available models.\n")
             return True
 
         new_model = arguments[0]
+        if new_model == "auto":
+            self.agent.model_manager.unpin()
+            print("\n✅ Model routing re-enabled\n")
+            return True
+
         if self.agent.switch_model(new_model):
             print(f"\n✅ Switched to {new_model}\n")
         else:
@@ -183,16 +213,67 @@ Please respond with ONLY the summary, no preamble or explanation."""
             print("Use /models to see available models.\n")
         return True
 
+    def _handle_protocol(self, arguments: list) -> bool:
+        """Show or switch between the UTENSIL: text format and native tool use."""
+        if not arguments:
+            print(f"\n📋 Current protocol: {self.agent.protocol}")
+            print("Use /protocol utensils or /protocol tools to switch.\n")
+            return True
+
+        had_history = bool(self.agent.message_history)
+        protocol = arguments[0].lower()
+        if protocol == self.agent.protocol:
+            print(f"\n📋 Already using {protocol}\n")
+        elif self.agent.set_protocol(protocol):
+            cleared = " (conversation history cleared)" if had_history else ""
+            print(f"\n✅ Switched to {protocol}{cleared}\n")
+        else:
+            print(f"\n❌ Unknown protocol: {protocol}. Use utensils or tools.\n")
+        return True
+
+    def _handle_stats(self) -> bool:
+        """Print a summary of the session's latency and token metrics."""
+        print("\n" + "="*60)
+        print("📊 Session Stats")
+        print("="*60)
+        print(self.agent.metrics.summary())
+        print("="*60 + "\n")
+        return True
+
+    def _handle_resume(self, arguments: list) -> bool:
+        """List recent sessions, or restore the history of the given session."""
+        if self.journal is None:
+            print("\n❌ Session journal is disabled in config.toml.\n")
+            return False
+
+        if not arguments:
+            sessions = list_sessions(self.journal.directory)
+            print(f"\n📋 Current session: {self.journal.session_id}")
+            if sessions:
+                print("Recent sessions:")
+                for session_id in sessions:
+                    print(f"  {session_id}")
+            print("Use /resume <id> to restore a session.\n")
+            return True
+
+        session_id = arguments[0]
+        protocol = self.agent.protocol
+        try:
+            count = resume_session(self.agent, self.journal, session_id)
+        except FileNotFoundError:
+            print(f"\n❌ Unknown session: {session_id}\n")
+            return False
+
+        print(f"\n✅ Resumed session {session_id} ({count} messages)")
+        if self.agent.protocol != protocol:
+            print(f"Switched to the {self.agent.protocol} protocol the session was recorded with.")
+        print()
+        return True
+
     def _format_history_for_summary(self) -> str:
         """Format the message history as readable text for summarization.
 
         Returns:
             Formatted conversation string
         """
-        formatted = []
-        for msg in self.agent.message_history:
-            role = msg["role"].capitalize()
-            content = msg["content"]
-            formatted.append(f"{role}: {content}\n")
-
-        return "\n".join(formatted)
+        return format_history(self.agent.message_history)
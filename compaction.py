@@ -0,0 +1,178 @@
+"""
+Map-reduce compaction of conversation history.
+Splits the history on turn boundaries, summarizes chunks concurrently and merges the partial summaries.
+"""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from history import content_text, is_result_message
+from ratelimit import Priority, RateLimiter, estimate_input_tokens
+from retry import RetryPolicy
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "[Previous conversation summary]: "
+
+CHUNK_PROMPT = """Please provide a succinct summary of the following part of a conversation between a user and a coding agent.
+Preserve key context, decisions made, files touched and important information, but be much shorter than the original.
+
+Conversation excerpt:
+{conversation}
+
+Please respond with ONLY the summary, no preamble or explanation."""
+
+MERGE_PROMPT = """The following are summaries of consecutive parts of one conversation between a user and a coding agent, in order.
+Merge them into a single succinct summary that preserves key context, decisions made and important information.
+Focus on what's essential for continuing the conversation effectively; later parts take precedence where they conflict.
+
+{summaries}
+
+Please respond with ONLY the summary, no preamble or explanation."""
+
+
+def format_history(messages: List[dict]) -> str:
+    """Format messages as readable text for summarization."""
+    formatted = []
+    for msg in messages:
+        role = msg["role"].capitalize()
+        content = content_text(msg["content"])
+        formatted.append(f"{role}: {content}\n")
+    return "\n".join(formatted)
+
+
+def split_turns(history: List[dict]) -> List[List[dict]]:
+    """Split the history into turns, each starting at a user prompt."""
+    turns = []
+    for message in history:
+        starts_turn = message["role"] == "user" and not is_result_message(message)
+        if starts_turn or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+def build_chunks(turns: List[List[dict]], chunk_chars: int) -> List[List[dict]]:
+    """
+    Group consecutive turns into chunks of roughly ``chunk_chars`` characters.
+
+    Grouping is greedy from the start of the history, so appending new turns
+    never changes the boundaries of earlier chunks. A previous summary always
+    gets a chunk of its own so it can be reused without re-summarizing.
+    """
+    chunks = []
+    current, size = [], 0
+    for turn in turns:
+        is_summary = content_text(turn[0]["content"]).startswith(SUMMARY_PREFIX)
+        turn_size = len(format_history(turn))
+        if current and (is_summary or size + turn_size > chunk_chars):
+            chunks.append(current)
+            current, size = [], 0
+        current = current + turn
+        size += turn_size
+        if is_summary and len(turn) == 1:
+            chunks.append(current)
+            current, size = [], 0
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class Compactor:
+    """Summarizes long histories chunk by chunk, caching the summary of each chunk."""
+
+    def __init__(self, client, model: str, merge_model: str = None, chunk_chars: int = 40000,
+                 max_workers: int = 4, max_tokens: int = 2048, retry_policy: Optional[RetryPolicy] = None,
+                 rate_limiter: Optional[RateLimiter] = None):
+        """
+        Initialize the compactor.
+
+        Args:
+            client: Anthropic client used for summarization requests
+            model: Model used to summarize individual chunks (ideally a cheap, fast one)
+            merge_model: Model used to merge partial summaries (defaults to ``model``)
+            chunk_chars: Approximate size of each chunk in characters
+            max_workers: Maximum number of chunks summarized concurrently
+            max_tokens: Output token limit for each summarization request
+            retry_policy: Policy for retrying transient API errors (defaults to RetryPolicy())
+            rate_limiter: Shared rate limiter; summarization requests wait behind interactive turns
+        """
+        self.client = client
+        self.model = model
+        self.merge_model = merge_model or model
+        self.chunk_chars = chunk_chars
+        self.max_workers = max_workers
+        self.max_tokens = max_tokens
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.rate_limiter = rate_limiter
+        self.cache: Dict[str, str] = {}
+
+    def _summarize(self, model: str, prompt: str) -> str:
+        request = {
+            "model": model,
+            "max_tokens": self.max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+
+        def send():
+            if self.rate_limiter is None:
+                return self.client.messages.create(**request)
+            reservation = self.rate_limiter.acquire(
+                model, estimate_input_tokens(request), self.max_tokens, Priority.COMPACTION)
+            response = self.client.messages.create(**request)
+            self.rate_limiter.settle(reservation, getattr(response, "usage", None))
+            return response
+
+        response = self.retry_policy.call(send)
+        return response.content[0].text
+
+    def _summarize_chunk(self, chunk: List[dict]) -> str:
+        text = format_history(chunk)
+        return self._summarize(self.model, CHUNK_PROMPT.format(conversation=text))
+
+    @staticmethod
+    def _chunk_key(chunk: List[dict]) -> str:
+        return hashlib.sha256(format_history(chunk).encode()).hexdigest()
+
+    def compact(self, history: List[dict]) -> str:
+        """
+        Produce a single summary of the history.
+
+        Chunks whose summary is cached, and previous summaries, are not sent
+        again; the remaining chunks are summarized concurrently.
+
+        Returns:
+            The merged summary text
+        """
+        chunks = build_chunks(split_turns(history), self.chunk_chars)
+
+        partials: List[str] = [None] * len(chunks)
+        pending = {}
+        for i, chunk in enumerate(chunks):
+            text = content_text(chunk[0]["content"])
+            if len(chunk) == 1 and text.startswith(SUMMARY_PREFIX):
+                partials[i] = text[len(SUMMARY_PREFIX):]
+                continue
+            key = self._chunk_key(chunk)
+            if key in self.cache:
+                partials[i] = self.cache[key]
+            else:
+                pending[i] = key
+
+        logger.debug(f"Compacting {len(chunks)} chunk(s), {len(pending)} not cached")
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = {i: executor.submit(self._summarize_chunk, chunks[i]) for i in pending}
+                for i, future in futures.items():
+                    partials[i] = future.result()
+                    self.cache[pending[i]] = partials[i]
+
+        if len(partials) == 1:
+            return partials[0]
+
+        summaries = "\n\n".join(
+            f"Part {n} of {len(partials)}:\n{summary}" for n, summary in enumerate(partials, 1)
+        )
+        return self._summarize(self.merge_model, MERGE_PROMPT.format(summaries=summaries))
@@ -0,0 +1,150 @@
+"""
+Compact history entries for file-writing utensil calls.
+After write_file/edit_file succeed, their full bodies are replaced in the assistant
+message by a diff or a content hash; the full text stays retrievable from the blob store.
+"""
+
+import difflib
+import logging
+from typing import Dict, Optional
+
+from journal import BlobStore, blob_directory
+
+logger = logging.getLogger(__name__)
+
+# Characters of a blob hash shown in history; enough to be unique in practice
+HASH_CHARS = 12
+
+# The parameters that carry file bodies, per utensil
+BODY_PARAMS = {
+    "write_file": ("content",),
+    "edit_file": ("old_text", "new_text"),
+}
+
+
+def format_call(name: str, params: Dict[str, str]) -> str:
+    """Render a utensil call in the text format the parser reads, using BEGIN_VALUE for multi-line values."""
+    lines = [f"UTENSIL:{name}"]
+    for key, value in params.items():
+        if "\n" in value:
+            lines += [f"PARAM:{key}=BEGIN_VALUE", value, "END_VALUE"]
+        else:
+            lines.append(f"PARAM:{key}={value}")
+    lines.append("END_UTENSIL")
+    return "\n".join(lines)
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _diff(before: str, after: str, path: str, context: int) -> str:
+    return "".join(difflib.unified_diff(
+        before.splitlines(keepends=True), after.splitlines(keepends=True),
+        fromfile=f"a/{path}", tofile=f"b/{path}", n=context,
+    )).rstrip("\n")
+
+
+class EditCompactor:
+    """
+    Rewrites successful write_file/edit_file calls into compact form for the history.
+
+    - Rewrite of an existing file: the body becomes a unified diff against the previous version.
+    - New file: the body becomes a short header with the line count and content hash.
+    - edit_file: old_text/new_text become one diff of the change.
+
+    The full text written is stored in the BlobStore first, so the header's
+    hash can always be expanded with the read_blob utensil. Calls whose bodies
+    are below ``min_chars``, or whose compact form would not be shorter, are left as they are.
+    """
+
+    def __init__(self, store: Optional[BlobStore] = None, min_chars: int = 400, context_lines: int = 2):
+        """
+        Initialize the compactor.
+
+        Args:
+            store: Blob store for full file texts (defaults to the one under the default journal directory)
+            min_chars: Bodies at or below this size are kept verbatim
+            context_lines: Context lines around each change in stored diffs
+        """
+        self.store = store or BlobStore(blob_directory())
+        self.min_chars = min_chars
+        self.context_lines = context_lines
+
+    @classmethod
+    def from_config(cls, config: Dict, blob_directory: Optional[str] = None) -> Optional["EditCompactor"]:
+        """
+        Build from the ``[edits]`` section of config.toml, or None if disabled.
+
+        Args:
+            config: The ``[edits]`` section
+            blob_directory: The session journal's blob directory, shared so a text stored by both is kept once
+        """
+        if not config.get("compact", True):
+            return None
+        store = BlobStore(blob_directory) if blob_directory else None
+        return cls(store, min_chars=config.get("min_chars", 400), context_lines=config.get("context_lines", 2))
+
+    def before(self, name: str, params: Dict[str, str]) -> Optional[str]:
+        """Snapshot the file a call is about to change (None if it does not exist or is not an edit)."""
+        if name not in BODY_PARAMS or "file_path" not in params:
+            return None
+        return _read(params["file_path"])
+
+    def compact(self, call: dict, before: Optional[str], result: str) -> str:
+        """
+        Return the history text for an executed call.
+
+        Args:
+            call: The parsed call (name, params, text)
+            before: The file's content before the call, from ``before``
+            result: The utensil's result; failed calls are kept verbatim
+        """
+        compact = self.compact_params(call, before, result)
+        if compact is None:
+            return call["text"]
+        text = format_call(call["name"], compact)
+        return text if len(text) < len(call["text"]) else call["text"]
+
+    def compact_params(self, call: dict, before: Optional[str], result: str) -> Optional[Dict[str, str]]:
+        """
+        Return shortened parameters for an executed edit, or None to keep the call as it is.
+
+        Used directly for native tool_use blocks, whose input is stored as parameters rather than text.
+        """
+        name, params = call["name"], call["params"]
+        body_keys = BODY_PARAMS.get(name)
+        if (not body_keys or "file_path" not in params or not result.startswith("Successfully")
+                or sum(len(params.get(k, "")) for k in body_keys) <= self.min_chars):
+            return None
+
+        path = params["file_path"]
+        after = _read(path)
+        if after is None:
+            return None
+        try:
+            digest = self.store.put(after, fsync=False)[:HASH_CHARS]
+        except OSError as e:
+            logger.debug(f"Could not store {path} for history compaction: {e}")
+            return None
+
+        if name == "write_file" and before is None:
+            lines = after.count("\n") + (0 if after.endswith("\n") else 1)
+            summary = (f"[new file, {lines} lines, {len(after)} chars, sha256:{digest}; "
+                       f"contents elided from history, use read_blob to see them]")
+            compact = {"file_path": path, "content": summary}
+        elif name == "write_file":
+            diff = _diff(before, after, path, self.context_lines) or "(no changes)"
+            compact = {"file_path": path, "content": (
+                f"[rewrote existing file, now sha256:{digest}; showing only the diff from the previous "
+                f"version, use read_blob for the full text]\n{diff}")}
+        else:
+            diff = _diff(params.get("old_text", ""), params.get("new_text", ""), path, self.context_lines)
+            compact = {"file_path": path, "old_text": "[elided, see new_text]", "new_text": (
+                f"[edit shown as a diff of old_text to new_text; file now sha256:{digest}, "
+                f"use read_blob for the full text]\n{diff}")}
+        return compact
@@ -0,0 +1,157 @@
+"""
+Event hooks for observing the agent loop.
+Lets metrics, tracers, progress UIs and test harnesses watch a turn without patching Agent.
+"""
+
+import logging
+import queue
+import threading
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Events emitted by Agent, in the order they occur within a turn,
+# followed by history bookkeeping events.
+# Payload keys are passed to listeners as keyword arguments.
+EVENTS = (
+    "on_turn_start",        # prompt
+    "on_request_start",     # model, messages
+    "on_stream_open",       # model, elapsed
+    "on_first_token",       # model, elapsed
+    "on_token",             # token
+    "on_utensil_parsed",    # call
+    "on_retry",             # model, attempt, error, delay, resumed_chars
+    "on_request_end",       # model, setup/ttft/stream/generation/parser_seconds, usage
+    "on_utensil_start",     # name, params
+    "on_utensil_end",       # name, params, result, seconds, prefetched, saved_bytes
+    "on_parse_failure",     # protocol, reason, name (a call that was cut off or could not run)
+    "on_turn_end",          # response, seconds
+    "on_message",           # message (appended to message_history)
+    "on_history_reset",     # history (message_history replaced wholesale)
+    "on_config_reload",     # model
+    "on_protocol_change",   # protocol
+)
+
+_STOP = object()
+
+
+class EventBus:
+    """
+    Publish/subscribe hub for agent events.
+
+    Listeners run either synchronously on the emitting thread or on a single
+    background dispatch thread (started on first use). Emitting an event with no
+    listeners costs one dict lookup; hot paths can check ``wants()`` first to skip
+    building the payload at all.
+    """
+
+    def __init__(self):
+        self._listeners: Dict[str, List[Tuple[Callable, bool]]] = {}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+
+    def subscribe(self, event: str, listener: Callable, background: bool = False) -> Callable[[], None]:
+        """
+        Register a listener for an event.
+
+        Args:
+            event: One of the names in EVENTS
+            listener: Callable invoked with the event payload as keyword arguments
+            background: If True, dispatch on the background queue instead of inline
+
+        Returns:
+            A function that removes the listener when called
+        """
+        if event not in EVENTS:
+            raise ValueError(f"Unknown event '{event}'")
+
+        entry = (listener, background)
+        with self._lock:
+            # Copy-on-write so emit() can iterate without holding the lock
+            self._listeners[event] = self._listeners.get(event, []) + [entry]
+
+        def unsubscribe():
+            with self._lock:
+                remaining = [e for e in self._listeners.get(event, []) if e is not entry]
+                if remaining:
+                    self._listeners[event] = remaining
+                else:
+                    self._listeners.pop(event, None)
+
+        return unsubscribe
+
+    def attach(self, observer, background: bool = False) -> Callable[[], None]:
+        """
+        Subscribe every ``on_*`` method of an observer object to its matching event.
+
+        Returns:
+            A function that detaches all of the observer's listeners
+        """
+        unsubscribers = [
+            self.subscribe(event, getattr(observer, event), background)
+            for event in EVENTS
+            if callable(getattr(observer, event, None))
+        ]
+
+        def detach():
+            for unsubscribe in unsubscribers:
+                unsubscribe()
+
+        return detach
+
+    def wants(self, event: str) -> bool:
+        """Check whether any listener is registered for an event."""
+        return event in self._listeners
+
+    def emit(self, event: str, **payload):
+        """Deliver an event to its listeners. Listener errors are logged, never raised."""
+        listeners = self._listeners.get(event)
+        if not listeners:
+            return
+        for listener, background in listeners:
+            if background:
+                self._enqueue(listener, event, payload)
+            else:
+                self._call(listener, event, payload)
+
+    def flush(self):
+        """Block until all background events queued so far have been delivered."""
+        if self._queue is not None:
+            self._queue.join()
+
+    def close(self):
+        """Drain the background queue and stop the dispatch thread."""
+        if self._worker is not None:
+            self._queue.put(_STOP)
+            self._worker.join()
+            self._worker = None
+            self._queue = None
+
+    def _enqueue(self, listener: Callable, event: str, payload: dict):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._queue = queue.Queue()
+                    self._worker = threading.Thread(
+                        target=self._dispatch_loop, name="agent-events", daemon=True)
+                    self._worker.start()
+        self._queue.put((listener, event, payload))
+
+    def _dispatch_loop(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                listener, event, payload = item
+                self._call(listener, event, payload)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    def _call(listener: Callable, event: str, payload: dict):
+        try:
+            listener(**payload)
+        except Exception as e:
+            logger.warning(f"Event listener {getattr(listener, '__name__', listener)} failed on {event}: {e}")
@@ -0,0 +1,67 @@
+"""
+Generation control for utensil responses.
+Stops the model from generating past a complete utensil batch into invented results.
+"""
+
+from dataclasses import dataclass
+
+# Server-side stop sequence: the model starting a line with an invented result header
+RESULT_STOP_SEQUENCE = "\n[Result of "
+
+MODES = ("off", "stop_sequences", "client", "both")
+
+
+@dataclass
+class GenerationSavings:
+    """Estimated tokens and latency saved by stopping one response early."""
+    tokens: int = 0
+    seconds: float = 0.0
+
+
+class GenerationControl:
+    """
+    Decides how to stop generation once a utensil batch is complete.
+
+    Modes:
+        off: let the model generate until it stops on its own
+        stop_sequences: pass RESULT_STOP_SEQUENCE to the API
+        client: cancel the stream once the parser sees an invented result after a batch
+        both: use both mechanisms (the client check catches variants the stop sequence misses)
+
+    Savings cannot be measured directly, since the tokens were never generated.
+    They are estimated as ``estimated_tail_tokens`` per early stop, converted to
+    seconds with the response's own output token rate.
+    """
+
+    def __init__(self, mode: str = "both", estimated_tail_tokens: int = 150):
+        if mode not in MODES:
+            raise ValueError(f"Unknown generation control mode '{mode}'")
+        self.mode = mode
+        self.estimated_tail_tokens = estimated_tail_tokens
+
+    @classmethod
+    def from_config(cls, config: dict) -> "GenerationControl":
+        """Build from the ``[generation]`` section of config.toml."""
+        return cls(
+            mode=config.get("mode", "both"),
+            estimated_tail_tokens=config.get("estimated_tail_tokens", 150),
+        )
+
+    def stop_sequences(self) -> list:
+        """Return the stop sequences to send with each request."""
+        if self.mode in ("stop_sequences", "both"):
+            return [RESULT_STOP_SEQUENCE]
+        return []
+
+    def should_cancel(self, parser) -> bool:
+        """Check whether the stream should be cancelled client-side after the latest token."""
+        return self.mode in ("client", "both") and parser.fake_result_detected
+
+    def estimate_savings(self, stopped_early: bool, output_tokens: int,
+                         generation_seconds: float) -> GenerationSavings:
+        """Estimate what an early stop saved, given the response's output rate."""
+        if not stopped_early:
+            return GenerationSavings()
+        tokens = self.estimated_tail_tokens
+        rate = output_tokens / generation_seconds if output_tokens and generation_seconds > 0 else 0
+        return GenerationSavings(tokens=tokens, seconds=tokens / rate if rate else 0.0)
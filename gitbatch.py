@@ -0,0 +1,388 @@
+"""
+Git queries served by long-lived ``git cat-file`` batch processes, for the git_* utensils.
+Objects are immutable, so raw objects and parsed commits and trees are cached by object id.
+"""
+
+import atexit
+import heapq
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Raw object bytes kept in memory per repository
+CACHE_BYTES = 32 * 1024 * 1024
+# Blobs larger than this are described rather than read
+MAX_BLOB_BYTES = 4 * 1024 * 1024
+# Bytes inspected for NUL when deciding whether a blob is binary
+BINARY_SNIFF_BYTES = 8000
+# Parsed commits and trees kept per repository
+MAX_PARSED = 100000
+# Seconds allowed for one-shot git commands such as status
+COMMAND_TIMEOUT = 30
+
+
+class GitError(Exception):
+    """A git query that cannot be answered (not a repository, unknown revision or path)."""
+
+
+@dataclass(frozen=True)
+class Commit:
+    oid: str
+    tree: str
+    parents: Tuple[str, ...]
+    author: str
+    author_time: int
+    committer_time: int
+    message: str
+
+    @property
+    def subject(self) -> str:
+        return self.message.split("\n", 1)[0]
+
+
+@dataclass(frozen=True)
+class TreeEntry:
+    mode: str
+    name: str
+    oid: str
+
+    @property
+    def kind(self) -> str:
+        if self.mode == "40000":
+            return "tree"
+        if self.mode == "160000":
+            return "commit"
+        return "blob"
+
+
+def _parse_commit(oid: str, data: bytes) -> Commit:
+    header, _, message = data.decode("utf-8", "replace").partition("\n\n")
+    tree, parents, author, author_time, committer_time = "", [], "", 0, 0
+    for line in header.split("\n"):
+        key, _, value = line.partition(" ")
+        if key == "tree":
+            tree = value
+        elif key == "parent":
+            parents.append(value)
+        elif key in ("author", "committer"):
+            # "Name <email> 1700000000 +0000"
+            who, _, when = value.rpartition("> ")
+            timestamp = int(when.split()[0]) if when else 0
+            if key == "author":
+                author, author_time = who.split(" <")[0], timestamp
+            else:
+                committer_time = timestamp
+    return Commit(oid, tree, tuple(parents), author, author_time, committer_time, message.strip())
+
+
+def _parse_tree(data: bytes, oid_bytes: int) -> List[TreeEntry]:
+    entries, pos = [], 0
+    while pos < len(data):
+        space = data.index(b" ", pos)
+        nul = data.index(b"\0", space)
+        oid = data[nul + 1:nul + 1 + oid_bytes].hex()
+        entries.append(TreeEntry(data[pos:space].decode(), data[space + 1:nul].decode("utf-8", "replace"), oid))
+        pos = nul + 1 + oid_bytes
+    return entries
+
+
+class _BatchProcess:
+    """One ``git cat-file --batch`` or ``--batch-check`` process, restarted if it dies."""
+
+    def __init__(self, root: str, mode: str):
+        self.root = root
+        self.mode = mode
+        self.proc: Optional[subprocess.Popen] = None
+        self.lock = threading.Lock()
+
+    def _ensure(self) -> subprocess.Popen:
+        if self.proc is None or self.proc.poll() is not None:
+            self.proc = subprocess.Popen(
+                ["git", "cat-file", self.mode], cwd=self.root,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+        return self.proc
+
+    def query(self, spec: str) -> Tuple[Optional[str], str, int, Optional[bytes]]:
+        """
+        Look up one object.
+
+        Returns:
+            (object id, type, size, contents) with contents None for --batch-check;
+            the object id is None if the object does not exist
+        """
+        if "\n" in spec:
+            raise GitError("object names cannot contain newlines")
+        with self.lock:
+            for attempt in (0, 1):
+                proc = self._ensure()
+                try:
+                    proc.stdin.write(spec.encode() + b"\n")
+                    proc.stdin.flush()
+                    header = proc.stdout.readline().decode().rstrip("\n")
+                    if not header:
+                        raise BrokenPipeError("git cat-file exited")
+                    parts = header.split(" ")
+                    if len(parts) != 3 or parts[-1] in ("missing", "ambiguous"):
+                        return None, parts[-1], 0, None
+                    oid, kind, size = parts[0], parts[1], int(parts[2])
+                    data = None
+                    if self.mode == "--batch":
+                        data = proc.stdout.read(size + 1)[:size]
+                    return oid, kind, size, data
+                except (BrokenPipeError, OSError, ValueError) as e:
+                    logger.debug(f"git cat-file {self.mode} failed ({e}); restarting")
+                    self.close()
+                    if attempt:
+                        raise GitError(f"git cat-file failed: {e}")
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                self.proc.stdin.close()
+                self.proc.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self.proc.kill()
+            self.proc = None
+
+
+class GitRepository:
+    """
+    Read-only view of one repository through persistent batch processes.
+
+    ``--batch-check`` resolves revisions and paths to object ids without
+    transferring contents; ``--batch`` fetches contents only on a cache miss.
+    """
+
+    def __init__(self, root: str, cache_bytes: int = CACHE_BYTES):
+        self.root = root
+        self.check = _BatchProcess(root, "--batch-check")
+        self.batch = _BatchProcess(root, "--batch")
+        self.cache_bytes = cache_bytes
+        self._objects: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._cached_bytes = 0
+        self._parsed: Dict[Tuple[str, str], object] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def resolve(self, spec: str) -> Tuple[str, str, int]:
+        """Resolve a revision, ``rev:path`` or object id to (object id, type, size)."""
+        oid, kind, size, _ = self.check.query(spec)
+        if oid is None:
+            raise GitError(f"'{spec}' is {kind} in {self.root}")
+        return oid, kind, size
+
+    def read(self, oid: str) -> Tuple[str, bytes]:
+        """Return (type, contents) of an object, from the cache when possible."""
+        with self._lock:
+            cached = self._objects.get(oid)
+            if cached is not None:
+                self._objects.move_to_end(oid)
+                self.hits += 1
+                return cached
+        found, kind, _, data = self.batch.query(oid)
+        if found is None:
+            raise GitError(f"object {oid} is {kind}")
+        with self._lock:
+            self.misses += 1
+            if oid not in self._objects and len(data) <= self.cache_bytes // 4:
+                self._objects[oid] = (kind, data)
+                self._cached_bytes += len(data)
+                while self._cached_bytes > self.cache_bytes:
+                    _, (_, evicted) = self._objects.popitem(last=False)
+                    self._cached_bytes -= len(evicted)
+        return kind, data
+
+    def _parse(self, oid: str, kind: str, parser):
+        key = (kind, oid)
+        parsed = self._parsed.get(key)
+        if parsed is None:
+            found_kind, data = self.read(oid)
+            if found_kind != kind:
+                raise GitError(f"{oid[:12]} is a {found_kind}, not a {kind}")
+            if len(self._parsed) >= MAX_PARSED:
+                self._parsed.clear()
+            parsed = self._parsed[key] = parser(data)
+        return parsed
+
+    def commit(self, spec: str) -> Commit:
+        """Return the commit a revision names."""
+        oid, kind, _ = self.resolve(f"{spec}^{{commit}}" if spec else "HEAD")
+        return self._parse(oid, "commit", lambda data: _parse_commit(oid, data))
+
+    def tree(self, oid: str) -> List[TreeEntry]:
+        """Return the entries of a tree object."""
+        return self._parse(oid, "tree", lambda data: _parse_tree(data, len(oid) // 2))
+
+    def path_oid(self, tree: str, path: str) -> Optional[str]:
+        """Return the object id at ``path`` below a tree, or None if it does not exist."""
+        oid = tree
+        parts = [p for p in path.split("/") if p]
+        for i, part in enumerate(parts):
+            entry = self._index(oid).get(part)
+            if entry is None or (i < len(parts) - 1 and entry.kind != "tree"):
+                return None
+            oid = entry.oid
+        return oid
+
+    def _index(self, tree: str) -> Dict[str, TreeEntry]:
+        key = ("index", tree)
+        index = self._parsed.get(key)
+        if index is None:
+            index = self._parsed[key] = {e.name: e for e in self.tree(tree)}
+        return index
+
+    def log(self, rev: str = "HEAD", path: str = "", max_count: int = 20) -> List[Commit]:
+        """
+        Return commits reachable from ``rev``, newest first by committer date.
+
+        With a path, only commits that changed it relative to every parent are
+        listed, like ``git log -- path`` with default history simplification.
+        """
+        start = self.commit(rev)
+        heap = [(-start.committer_time, start.oid)]
+        seen = {start.oid}
+        found = []
+        while heap and len(found) < max_count:
+            _, oid = heapq.heappop(heap)
+            commit = self._parse(oid, "commit", lambda data: _parse_commit(oid, data))
+            parents = [self._parse(p, "commit", lambda data, p=p: _parse_commit(p, data)) for p in commit.parents]
+            if not path:
+                found.append(commit)
+                follow = parents
+            else:
+                mine = self.path_oid(commit.tree, path)
+                same = [p for p in parents if self.path_oid(p.tree, path) == mine]
+                if not same and mine is not None:
+                    found.append(commit)
+                # Like git, follow only one parent the path is unchanged from
+                follow = same[:1] or parents
+            for parent in follow:
+                if parent.oid not in seen:
+                    seen.add(parent.oid)
+                    heapq.heappush(heap, (-parent.committer_time, parent.oid))
+        return found
+
+    def changed_paths(self, old_tree: Optional[str], new_tree: Optional[str], prefix: str = "",
+                      limit: int = 500) -> List[Tuple[str, str]]:
+        """Return (status, path) for every blob that differs between two trees (A, D or M)."""
+        changes: List[Tuple[str, str]] = []
+        old = self._index(old_tree) if old_tree else {}
+        new = self._index(new_tree) if new_tree else {}
+        for name in sorted(set(old) | set(new)):
+            if len(changes) >= limit:
+                break
+            a, b = old.get(name), new.get(name)
+            if a is not None and b is not None and a.oid == b.oid:
+                continue
+            path = prefix + name
+            a_tree = a.oid if a is not None and a.kind == "tree" else None
+            b_tree = b.oid if b is not None and b.kind == "tree" else None
+            if a_tree or b_tree:
+                changes.extend(self.changed_paths(a_tree, b_tree, path + "/", limit - len(changes)))
+            a_blob = a is not None and a_tree is None
+            b_blob = b is not None and b_tree is None
+            if a_blob and b_blob:
+                changes.append(("M", path))
+            elif b_blob:
+                changes.append(("A", path))
+            elif a_blob:
+                changes.append(("D", path))
+        return changes[:limit]
+
+    def status(self) -> Tuple[str, List[Tuple[str, str]]]:
+        """
+        Return the branch line and (XY status, path) entries of the working tree.
+
+        There is no batch mode for status, so this runs one ``git status`` process directly (no shell).
+        """
+        result = subprocess.run(
+            ["git", "status", "--porcelain=v1", "-z", "--branch", "--untracked-files=normal"],
+            cwd=self.root, capture_output=True, timeout=COMMAND_TIMEOUT,
+        )
+        if result.returncode != 0:
+            raise GitError(result.stderr.decode("utf-8", "replace").strip() or "git status failed")
+        fields = result.stdout.decode("utf-8", "replace").split("\0")
+        branch, entries, i = "", [], 0
+        while i < len(fields):
+            entry = fields[i]
+            i += 1
+            if entry.startswith("## "):
+                branch = entry[3:]
+            elif len(entry) > 3:
+                code, path = entry[:2], entry[3:]
+                if "R" in code or "C" in code:
+                    # Renames and copies are followed by their source path
+                    path = f"{fields[i]} -> {path}"
+                    i += 1
+                entries.append((code, path))
+        return branch, entries
+
+    def close(self):
+        self.check.close()
+        self.batch.close()
+
+
+_repositories: Dict[str, GitRepository] = {}
+_toplevels: Dict[str, str] = {}
+_repositories_lock = threading.Lock()
+
+
+def get_repository(path: str = ".") -> GitRepository:
+    """
+    Return the shared GitRepository containing ``path``.
+
+    Raises:
+        GitError: If the path is not inside a git work tree
+    """
+    directory = os.path.abspath(path if os.path.isdir(path) else os.path.dirname(path) or ".")
+    with _repositories_lock:
+        root = _toplevels.get(directory)
+        if root is None:
+            result = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=directory,
+                                    capture_output=True, text=True, timeout=COMMAND_TIMEOUT)
+            if result.returncode != 0:
+                raise GitError(f"not a git repository: {directory}")
+            root = _toplevels[directory] = result.stdout.strip()
+        if root not in _repositories:
+            _repositories[root] = GitRepository(root)
+        return _repositories[root]
+
+
+def close_repositories():
+    """Stop every batch process (registered to run at exit)."""
+    with _repositories_lock:
+        for repository in _repositories.values():
+            repository.close()
+        _repositories.clear()
+        _toplevels.clear()
+
+
+atexit.register(close_repositories)
+
+
+def repo_path(repository: GitRepository, path: str) -> str:
+    """Convert a path relative to the current directory into one relative to the repository root."""
+    if not path or path in (".", "/"):
+        relative = os.path.relpath(os.getcwd(), repository.root)
+    else:
+        relative = os.path.relpath(os.path.abspath(path), repository.root)
+    if relative.startswith(".."):
+        raise GitError(f"'{path}' is outside the repository at {repository.root}")
+    return "" if relative == "." else relative.replace(os.sep, "/")
+
+
+def format_time(timestamp: int) -> str:
+    return time.strftime("%Y-%m-%d", time.gmtime(timestamp))
+
+
+def is_binary(data: bytes) -> bool:
+    return b"\0" in data[:BINARY_SNIFF_BYTES]
@@ -0,0 +1,196 @@
+"""
+Hedged streaming requests.
+If the first token is slow to arrive, a second request is fired and whichever stream starts first wins.
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_NO_TEXT = object()
+
+
+class _Contestant:
+    """One request in a hedged race, run on its own thread until its first token."""
+
+    def __init__(self, index: int, model: str, open_stream: Callable, results: queue.Queue):
+        self.index = index
+        self.model = model
+        self.open_stream = open_stream
+        self.results = results
+        self.manager = None
+        self.stream = None
+        self.iterator = None
+        self.first_token = None
+        self.started_at = None
+        self.first_token_at = None
+        self.reservation = None
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"hedge-{index}", daemon=True)
+
+    def _run(self):
+        self.started_at = time.perf_counter()
+        try:
+            self.manager = self.open_stream(self.model)
+            self.stream = self.manager.__enter__()
+            if self.cancelled.is_set():
+                self.close()
+                return
+            self.iterator = iter(self.stream.text_stream)
+            self.first_token = next(self.iterator, _NO_TEXT)
+            self.first_token_at = time.perf_counter()
+            self.results.put((self, None))
+        except Exception as e:
+            if not self.cancelled.is_set():
+                self.results.put((self, e))
+
+    def ttft(self) -> Optional[float]:
+        """
+        Seconds from this request's own start to its first token.
+
+        A request cancelled before its first token reports the time it had waited so
+        far, a lower bound on its real TTFT.
+        """
+        if self.started_at is None:
+            return None
+        return (self.first_token_at or time.perf_counter()) - self.started_at
+
+    def cancel(self):
+        """Cancel this request, closing its connection if it is already open."""
+        self.cancelled.set()
+        self.close()
+
+    def close(self):
+        if self.manager is not None:
+            try:
+                self.manager.__exit__(None, None, None)
+            except Exception as e:
+                logger.debug(f"Error closing hedged stream {self.index}: {e}")
+
+
+class HedgedStream:
+    """
+    Context manager returned by ``open_hedged_stream``, wrapping the winning stream.
+
+    Exposes the same ``text_stream``, ``get_final_message()`` and
+    ``current_message_snapshot`` interface as the SDK's MessageStream, plus
+    ``model`` (the model that won), ``hedged`` (whether a second request was
+    sent), ``first_token_at`` (perf_counter time of the winner's first token)
+    and ``reservation`` (the winner's rate-limit reservation).
+    """
+
+    def __init__(self, winner: _Contestant, hedged: bool):
+        self._winner = winner
+        self.model = winner.model
+        self.hedged = hedged
+        self.first_token_at = winner.first_token_at
+        self.reservation = winner.reservation
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    @property
+    def text_stream(self):
+        if self._winner.first_token is not _NO_TEXT:
+            yield self._winner.first_token
+            yield from self._winner.iterator
+
+    @property
+    def current_message_snapshot(self):
+        return self._winner.stream.current_message_snapshot
+
+    @property
+    def response(self):
+        return getattr(self._winner.stream, "response", None)
+
+    def get_final_message(self):
+        return self._winner.stream.get_final_message()
+
+    def close(self):
+        self._winner.close()
+
+
+def open_hedged_stream(open_stream: Callable[[str], object], model: str, hedge_model: str,
+                       threshold: float, reservation=None, reserve: Optional[Callable[[str], object]] = None,
+                       release: Optional[Callable[[object], None]] = None,
+                       record_ttft: Optional[Callable[[str, float], None]] = None) -> HedgedStream:
+    """
+    Start a streaming request, hedging with a second one if the first token is slow.
+
+    Args:
+        open_stream: Function taking a model name and returning a stream context manager
+            (e.g. a partial of ``client.messages.stream``)
+        model: Model for the primary request
+        hedge_model: Model for the hedge request (may be the same model)
+        threshold: Seconds to wait for the primary's first token before hedging
+        reservation: The primary request's rate-limit reservation
+        reserve: Optional function taking the hedge model and returning a rate-limit
+            reservation for the hedge, or None to skip hedging
+        release: Optional function called with the reservation of each request that
+            is cancelled, so its unused capacity is returned
+        record_ttft: Optional function called with (model, seconds) for every request,
+            each timed from its own start; a cancelled request reports a lower bound
+
+    Returns:
+        A HedgedStream over whichever request produced a first token first. The
+        other request is cancelled.
+
+    Raises:
+        The primary request's exception if every request fails
+    """
+    results: queue.Queue = queue.Queue()
+    contestants: List[_Contestant] = [_Contestant(0, model, open_stream, results)]
+    contestants[0].reservation = reservation
+    contestants[0].thread.start()
+
+    winner: Optional[_Contestant] = None
+    errors, failed = [], []
+    try:
+        contestant, error = results.get(timeout=threshold)
+    except queue.Empty:
+        hedge_reservation = reserve(hedge_model) if reserve else None
+        if reserve and hedge_reservation is None:
+            logger.debug(f"No first token from {model} after {threshold:.2f}s; rate limits leave no room to hedge")
+        else:
+            logger.debug(f"No first token from {model} after {threshold:.2f}s, hedging with {hedge_model}")
+            hedge = _Contestant(1, hedge_model, open_stream, results)
+            hedge.reservation = hedge_reservation
+            contestants.append(hedge)
+            hedge.thread.start()
+        contestant, error = results.get()
+
+    while True:
+        if error is None:
+            winner = contestant
+            break
+        errors.append(error)
+        failed.append(contestant)
+        if len(errors) == len(contestants):
+            # The primary's reservation is the caller's to handle along with the error
+            for hedge in contestants[1:]:
+                if release and hedge.reservation is not None:
+                    release(hedge.reservation)
+            raise errors[0]
+        contestant, error = results.get()
+
+    if record_ttft:
+        record_ttft(winner.model, winner.ttft())
+    for other in contestants:
+        if other is winner:
+            continue
+        other.cancel()
+        # A loser that failed has no TTFT; one still waiting is recorded as at least its wait so far
+        if record_ttft and other.started_at is not None and other not in failed:
+            record_ttft(other.model, other.ttft())
+        if release and other.reservation is not None:
+            release(other.reservation)
+
+    return HedgedStream(winner, hedged=len(contestants) > 1)
@@ -0,0 +1,173 @@
+"""
+Helpers for inspecting and rewriting the agent's message history.
+Includes the deterministic elision policy applied before each API request.
+"""
+
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from edits import format_call
+from streaming_parser import StreamingUtensilParser
+from utensils import REGISTRY
+
+RESULT_PREFIX = "[Result of "
+
+
+def touched_paths(name: str, params: dict) -> List[str]:
+    """Return the file paths a utensil call reads or changes, so later calls supersede earlier reads."""
+    utensil = REGISTRY.get(name)
+    return utensil.touched_paths(params) if utensil is not None else []
+
+
+def is_elidable(name: str) -> bool:
+    """Check whether a utensil's stale results may be replaced by a stub."""
+    utensil = REGISTRY.get(name)
+    return utensil is not None and utensil.elidable
+
+
+def block_text(block: dict) -> str:
+    """
+    The text of one content block.
+
+    Native tool_use blocks are rendered as the equivalent UTENSIL: call, so
+    both protocols' histories read (and re-parse) the same way.
+    """
+    kind = block.get("type")
+    if kind == "text":
+        return block.get("text", "")
+    if kind == "tool_use":
+        return format_call(block["name"], {key: str(value) for key, value in block.get("input", {}).items()})
+    if kind == "tool_result":
+        content = block.get("content", "")
+        return content if isinstance(content, str) else content_text(content)
+    return ""
+
+
+def content_text(content) -> str:
+    """Flatten message content (a string or a list of content blocks) into plain text."""
+    if isinstance(content, str):
+        return content
+    return "\n\n".join(text for text in map(block_text, content) if text)
+
+
+def is_result_message(message: dict) -> bool:
+    """Check whether a message carries utensil results rather than a user prompt."""
+    if message["role"] != "user":
+        return False
+    content = message["content"]
+    if isinstance(content, str):
+        return content.startswith(RESULT_PREFIX)
+    return bool(content) and (content[0].get("type") == "tool_result"
+                              or content[0].get("text", "").startswith(RESULT_PREFIX))
+
+
+def result_block(name: str, result: str) -> dict:
+    """Build the content block carrying one utensil result."""
+    return {"type": "text", "text": f"{RESULT_PREFIX}{name}]\n{result}"}
+
+
+def tool_result_block(tool_use_id: str, result: str) -> dict:
+    """Build the content block answering one native tool_use block."""
+    block = {"type": "tool_result", "tool_use_id": tool_use_id, "content": result}
+    if result.startswith("Error"):
+        block["is_error"] = True
+    return block
+
+
+@lru_cache(maxsize=1024)
+def _parse_calls(text: str) -> Tuple[Tuple[str, Tuple[Tuple[str, str], ...]], ...]:
+    """Re-parse the utensil calls in an assistant message (cached, since history is re-scanned every request)."""
+    parser = StreamingUtensilParser()
+    parser.add_token(text)
+    parser.finalize()
+    return tuple(
+        (call["name"], tuple(sorted(call["params"].items())))
+        for call in parser.get_all_utensil_calls()
+    )
+
+
+def utensil_calls(message: dict) -> List[Tuple[str, dict]]:
+    """Return (name, params) for each utensil call in an assistant message."""
+    return [(name, dict(params)) for name, params in _parse_calls(content_text(message["content"]))]
+
+
+def elision_stub(name: str, params: dict, original_chars: int) -> str:
+    """
+    Build the one-line replacement for an elided result.
+
+    The stub depends only on the call and the original result, never on why or
+    when it was elided, so it stays byte-for-byte identical on every later request.
+    """
+    target = params.get("file_path") or params.get("command", "")
+    if len(target) > 80:
+        target = target[:77] + "..."
+    return (f"{RESULT_PREFIX}{name}]\n[stale result elided: {target!r}, {original_chars} chars; "
+            f"call {name} again if you need it]")
+
+
+def elide_stale_results(history: list, max_age_turns: int = 4, min_chars: int = 200) -> list:
+    """
+    Return a copy of the history with stale utensil results replaced by stubs.
+
+    A result is stale if it was produced more than ``max_age_turns`` user turns
+    ago, or if a later utensil call read or wrote the same file. Only results
+    of elidable utensils longer than ``min_chars`` are elided. The output is a
+    pure function of the history, so once a result is elided its stub is
+    identical on every subsequent request and prompt caching keeps working for
+    the unchanged prefix. Messages that need no change are shared, not copied.
+
+    Args:
+        history: The full message history
+        max_age_turns: Age in user turns after which results are elided (0 disables)
+        min_chars: Results at or below this size are always kept
+    """
+    # First pass: locate each result block, its call, and its turn
+    turn = 0
+    located = []  # (message index, block index, name, params, turn)
+    last_touch = {}  # file path -> index of the last message that touched it
+    previous_calls: Optional[list] = None
+    for i, message in enumerate(history):
+        if message["role"] == "assistant":
+            previous_calls = utensil_calls(message)
+            for name, params in previous_calls:
+                for path in touched_paths(name, params):
+                    last_touch[path] = i
+        elif is_result_message(message):
+            if previous_calls and isinstance(message["content"], list):
+                for j, (name, params) in enumerate(previous_calls[:len(message["content"])]):
+                    located.append((i, j, name, params, turn))
+            previous_calls = None
+        else:
+            turn += 1
+
+    # Second pass: decide which blocks to elide
+    elide = {}
+    for i, j, name, params, result_turn in located:
+        if not is_elidable(name):
+            continue
+        aged = max_age_turns > 0 and turn - result_turn >= max_age_turns
+        path_param = REGISTRY[name].path_param
+        path = params.get(path_param) if path_param else None
+        # The call that produced this result lives in message i - 1
+        superseded = path is not None and last_touch.get(path, -1) > i - 1
+        block = history[i]["content"][j]
+        body_chars = len(block_text(block))
+        if block.get("type") != "tool_result":
+            body_chars -= len(f"{RESULT_PREFIX}{name}]\n")
+        if (aged or superseded) and body_chars > min_chars:
+            elide.setdefault(i, {})[j] = elision_stub(name, params, body_chars)
+
+    if not elide:
+        return history
+
+    elided = list(history)
+    for i, blocks in elide.items():
+        content = list(history[i]["content"])
+        for j, stub in blocks.items():
+            if content[j].get("type") == "tool_result":
+                # The stub keeps the block's tool_use_id; the API requires every call to be answered
+                content[j] = {**content[j], "content": stub.split("\n", 1)[1]}
+            else:
+                content[j] = {"type": "text", "text": stub}
+        elided[i] = {**history[i], "content": content}
+    return elided
@@ -0,0 +1,304 @@
+"""
+Session journal for persisting and resuming conversation history.
+Appends every message to a compact JSONL file, storing large texts in a content-addressed blob store.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import secrets
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIRECTORY = ".agent/sessions"
+DEFAULT_BLOB_THRESHOLD = 2048
+
+
+def blob_directory(directory: str = DEFAULT_DIRECTORY) -> str:
+    """The blob store under a journal directory; compacted edits share it, so a text stored by both is kept once."""
+    return os.path.join(directory, "blobs")
+
+
+class BlobStore:
+    """Content-addressed storage for large texts, keyed by SHA-256."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """Return the content hash used as a blob's key."""
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def put(self, text: str, fsync: bool = True) -> str:
+        """
+        Store text and return its hash. Existing blobs are not rewritten.
+
+        The blob is written to a temporary file and renamed into place, so a
+        crash never leaves a partially written blob under its final name.
+        """
+        digest = self.hash_text(text)
+        path = self._path(digest)
+        if os.path.exists(path):
+            return digest
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        return digest
+
+    def get(self, digest: str) -> str:
+        """Return the text stored under a hash."""
+        with open(self._path(digest), 'r') as f:
+            return f.read()
+
+    def has(self, digest: str) -> bool:
+        """Check whether a blob exists."""
+        return os.path.exists(self._path(digest))
+
+    def find(self, prefix: str) -> Optional[str]:
+        """Return the full hash of the one blob whose hash starts with ``prefix``, or None."""
+        prefix = prefix.lower()
+        if len(prefix) < 4 or any(c not in "0123456789abcdef" for c in prefix):
+            return None
+        try:
+            names = os.listdir(os.path.join(self.root, prefix[:2]))
+        except OSError:
+            return None
+        matches = [prefix[:2] + n for n in names if n.startswith(prefix[2:]) and not n.endswith(".tmp")]
+        return matches[0] if len(matches) == 1 else None
+
+
+def new_session_id() -> str:
+    """Generate a sortable, unique session id."""
+    return time.strftime("%Y%m%d-%H%M%S") + "-" + secrets.token_hex(2)
+
+
+def _truncate_torn_tail(path: str):
+    """Cut a partially written final line (left by a crash) so appends start on a clean line."""
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Scan backwards in blocks for the last newline
+        position = size
+        while position > 0:
+            step = min(4096, position)
+            position -= step
+            f.seek(position)
+            block = f.read(step)
+            index = block.rfind(b"\n")
+            if index != -1:
+                f.truncate(position + index + 1)
+                return
+        f.truncate(0)
+
+
+class SessionJournal:
+    """
+    Append-only journal of one session's message history.
+
+    Attach it to an agent's EventBus; it listens for ``on_message``,
+    ``on_history_reset`` and ``on_protocol_change``. The utensil protocol is
+    recorded whenever the file is opened and when it changes, since the two
+    protocols store calls differently and a session must be resumed in its
+    own. Each record is one JSON line, flushed and fsynced as
+    it is written, so at most the final line can be lost in a crash. Message
+    texts larger than ``blob_threshold`` are stored in the BlobStore and
+    referenced by hash.
+    """
+
+    def __init__(self, directory: str = DEFAULT_DIRECTORY, session_id: Optional[str] = None,
+                 blob_threshold: int = DEFAULT_BLOB_THRESHOLD, fsync: bool = True,
+                 protocol: Optional[str] = None):
+        self.directory = directory
+        self.protocol = protocol
+        self.session_id = session_id or new_session_id()
+        self.blob_threshold = blob_threshold
+        self.fsync = fsync
+        self.blobs = BlobStore(blob_directory(directory))
+        self.path = os.path.join(directory, f"{self.session_id}.jsonl")
+        self._file = None
+
+    def _write(self, record: dict):
+        # Open lazily so sessions that never send a message leave no file behind
+        if self._file is None:
+            os.makedirs(self.directory, exist_ok=True)
+            _truncate_torn_tail(self.path)
+            self._file = open(self.path, 'a')
+            if self.protocol and record.get("op") != "protocol":
+                self._write({"op": "protocol", "p": self.protocol})
+        self._file.write(json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n")
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _encode_text(self, text: str) -> dict:
+        if len(text) > self.blob_threshold:
+            return {"h": self.blobs.put(text, self.fsync)}
+        return {"c": text}
+
+    def _encode_content(self, content) -> dict:
+        if isinstance(content, str):
+            return self._encode_text(content)
+        # List of content blocks: only text blocks are candidates for blob storage
+        blocks = []
+        for block in content:
+            if block.get("type") == "text":
+                blocks.append({"type": "text", **self._encode_text(block["text"])})
+            else:
+                blocks.append(block)
+        return {"b": blocks}
+
+    def on_message(self, message: dict):
+        """Append a message to the journal."""
+        self._write({"r": message["role"], **self._encode_content(message["content"])})
+
+    def on_history_reset(self, history: list):
+        """Record that the history was replaced (e.g. by /clear or /compact)."""
+        self._write({"op": "reset"})
+        for message in history:
+            self.on_message(message)
+
+    def on_protocol_change(self, protocol: str):
+        """Record that the agent switched utensil protocols."""
+        self.protocol = protocol
+        if self._file is not None:
+            self._write({"op": "protocol", "p": protocol})
+
+    def switch(self, session_id: str):
+        """Continue appending to a different (e.g. resumed) session."""
+        self.close()
+        self.session_id = session_id
+        self.path = os.path.join(self.directory, f"{session_id}.jsonl")
+
+    def close(self):
+        """Close the journal file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _decode_text(record: dict, blobs: BlobStore, cache: Dict[str, str]) -> str:
+    if "h" in record:
+        digest = record["h"]
+        if digest not in cache:
+            cache[digest] = blobs.get(digest)
+        return cache[digest]
+    return record["c"]
+
+
+def load_session(session_id: str, directory: str = DEFAULT_DIRECTORY) -> List[dict]:
+    """
+    Rebuild the message history of a session.
+
+    The journal is read once, sequentially. Records before the last reset are
+    dropped without touching their blobs, and each referenced blob is read at
+    most once. A torn final line from a crash is ignored.
+
+    Raises:
+        FileNotFoundError: If the session does not exist
+    """
+    return read_session(session_id, directory)[0]
+
+
+def read_session(session_id: str, directory: str = DEFAULT_DIRECTORY) -> Tuple[List[dict], Optional[str]]:
+    """
+    Rebuild the message history of a session, with the utensil protocol it was recorded in.
+
+    Sessions journaled before the protocol was recorded report "tools" if they
+    contain tool_use or tool_result blocks, else None.
+
+    Returns:
+        (history, protocol or None)
+
+    Raises:
+        FileNotFoundError: If the session does not exist
+    """
+    path = os.path.join(directory, f"{session_id}.jsonl")
+    records = []
+    protocol = None
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.endswith("\n"):
+                logger.warning(f"Ignoring incomplete final record in {path}")
+                break
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping corrupt record at {path}:{line_number}")
+                continue
+            if record.get("op") == "reset":
+                records = []
+            elif record.get("op") == "protocol":
+                protocol = record["p"]
+            else:
+                records.append(record)
+
+    blobs = BlobStore(os.path.join(directory, "blobs"))
+    cache: Dict[str, str] = {}
+    history = []
+    for record in records:
+        if "b" in record:
+            content = [
+                {"type": "text", "text": _decode_text(block, blobs, cache)}
+                if block.get("type") == "text" else block
+                for block in record["b"]
+            ]
+        else:
+            content = _decode_text(record, blobs, cache)
+        history.append({"role": record["r"], "content": content})
+    if protocol is None and any(
+            block.get("type") in ("tool_use", "tool_result")
+            for message in history if isinstance(message["content"], list) for block in message["content"]):
+        protocol = "tools"
+    return history, protocol
+
+
+def resume_session(agent, journal: SessionJournal, session_id: str) -> int:
+    """
+    Load a session into an agent and continue journaling into it.
+
+    Returns:
+        The number of messages restored
+
+    Raises:
+        FileNotFoundError: If the session does not exist
+    """
+    history, protocol = read_session(session_id, journal.directory)
+    journal.switch(session_id)
+    if protocol and protocol != agent.protocol:
+        # Calls in the history are stored in the session's protocol, so the agent switches to it.
+        # Clear first: the history is replaced below, and no reset should reach the journal
+        agent.message_history = []
+        agent.set_protocol(protocol)
+    # Assign directly: these messages are already in the resumed journal
+    agent.message_history = history
+    return len(history)
+
+
+def list_sessions(directory: str = DEFAULT_DIRECTORY, limit: int = 10) -> List[str]:
+    """Return the most recent session ids, newest first."""
+    if not os.path.isdir(directory):
+        return []
+    sessions = sorted(
+        (name[:-len(".jsonl")] for name in os.listdir(directory) if name.endswith(".jsonl")),
+        reverse=True,
+    )
+    return sessions[:limit]
@@ -0,0 +1,458 @@
+"""
+Memory-mapped search of large log files: regex or literal matches with bounded context,
+time-range bisection on timestamped lines, and tail/follow by byte offset.
+"""
+
+import calendar
+import mmap
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from output_filter import VARIABLE_PARTS
+
+# Bytes at the start of a line searched for its timestamp
+STAMP_PREFIX_BYTES = 80
+# Lines examined after a bisection probe for one with a timestamp (stack traces have none)
+MAX_PROBE_LINES = 200
+# Bytes scanned per block when searching newest first
+BLOCK_BYTES = 1 << 20
+# Matching lines examined per call, including repeats of lines already shown
+MAX_SCANNED_MATCHES = 100000
+# Longer lines are cut in the output
+MAX_LINE_CHARS = 500
+# Upper bounds on per-call parameters
+MAX_HITS = 200
+MAX_CONTEXT = 20
+MAX_LINES = 1000
+MAX_FOLLOW_SECONDS = 30.0
+FOLLOW_POLL_SECONDS = 0.25
+
+# ISO 8601 ("2024-05-01T12:00:00.123Z", "2024-05-01 12:00:00,123"), common log format
+# ("01/May/2024:12:00:00 +0000") and leading epoch seconds ("1714564800.123")
+TIMESTAMP = re.compile(
+    rb"(?P<y>\d{4})-(?P<mo>\d{2})-(?P<d>\d{2})[T ](?P<h>\d{2}):(?P<mi>\d{2}):(?P<s>\d{2})"
+    rb"(?:[.,](?P<f>\d+))?(?:\s?(?P<tz>Z|[+-]\d{2}:?\d{2})\b)?"
+    rb"|(?P<cd>\d{2})/(?P<cmo>[A-Z][a-z]{2})/(?P<cy>\d{4}):(?P<ch>\d{2}):(?P<cmi>\d{2}):(?P<cs>\d{2})"
+    rb"(?:\s(?P<ctz>[+-]\d{4}))?"
+    rb"|^\[?(?P<epoch>1\d{9})(?:\.(?P<ef>\d+))?\b"
+)
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+# Relative times for since/until, counted back from the newest timestamp in the file
+RELATIVE_TIME = re.compile(r"^-\s*(\d+(?:\.\d+)?)\s*([smhd])$")
+UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def _zone_offset(zone: Optional[bytes]) -> int:
+    if not zone or zone == b"Z":
+        return 0
+    digits = zone[1:].replace(b":", b"")
+    offset = int(digits[:2]) * 3600 + int(digits[2:]) * 60
+    return -offset if zone[:1] == b"-" else offset
+
+
+def parse_timestamp(text: bytes) -> Optional[float]:
+    """
+    Find the timestamp in the start of a log line.
+
+    Times without a zone are compared as if they were UTC, which is consistent
+    as long as since/until are given the same way as the log writes them.
+
+    Returns:
+        Seconds since the epoch, or None if the line has no recognized timestamp
+    """
+    match = TIMESTAMP.search(text)
+    if match is None:
+        return None
+    if match.group("epoch"):
+        return float(match.group("epoch") + b"." + (match.group("ef") or b"0"))
+    if match.group("y"):
+        fields = [int(match.group(key)) for key in ("y", "mo", "d", "h", "mi", "s")]
+        fraction, zone = match.group("f"), match.group("tz")
+    else:
+        month = match.group("cmo").decode()
+        if month not in MONTHS:
+            return None
+        fields = [int(match.group("cy")), MONTHS.index(month) + 1, int(match.group("cd")),
+                  int(match.group("ch")), int(match.group("cmi")), int(match.group("cs"))]
+        fraction, zone = None, match.group("ctz")
+    if not (1 <= fields[1] <= 12 and 1 <= fields[2] <= 31):
+        return None
+    seconds = calendar.timegm(tuple(fields)) - _zone_offset(zone)
+    return seconds + (float(b"0." + fraction) if fraction else 0.0)
+
+
+def parse_time(text: str, latest: Optional[float]) -> float:
+    """
+    Parse a since/until argument.
+
+    Args:
+        text: A timestamp in one of the log formats, a date ("2024-05-01"),
+            or a time before the newest log line ("-15m", "-2h", "-1d")
+        latest: Timestamp of the newest line, for relative times
+
+    Raises:
+        ValueError: If the text is not a recognized time
+    """
+    text = text.strip()
+    relative = RELATIVE_TIME.match(text)
+    if relative:
+        if latest is None:
+            raise ValueError(f"'{text}' is relative to the newest timestamp, but none was found")
+        return latest - float(relative.group(1)) * UNIT_SECONDS[relative.group(2)]
+    if re.fullmatch(r"\d{4}-\d{2}-\d{2}", text):
+        text += "T00:00:00"
+    stamp = parse_timestamp(text.encode())
+    if stamp is None:
+        raise ValueError(f"unrecognized time '{text}'")
+    return stamp
+
+
+@dataclass
+class LogHit:
+    """A matching line, and the later lines that differ from it only in numbers and ids."""
+    start: int
+    end: int
+    similar: int = 0
+    last_similar: int = -1
+
+
+@dataclass
+class SearchResult:
+    hits: List[LogHit]
+    # Where a follow-up call should continue (start_offset forward, end_offset newest first), or None if done
+    resume: Optional[int]
+    similar: int
+
+
+class LogFile:
+    """
+    A read-only memory map of a log file.
+
+    Searches use ``bytes.find``-style scans and compiled regexes directly on the
+    map, so only the pages touched are read and memory use does not depend on
+    the file's size. Offsets are byte offsets; line numbers would need a scan
+    from the start of the file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        # mmap cannot map an empty file
+        self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def __enter__(self) -> "LogFile":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def line_start(self, pos: int, floor: int = 0) -> int:
+        """Start of the line containing pos (not before floor)."""
+        return self.data.rfind(b"\n", floor, pos) + 1 or floor
+
+    def line_end(self, pos: int) -> int:
+        """Offset of the newline ending the line containing pos, or the file size."""
+        end = self.data.find(b"\n", pos)
+        return self.size if end < 0 else end
+
+    def next_line(self, pos: int) -> int:
+        """Start of the first line beginning at or after pos."""
+        if pos <= 0:
+            return 0
+        if pos >= self.size:
+            return self.size
+        return pos if self.data[pos - 1] == 10 else min(self.line_end(pos) + 1, self.size)
+
+    def lines_before(self, start: int, count: int, floor: int = 0) -> int:
+        """Start of the line count lines before the line starting at start."""
+        for _ in range(count):
+            if start <= floor:
+                break
+            start = self.line_start(start - 1, floor)
+        return start
+
+    def lines_after(self, end: int, count: int, ceiling: int) -> int:
+        """End of the line count lines after the line ending at end."""
+        for _ in range(count):
+            if end + 1 >= ceiling:
+                break
+            end = min(self.line_end(end + 1), ceiling)
+        return end
+
+    def stamp(self, start: int) -> Optional[float]:
+        """Timestamp of the line starting at start, if it has one."""
+        return parse_timestamp(self.data[start:start + STAMP_PREFIX_BYTES].split(b"\n", 1)[0])
+
+    def _first_stamp(self, pos: int) -> Tuple[Optional[int], Optional[float]]:
+        """The first timestamped line starting at or after pos, looking at most MAX_PROBE_LINES lines ahead."""
+        start = self.next_line(pos)
+        for _ in range(MAX_PROBE_LINES):
+            if start >= self.size:
+                break
+            stamp = self.stamp(start)
+            if stamp is not None:
+                return start, stamp
+            start = self.line_end(start) + 1
+        return None, None
+
+    def latest_stamp(self) -> Optional[float]:
+        """Timestamp of the newest timestamped line near the end of the file."""
+        end = self.size
+        for _ in range(MAX_PROBE_LINES):
+            if end <= 0:
+                break
+            start = self.line_start(end - 1)
+            stamp = self.stamp(start)
+            if stamp is not None:
+                return stamp
+            end = start
+        return None
+
+    def offset_for_time(self, when: float, after: bool = False) -> int:
+        """
+        Bisect for the first line stamped at or after ``when`` (strictly after with ``after``).
+
+        Assumes timestamps do not decrease through the file. Lines without a
+        timestamp belong to the stamped line above them.
+
+        Returns:
+            A line start, or the file size if every line is earlier
+        """
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            start, stamp = self._first_stamp(middle)
+            if start is None or (stamp > when if after else stamp >= when):
+                high = middle
+            else:
+                low = start + 1
+        start, _ = self._first_stamp(low)
+        return self.next_line(low) if start is None else start
+
+    def _matches(self, find: Callable[[int, int], int], start: int, end: int):
+        """Yield (line start, line end) of each line in [start, end) with a match, in order."""
+        pos = start
+        while pos < end:
+            found = find(pos, end)
+            if found < 0 or found >= end:
+                return
+            line_start = self.line_start(found, start)
+            line_end = min(self.line_end(found), end)
+            yield line_start, line_end
+            pos = line_end + 1
+
+    def search(self, find: Callable[[int, int], int], start: int, end: int, max_hits: int,
+               newest_first: bool = False) -> SearchResult:
+        """
+        Collect up to max_hits distinct matching lines in [start, end).
+
+        Lines equal to an earlier hit apart from numbers and ids (timestamps,
+        request ids, durations) are counted on that hit instead of shown.
+
+        Args:
+            find: Returns the offset of the first match in [pos, end), or -1
+            start: Line start to search from
+            end: Offset to search up to
+            max_hits: Distinct lines to collect before stopping
+            newest_first: Scan backwards from end, in blocks of BLOCK_BYTES
+        """
+        hits: List[LogHit] = []
+        keys: Dict[str, LogHit] = {}
+        similar = scanned = 0
+        for line_start, line_end in (self._matches_backwards(find, start, end) if newest_first
+                                     else self._matches(find, start, end)):
+            scanned += 1
+            key = " ".join(VARIABLE_PARTS.sub("#", self.text(line_start, line_end)).split())
+            hit = keys.get(key)
+            if hit is None and len(hits) >= max_hits or scanned > MAX_SCANNED_MATCHES:
+                return SearchResult(hits, line_end + 1 if newest_first else line_start, similar)
+            if hit is not None:
+                hit.similar += 1
+                hit.last_similar = line_start
+                similar += 1
+                continue
+            hit = keys[key] = LogHit(line_start, line_end)
+            hits.append(hit)
+        return SearchResult(hits, None, similar)
+
+    def _matches_backwards(self, find: Callable[[int, int], int], start: int, end: int):
+        block_end = end
+        while block_end > start:
+            block_start = self.line_start(max(start, block_end - BLOCK_BYTES), start)
+            if block_start >= block_end:
+                block_start = self.line_start(block_end - 1, start)
+            yield from reversed(list(self._matches(find, block_start, block_end)))
+            block_end = block_start
+
+    def text(self, start: int, end: int) -> str:
+        """Decode one line, cutting it at MAX_LINE_CHARS."""
+        cut = min(end, start + 4 * MAX_LINE_CHARS)
+        line = self.data[start:cut].decode("utf-8", "replace").rstrip("\r")
+        if len(line) > MAX_LINE_CHARS or cut < end:
+            line = line[:MAX_LINE_CHARS] + " [line truncated]"
+        return line
+
+    def render(self, start: int, end: int, marked=(), width: int = 0) -> List[str]:
+        """Render the lines in [start, end] with their byte offsets, marking those starting at a marked offset."""
+        result = []
+        pos = start
+        while pos <= end and pos < self.size:
+            line_end = self.line_end(pos)
+            marker = ">" if pos in marked else " "
+            result.append(f"{marker} @{pos:<{width}}  {self.text(pos, line_end)}")
+            pos = line_end + 1
+        return result
+
+
+def make_finder(data, pattern: str, literal: bool, ignore_case: bool) -> Callable[[int, int], int]:
+    """
+    Build a function returning the offset of the first match in [pos, end), or -1.
+
+    Raises:
+        re.error: If the pattern is not a valid regular expression
+    """
+    needle = pattern.encode()
+    if literal and not ignore_case:
+        return lambda pos, end: data.find(needle, pos, end)
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    regex = re.compile(re.escape(needle) if literal else needle, flags)
+
+    def find(pos: int, end: int) -> int:
+        match = regex.search(data, pos, end)
+        return -1 if match is None else match.start()
+    return find
+
+
+def wait_for_growth(path: str, size: int, seconds: float) -> int:
+    """Poll until the file is larger than size or the time is up; return its size."""
+    deadline = time.monotonic() + min(seconds, MAX_FOLLOW_SECONDS)
+    while True:
+        current = os.stat(path).st_size
+        if current != size or time.monotonic() >= deadline:
+            return current
+        time.sleep(FOLLOW_POLL_SECONDS)
+
+
+def search_log(path: str, pattern: Optional[str] = None, literal: bool = False, ignore_case: bool = False,
+               since: Optional[str] = None, until: Optional[str] = None, start_offset: Optional[int] = None,
+               end_offset: Optional[int] = None, context: int = 2, max_hits: int = 30,
+               newest_first: bool = False, lines: int = 50, follow: float = 0) -> str:
+    """
+    Search or page through a log file. See the log_search utensil for the parameters.
+
+    Raises:
+        OSError: If the file cannot be read
+        ValueError, re.error: For an invalid time or pattern
+    """
+    following = follow > 0
+    if following:
+        if start_offset is None:
+            start_offset = os.stat(path).st_size
+        wait_for_growth(path, start_offset, follow)
+
+    with LogFile(path) as log:
+        notes = []
+        start = 0 if start_offset is None else start_offset
+        if start > log.size:
+            notes.append(f"[file is now {log.size} bytes, shorter than start_offset {start}: "
+                         f"it was truncated or rotated; reading from the start]")
+            start = 0
+        start = log.next_line(start)
+        end = log.size if end_offset is None else min(max(end_offset, 0), log.size)
+        end = log.line_start(end) if 0 < end < log.size and log.data[end - 1] != 10 else end
+
+        if since or until:
+            latest = log.latest_stamp()
+            if since:
+                start = max(start, log.offset_for_time(parse_time(since, latest)))
+            if until:
+                end = min(end, log.offset_for_time(parse_time(until, latest), after=True))
+
+        width = len(str(log.size))
+        header = f"{path}: {log.size} bytes"
+        if (start, end) != (0, log.size):
+            header += f", range @{start}-@{end}"
+        if start >= end:
+            return "\n".join([header] + notes + ["(no lines in range)"])
+
+        if not pattern:
+            return "\n".join([header] + notes + _page(log, start, end, lines, width,
+                                                      from_end=start_offset is None and not since))
+
+        find = make_finder(log.data, pattern, literal, ignore_case)
+        if isinstance(log.data, mmap.mmap) and hasattr(mmap, "MADV_SEQUENTIAL") and not newest_first:
+            log.data.madvise(mmap.MADV_SEQUENTIAL, start - start % mmap.PAGESIZE)
+        result = log.search(find, start, end, max(1, min(max_hits, MAX_HITS)), newest_first)
+        return "\n".join([header] + notes + _render_hits(log, result, start, end, pattern,
+                                                          max(0, min(context, MAX_CONTEXT)),
+                                                          newest_first, width))
+
+
+def _page(log: LogFile, start: int, end: int, lines: int, width: int, from_end: bool) -> List[str]:
+    """The first or last ``lines`` lines of [start, end), with where to continue."""
+    count = max(1, min(lines, MAX_LINES))
+    if from_end:
+        last = end - 1 if end > start and log.data[end - 1] == 10 else end
+        first = log.lines_before(log.line_start(last, start), count - 1, start)
+        result = log.render(first, last - 1, width=width)
+        if first > start:
+            result.insert(0, f"[... earlier lines; use end_offset={first} to page back]")
+    else:
+        stop = log.lines_after(log.line_end(start), count - 1, end)
+        result = log.render(start, min(stop, end - 1), width=width)
+        if stop + 1 < end:
+            result.append(f"[... more lines; continue with start_offset={stop + 1}]")
+            return result
+    result.append(f"[end of range at @{end}; to follow new lines, call again with start_offset={end} "
+                  f"and follow=<seconds>]")
+    return result
+
+
+def _render_hits(log: LogFile, result: SearchResult, start: int, end: int, pattern: str, context: int,
+                 newest_first: bool, width: int) -> List[str]:
+    if not result.hits:
+        lines = [f"No lines match '{pattern}'"]
+    else:
+        # Group hits whose context windows overlap or touch
+        groups: List[List] = []
+        for hit in sorted(result.hits, key=lambda hit: hit.start):
+            first = log.lines_before(hit.start, context, start)
+            last = log.lines_after(hit.end, context, end)
+            if groups and first <= groups[-1][1] + 1:
+                groups[-1][1] = max(groups[-1][1], last)
+                groups[-1][2].append(hit)
+            else:
+                groups.append([first, last, [hit]])
+        if newest_first:
+            groups.reverse()
+
+        lines = []
+        for first, last, hits in groups:
+            if lines:
+                lines.append("--")
+            lines.extend(log.render(first, last, {hit.start for hit in hits}, width))
+            for hit in hits:
+                if hit.similar:
+                    where = "earlier" if newest_first else "last"
+                    lines.append(f"  [@{hit.start}: {hit.similar} more similar lines, {where} at "
+                                 f"@{hit.last_similar}]")
+
+    summary = f"[{len(result.hits)} distinct matching lines"
+    if result.similar:
+        summary += f", {result.similar} similar lines folded"
+    if result.resume is None:
+        lines.append(summary + "; end of range]")
+    elif newest_first:
+        lines.append(summary + f"; hit limit reached, continue with end_offset={result.resume}]")
+    else:
+        lines.append(summary + f"; hit limit reached, continue with start_offset={result.resume}]")
+    return lines
@@ -3,13 +3,25 @@
 import sys
 import argparse
 import logging
-from dotenv import load_dotenv
+import threading
 from agent import Agent
 from commands import CommandHandler
+from journal import SessionJournal, resume_session
+from client import warm_up
+from pyworkers import WorkerError, get_pool
 
-# Import readline for better input handling with word navigation support
-try:
-    import readline
+# The SDK, python-dotenv and the profiler are imported on first use, not here:
+# every one-shot CLI call and bulk task pays for module-level imports (see scripts/startup_benchmark.py)
+
+
+def setup_readline():
+    """Enable line editing, history and word navigation for the REPL prompt."""
+    # Import readline for better input handling with word navigation support
+    try:
+        import readline
+    except ImportError:
+        # readline not available (e.g., on Windows)
+        return
     # Enable tab completion and history
     readline.parse_and_bind('tab: complete')
     # Set up word navigation with Alt+Arrow keys (Meta keys)
@@ -20,15 +32,59 @@ try:
     readline.parse_and_bind('"\e\e[D": backward-word')  # Alt+Left (alternative)
     readline.parse_and_bind('"\ef": forward-word')  # Alt+f
     readline.parse_and_bind('"\eb": backward-word')  # Alt+b
-except ImportError:
-    # readline not available (e.g., on Windows)
-    pass
 
-# Load environment variables from .env file
-load_dotenv()
+
+def run_task(agent, task, profiler=None):
+    """Run a single task, profiling the turn if a profiler is given."""
+    if profiler is None:
+        return agent.run_with_utensils(task)
+    with profiler.turn(agent):
+        return agent.run_with_utensils(task)
+
+
+def watch_config(agent):
+    """Reload config.toml in the background when it changes, if enabled."""
+    config = agent.model_manager.config.get("config", {})
+    if config.get("hot_reload", True):
+        agent.model_manager.watch(config.get("watch_interval", 1.0))
+
+
+def prestart_python(agent, prompt_shown):
+    """Start the run_python worker pool in the background once the prompt is shown, if enabled."""
+    if not agent.model_manager.config.get("python", {}).get("prestart", True):
+        return
+    def start():
+        # Starting the zygote earlier would compete with startup for the CPU
+        prompt_shown.wait()
+        try:
+            get_pool().start()
+        except WorkerError as e:
+            logging.getLogger(__name__).debug(f"Python worker pool not started: {e}")
+
+    threading.Thread(target=start, daemon=True, name="python-pool").start()
+
+
+def create_journal(agent, resume=None):
+    """Attach a session journal to the agent if enabled, optionally resuming a session."""
+    config = agent.model_manager.config.get("journal", {})
+    if not config.get("enabled", True):
+        return None
+
+    journal = SessionJournal(
+        directory=config.get("directory", ".agent/sessions"),
+        blob_threshold=config.get("blob_threshold", 2048),
+        fsync=config.get("fsync", True),
+        protocol=agent.protocol,
+    )
+    agent.events.attach(journal)
+
+    if resume:
+        count = resume_session(agent, journal, resume)
+        print(f"✅ Resumed session {resume} ({count} messages, {agent.protocol} protocol)")
+    return journal
 
 
-def run_repl(debug=False):
+def run_repl(debug=False, profiler=None, resume=None):
     """Run the agent in interactive REPL mode."""
     # Set log level to DEBUG if debug flag is passed
     if debug:
@@ -39,9 +95,18 @@ def run_repl(debug=False):
 
     # Initialize agent once for the entire session
     agent = Agent()
-    
+    watch_config(agent)
+    journal = create_journal(agent, resume)
+
+    # Import the SDK and open the API connection while the user types their first prompt
+    if agent.model_manager.config.get("client", {}).get("warm_up", True):
+        warm_up(lambda: agent.client)
+    prompt_shown = threading.Event()
+    prestart_python(agent, prompt_shown)
+    setup_readline()
+
     # Initialize command handler
-    command_handler = CommandHandler(agent)
+    command_handler = CommandHandler(agent, journal)
     
     # Display welcome message
     print("\n" + "="*60)
@@ -51,12 +116,15 @@ def run_repl(debug=False):
     print("Type 'exit', 'quit', or press Ctrl+D to exit.")
     print("Press Ctrl+C to interrupt a running task.")
     print("Type /help for available commands.")
+    if journal:
+        print(f"Session: {journal.session_id}  (resume with --resume {journal.session_id})")
     print("="*60 + "\n")
 
     # REPL loop
     while True:
         try:
             # Display prompt and get user input
+            prompt_shown.set()
             user_input = input("Agent> ").strip()
             
             # Handle empty input
@@ -75,7 +143,7 @@ def run_repl(debug=False):
             
             # Process the task through the agent
             try:
-                agent.run_with_utensils(user_input)
+                run_task(agent, user_input, profiler)
             except Exception as e:
                 print(f"\n❌ Error: {e}\n")
                 # Keep the REPL running even if there's an error
@@ -112,12 +180,32 @@ def main():
             action="store_true",
             help="Start in interactive REPL mode (ignores task argument)"
         )
+        parser.add_argument(
+            "--resume",
+            metavar="SESSION_ID",
+            help="Restore the conversation history of a previous session"
+        )
+        parser.add_argument(
+            "--profile",
+            action="store_true",
+            help="Profile each turn with cProfile and tracemalloc"
+        )
+        parser.add_argument(
+            "--profile-dir",
+            default=".agent/profiles",
+            metavar="DIR",
+            help="Directory for --profile results (default: .agent/profiles)"
+        )
 
         args = parser.parse_args()
+        profiler = None
+        if args.profile:
+            from profiling import TurnProfiler
+            profiler = TurnProfiler(args.profile_dir)
 
         # If --repl flag is set or no task is provided, run in REPL mode
         if args.repl or args.task is None:
-            run_repl(debug=args.debug)
+            run_repl(debug=args.debug, profiler=profiler, resume=args.resume)
         else:
             # Set log level to DEBUG if --debug flag is passed
             if args.debug:
@@ -128,8 +216,13 @@ def main():
 
             # Initialize and run the agent with the provided task
             agent = Agent()
-            agent.run_with_utensils(args.task)
-            
+            watch_config(agent)
+            create_journal(agent, args.resume)
+            run_task(agent, args.task, profiler)
+
+        if profiler:
+            print(f"\n{profiler.summary()}\n")
+
     except Exception as e:
         print(f"unknown error when calling api: {e}")
 
@@ -0,0 +1,418 @@
+"""
+Latency and throughput metrics for the agent loop.
+Collects counters and histograms and exports them as Prometheus text or OTLP-style JSON.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+# Default histogram buckets (seconds), roughly Prometheus defaults extended for slow turns
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# Buckets for throughput histograms (tokens per second)
+RATE_BUCKETS = (5, 10, 20, 40, 60, 80, 100, 150, 200, 300, 500)
+
+# Help strings for the metrics recorded by the agent loop
+METRIC_DESCRIPTIONS = {
+    "agent_turn_seconds": "Wall time of a full user turn, including all agentic iterations",
+    "agent_requests_total": "Streaming API requests sent",
+    "agent_rate_limit_wait_seconds": "Time a request was held by the client-side rate limiter, by priority",
+    "agent_request_setup_seconds": "Time from sending a request until the response stream opens",
+    "agent_ttft_seconds": "Time from sending a request until the first text token arrives",
+    "agent_stream_seconds": "Total time spent in a streaming request",
+    "agent_parser_seconds": "Time spent in the utensil parser per request",
+    "agent_output_tokens_per_second": "Output tokens per second after the first token",
+    "agent_tokens_total": "Tokens reported by the API, by type",
+    "agent_utensil_seconds": "Utensil execution time",
+    "agent_utensil_calls_total": "Utensil calls executed",
+    "agent_utensil_errors_total": "Utensil calls that returned an error",
+    "agent_utensil_output_saved_bytes_total": "Bytes of utensil output removed by compression before the "
+                                              "history, by utensil",
+    "agent_hedged_requests_total": "Requests where a hedge request was sent, by winning model",
+    "agent_router_decisions_total": "Model routing decisions, by chosen model and reason",
+    "agent_router_saved_usd_total": "Estimated cost saved by routing compared with the baseline model",
+    "agent_router_saved_seconds_total": "Estimated time to first token saved by routing",
+    "agent_retries_total": "Request retries after transient errors, by error type",
+    "agent_resumed_streams_total": "Retries that resumed a broken stream from its partial text",
+    "agent_prefetch_hits_total": "Utensil calls served from a speculative prefetch",
+    "agent_early_stops_total": "Responses stopped early after a complete utensil batch, by stop reason",
+    "agent_saved_output_tokens_total": "Estimated output tokens saved by stopping early",
+    "agent_saved_seconds_total": "Estimated generation seconds saved by stopping early",
+    "agent_parse_failures_total": "Utensil calls that were cut off, named no utensil or did not match its "
+                                  "parameters, by protocol and reason",
+}
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    """Convert a label dict into a hashable, sorted key."""
+    if not labels:
+        return ()
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    """Format a label key in Prometheus exposition syntax."""
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """A cumulative-bucket histogram that also tracks min and max."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float):
+        """Record a single observation."""
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[i] += 1
+                break
+
+    def mean(self) -> float:
+        """Return the mean of all observations (0.0 if empty)."""
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimate a quantile from the bucket counts.
+
+        Uses linear interpolation inside the bucket, clamped to the observed min/max.
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for bound, n in zip(self.buckets, self.bucket_counts):
+            if n and seen + n >= rank:
+                estimate = lower + (bound - lower) * ((rank - seen) / n)
+                return min(max(estimate, self.min), self.max)
+            seen += n
+            lower = bound
+        return self.max
+
+
+class Metrics:
+    """Thread-safe registry of counters and histograms keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self.descriptions: Dict[str, str] = dict(METRIC_DESCRIPTIONS)
+        self.started_at = time.time()
+
+    def describe(self, name: str, description: str):
+        """Attach a help string to a metric name."""
+        self.descriptions[name] = description
+
+    def inc(self, name: str, value: float = 1, labels: Optional[Dict[str, str]] = None):
+        """Increment a counter."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Optional[Dict[str, str]] = None,
+                buckets=DEFAULT_BUCKETS):
+        """Record an observation in a histogram."""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(buckets)
+            hist.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, labels: Optional[Dict[str, str]] = None):
+        """Context manager that observes the elapsed wall time in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def counter_value(self, name: str, labels: Optional[Dict[str, str]] = None) -> float:
+        """Return the current value of a counter (0 if never incremented)."""
+        return self.counters.get(name, {}).get(_label_key(labels), 0)
+
+    def counter_total(self, name: str) -> float:
+        """Return the sum of a counter across all label sets."""
+        return sum(self.counters.get(name, {}).values())
+
+    def histogram(self, name: str, labels: Optional[Dict[str, str]] = None) -> Optional[Histogram]:
+        """Return a histogram, or None if it has no observations."""
+        return self.histograms.get(name, {}).get(_label_key(labels))
+
+    def merged_histogram(self, name: str) -> Optional[Histogram]:
+        """Return a histogram combining every label set of a metric, or None if empty."""
+        series = self.histograms.get(name)
+        if not series:
+            return None
+        merged = None
+        with self._lock:
+            for hist in series.values():
+                if merged is None:
+                    merged = Histogram(hist.buckets)
+                merged.count += hist.count
+                merged.sum += hist.sum
+                merged.bucket_counts = [a + b for a, b in zip(merged.bucket_counts, hist.bucket_counts)]
+                merged.min = hist.min if merged.min is None else min(merged.min, hist.min)
+                merged.max = hist.max if merged.max is None else max(merged.max, hist.max)
+        return merged
+
+    def to_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted(self.counters):
+                if name in self.descriptions:
+                    lines.append(f"# HELP {name} {self.descriptions[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self.counters[name].items()):
+                    lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name in sorted(self.histograms):
+                if name in self.descriptions:
+                    lines.append(f"# HELP {name} {self.descriptions[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, n in zip(hist.buckets, hist.bucket_counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {hist.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_otlp(self) -> dict:
+        """Render all metrics as an OTLP/JSON ``ResourceMetrics`` payload."""
+        now_ns = str(time.time_ns())
+        start_ns = str(int(self.started_at * 1e9))
+
+        def attributes(key):
+            return [{"key": k, "value": {"stringValue": v}} for k, v in key]
+
+        metrics = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                metrics.append({
+                    "name": name,
+                    "description": self.descriptions.get(name, ""),
+                    "sum": {
+                        "aggregationTemporality": 2,  # CUMULATIVE
+                        "isMonotonic": True,
+                        "dataPoints": [
+                            {"attributes": attributes(key), "startTimeUnixNano": start_ns,
+                             "timeUnixNano": now_ns, "asDouble": value}
+                            for key, value in sorted(series.items())
+                        ],
+                    },
+                })
+            for name, series in sorted(self.histograms.items()):
+                metrics.append({
+                    "name": name,
+                    "description": self.descriptions.get(name, ""),
+                    "histogram": {
+                        "aggregationTemporality": 2,
+                        "dataPoints": [
+                            {"attributes": attributes(key), "startTimeUnixNano": start_ns,
+                             "timeUnixNano": now_ns, "count": str(hist.count), "sum": hist.sum,
+                             "min": hist.min, "max": hist.max,
+                             "explicitBounds": list(hist.buckets),
+                             "bucketCounts": [str(n) for n in hist.bucket_counts]
+                             + [str(hist.count - sum(hist.bucket_counts))]}
+                            for key, hist in sorted(series.items())
+                        ],
+                    },
+                })
+        return {
+            "resourceMetrics": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "agencia"}}]},
+                "scopeMetrics": [{"scope": {"name": "agencia.metrics"}, "metrics": metrics}],
+            }]
+        }
+
+    def export(self, path: str, fmt: str = "prometheus"):
+        """
+        Export metrics to a file.
+
+        Prometheus output replaces the file atomically (textfile-collector style);
+        OTLP output appends one JSON document per line.
+
+        Args:
+            path: Destination file path
+            fmt: Either "prometheus" or "otlp"
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        if fmt == "prometheus":
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        elif fmt == "otlp":
+            with open(path, 'a') as f:
+                f.write(json.dumps(self.to_otlp(), separators=(",", ":")) + "\n")
+        else:
+            raise ValueError(f"Unknown metrics export format '{fmt}'")
+
+    def summary(self) -> str:
+        """Build a human-readable summary of the session for the /stats command."""
+        lines = []
+
+        turns = self.merged_histogram("agent_turn_seconds")
+        requests = self.counter_total("agent_requests_total")
+        hedged = self.counter_total("agent_hedged_requests_total")
+        retries = self.counter_total("agent_retries_total")
+        lines.append(f"Turns: {turns.count if turns else 0}    API requests: {requests:g}"
+                     + (f"    hedged: {hedged:g}" if hedged else "")
+                     + (f"    retries: {retries:g} ({self.counter_total('agent_resumed_streams_total'):g} resumed)"
+                        if retries else ""))
+
+        for name, label in [
+            ("agent_turn_seconds", "Turn duration"),
+            ("agent_rate_limit_wait_seconds", "Rate-limit wait"),
+            ("agent_request_setup_seconds", "Request setup"),
+            ("agent_ttft_seconds", "Time to first token"),
+            ("agent_stream_seconds", "Stream duration"),
+            ("agent_parser_seconds", "Parser time/request"),
+        ]:
+            hist = self.merged_histogram(name)
+            if hist:
+                lines.append(
+                    f"{label:<22} avg {hist.mean():7.3f}s  p50 {hist.quantile(0.5):7.3f}s  "
+                    f"p95 {hist.quantile(0.95):7.3f}s  max {hist.max:7.3f}s"
+                )
+
+        tps = self.merged_histogram("agent_output_tokens_per_second")
+        if tps:
+            lines.append(f"{'Output tokens/sec':<22} avg {tps.mean():7.1f}   max {tps.max:7.1f}")
+
+        token_parts = []
+        for kind in ("input", "output", "cache_read", "cache_creation"):
+            total = sum(
+                v for k, v in self.counters.get("agent_tokens_total", {}).items()
+                if ("type", kind) in k
+            )
+            if total:
+                token_parts.append(f"{kind}={total:g}")
+        if token_parts:
+            lines.append("Tokens: " + "  ".join(token_parts))
+
+        rerouted = sum(
+            v for k, v in self.counters.get("agent_router_decisions_total", {}).items()
+            if ("reason", "after_utensil_result") in k
+        )
+        if rerouted:
+            lines.append(
+                f"Routed to fast model: {rerouted:g} requests  "
+                f"(~${self.counter_total('agent_router_saved_usd_total'):.4f}, "
+                f"~{self.counter_total('agent_router_saved_seconds_total'):.1f}s TTFT saved)"
+            )
+
+        early_stops = self.counter_total("agent_early_stops_total")
+        if early_stops:
+            lines.append(
+                f"Early stops: {early_stops:g}  (~{self.counter_total('agent_saved_output_tokens_total'):g} "
+                f"output tokens, ~{self.counter_total('agent_saved_seconds_total'):.1f}s saved)"
+            )
+
+        utensil_series = self.histograms.get("agent_utensil_seconds", {})
+        if utensil_series:
+            prefetch_hits = self.counter_total("agent_prefetch_hits_total")
+            lines.append(f"Utensils: (prefetch hits: {prefetch_hits:g})" if prefetch_hits else "Utensils:")
+            for key, hist in sorted(utensil_series.items()):
+                name = dict(key).get("utensil", "?")
+                lines.append(
+                    f"  {name:<20} calls {hist.count:4d}  avg {hist.mean():7.3f}s  max {hist.max:7.3f}s"
+                )
+
+        return "\n".join(lines)
+
+
+class MetricsObserver:
+    """Event listener that records agent loop events into a Metrics registry."""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def on_request_end(self, model, setup_seconds, ttft_seconds, stream_seconds,
+                       generation_seconds, parser_seconds, usage, stop_reason=None,
+                       savings=None, hedged=False, rate_limit_wait_seconds=0.0, priority=None, **_):
+        labels = {"model": model}
+        self.metrics.inc("agent_requests_total", labels=labels)
+        if rate_limit_wait_seconds:
+            self.metrics.observe("agent_rate_limit_wait_seconds", rate_limit_wait_seconds,
+                                 {**labels, "priority": priority or "interactive"})
+        if hedged:
+            self.metrics.inc("agent_hedged_requests_total", labels=labels)
+        if savings is not None and savings.tokens:
+            self.metrics.inc("agent_early_stops_total", labels={**labels, "reason": stop_reason})
+            self.metrics.inc("agent_saved_output_tokens_total", savings.tokens, labels)
+            self.metrics.inc("agent_saved_seconds_total", savings.seconds, labels)
+        self.metrics.observe("agent_request_setup_seconds", setup_seconds, labels)
+        self.metrics.observe("agent_stream_seconds", stream_seconds, labels)
+        self.metrics.observe("agent_parser_seconds", parser_seconds, labels)
+        if ttft_seconds is not None:
+            self.metrics.observe("agent_ttft_seconds", ttft_seconds, labels)
+
+        if usage is None:
+            return
+        for kind, value in [
+            ("input", usage.input_tokens),
+            ("output", usage.output_tokens),
+            ("cache_read", getattr(usage, "cache_read_input_tokens", None)),
+            ("cache_creation", getattr(usage, "cache_creation_input_tokens", None)),
+        ]:
+            if value:
+                self.metrics.inc("agent_tokens_total", value, {**labels, "type": kind})
+
+        if usage.output_tokens and generation_seconds > 0:
+            self.metrics.observe("agent_output_tokens_per_second",
+                                 usage.output_tokens / generation_seconds, labels,
+                                 buckets=RATE_BUCKETS)
+
+    def on_retry(self, model, error, resumed_chars, **_):
+        self.metrics.inc("agent_retries_total", labels={"model": model, "error": type(error).__name__})
+        if resumed_chars:
+            self.metrics.inc("agent_resumed_streams_total", labels={"model": model})
+
+    def on_utensil_end(self, name, result, seconds, prefetched=False, saved_bytes=0, **_):
+        labels = {"utensil": name}
+        if saved_bytes:
+            self.metrics.inc("agent_utensil_output_saved_bytes_total", saved_bytes, labels)
+        self.metrics.observe("agent_utensil_seconds", seconds, labels)
+        self.metrics.inc("agent_utensil_calls_total", labels=labels)
+        if prefetched:
+            self.metrics.inc("agent_prefetch_hits_total", labels=labels)
+        if result.startswith("Error"):
+            self.metrics.inc("agent_utensil_errors_total", labels=labels)
+
+    def on_parse_failure(self, protocol, reason, **_):
+        self.metrics.inc("agent_parse_failures_total", labels={"protocol": protocol, "reason": reason})
+
+    def on_turn_end(self, seconds, **_):
+        self.metrics.observe("agent_turn_seconds", seconds)
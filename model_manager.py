@@ -3,12 +3,158 @@ Model management for Agent.
 Handles model selection, switching, and validation.
 """
 
-from typing import Optional, Dict, Any
-import toml
+from collections import deque
+from dataclasses import dataclass, fields
+from typing import Optional, Dict, Any, Callable, List, Tuple
+import logging
+import os
+import threading
+
+# tomllib (3.11+) parses config.toml far faster than the toml package and needs no install
+try:
+    import tomllib as _toml_reader
+    _TOML_MODE = "rb"
+except ImportError:
+    import toml as _toml_reader
+    _TOML_MODE = "r"
+
+logger = logging.getLogger(__name__)
+
+# Parsed config files keyed by path, with the (mtime_ns, size) they were parsed at
+_config_cache: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_config_lock = threading.Lock()
+
+
+def load_config(path: str = "config.toml") -> Dict[str, Any]:
+    """
+    Load a TOML config file, reusing the parsed result while the file is unchanged.
+
+    The file is re-parsed only when its mtime or size changes, so every
+    ModelManager (one per agent) shares one parse. Treat the result as read-only.
+
+    Raises:
+        OSError: If the file cannot be read
+    """
+    st = os.stat(path)
+    state = (st.st_mtime_ns, st.st_size)
+    with _config_lock:
+        cached = _config_cache.get(path)
+        if cached is not None and cached[0] == state:
+            return cached[1]
+    with open(path, _TOML_MODE) as f:
+        config = _toml_reader.load(f)
+    with _config_lock:
+        _config_cache[path] = (state, config)
+    return config
+
+
+class LatencyStats:
+    """Rolling per-model record of time-to-first-token samples."""
+
+    def __init__(self, window: int = 50):
+        self.window = window
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, ttft: float):
+        """Record a time-to-first-token sample in seconds."""
+        with self._lock:
+            self._samples.setdefault(model, deque(maxlen=self.window)).append(ttft)
+
+    def count(self, model: str) -> int:
+        """Return the number of samples held for a model."""
+        return len(self._samples.get(model, ()))
+
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        """Return the q-quantile of a model's recent samples, or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """Everything the agent knows about one model, from its entry in config.toml."""
+    name: str
+    display_name: str
+    description: str = ""
+    max_tokens: int = 8192
+    context_window: int = 200000
+    # USD per million tokens; None when not configured
+    input_price: Optional[float] = None
+    output_price: Optional[float] = None
+    # Target time to first token; None when not configured
+    ttft_target_ms: Optional[float] = None
+
+    @classmethod
+    def from_entry(cls, name: str, entry: Dict[str, Any]) -> "ModelSpec":
+        """Build a spec from a ``[models.<name>]`` table, ignoring unknown keys."""
+        known = {f.name for f in fields(cls)} - {"name"}
+        values = {k: v for k, v in entry.items() if k in known}
+        values.setdefault("display_name", name)
+        return cls(name=name, **values)
+
+    def cost(self, input_tokens: int, output_tokens: int) -> Optional[float]:
+        """Return the USD cost of a request, or None without prices."""
+        if self.input_price is None or self.output_price is None:
+            return None
+        return (input_tokens * self.input_price + output_tokens * self.output_price) / 1e6
+
+
+# Used when config.toml has no [models] tables
+DEFAULT_MODELS = {
+    "claude-3-5-sonnet-20241022": {
+        "display_name": "Claude 3.5 Sonnet",
+        "max_tokens": 8000,
+        "description": "Most capable model, best for complex tasks"
+    },
+    "claude-3-5-haiku-20241022": {
+        "display_name": "Claude 3.5 Haiku",
+        "max_tokens": 8000,
+        "description": "Faster and more cost-effective, good for simpler tasks"
+    }
+}
+
+
+@dataclass(frozen=True)
+class _Snapshot:
+    """One consistent view of the config; replaced as a whole on reload."""
+    config: Dict[str, Any]
+    models: Dict[str, Dict[str, Any]]
+    specs: Dict[str, ModelSpec]
+    default_model: str
+
+
+def _snapshot(config: Dict[str, Any]) -> _Snapshot:
+    """
+    Validate a parsed config and derive its model specs.
+
+    Raises:
+        ValueError: If the config has no [model] name or a model entry is invalid
+    """
+    try:
+        default_model = config["model"]["name"]
+    except (KeyError, TypeError):
+        raise ValueError("config has no [model] name")
+    models = config.get("models") or DEFAULT_MODELS
+    try:
+        specs = {name: ModelSpec.from_entry(name, entry) for name, entry in models.items()}
+    except (AttributeError, TypeError) as e:
+        raise ValueError(f"invalid [models] entry: {e}")
+    return _Snapshot(config, models, specs, default_model)
 
 
 class ModelManager:
-    """Manages model selection and switching during conversations."""
+    """
+    Manages model selection and switching during conversations.
+
+    The config is held as one immutable snapshot that ``reload_if_changed``
+    (called by the watcher thread from ``watch``) swaps in a single assignment,
+    so readers always see either the old or the new config, never a mix. A
+    config that fails to parse or validate is ignored and the old one kept.
+    """
     
     def __init__(self, config_path: str = "config.toml"):
         """
@@ -18,29 +164,116 @@ class ModelManager:
             config_path: Path to the config.toml file
         """
         self.config_path = config_path
-        self.config = self._load_config()
-        self.current_model = self.config["model"]["name"]
-        self.available_models = self.config.get("models", {})
-        
-        if not self.available_models:
-            # Fallback to default models if not in config
-            self.available_models = {
-                "claude-3-5-sonnet-20241022": {
-                    "display_name": "Claude 3.5 Sonnet",
-                    "max_tokens": 8000,
-                    "description": "Most capable model, best for complex tasks"
-                },
-                "claude-3-5-haiku-20241022": {
-                    "display_name": "Claude 3.5 Haiku",
-                    "max_tokens": 8000,
-                    "description": "Faster and more cost-effective, good for simpler tasks"
-                }
-            }
+        self._snapshot = _snapshot(self._load_config())
+        self.current_model = self._snapshot.default_model
+        self.latency = LatencyStats()
+        # Set when the user picks a model with /model, which disables per-request routing
+        self.pinned = False
+        self._listeners: List[Callable[["ModelManager"], None]] = []
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._stop_watching = threading.Event()
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        """The current parsed config (read-only)."""
+        return self._snapshot.config
+
+    @property
+    def available_models(self) -> Dict[str, Dict[str, Any]]:
+        """The current model entries, keyed by model id."""
+        return self._snapshot.models
     
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from TOML file."""
-        with open(self.config_path, 'r') as f:
-            return toml.load(f)
+        return load_config(self.config_path)
+
+    def spec(self, model_name: Optional[str] = None) -> ModelSpec:
+        """
+        Get a model's spec: limits, context window, prices and latency target.
+
+        This is the one query API for model metadata; other components should
+        use it rather than reading config entries.
+
+        Args:
+            model_name: The model to look up. If None, uses the current model.
+
+        Raises:
+            ValueError: If the model is not configured
+        """
+        model = model_name or self.current_model
+        spec = self._snapshot.specs.get(model)
+        if spec is None:
+            raise ValueError(f"Model '{model}' not found in available models")
+        return spec
+
+    def on_reload(self, listener: Callable[["ModelManager"], None]):
+        """Register a function called with this manager after each successful reload."""
+        self._listeners.append(listener)
+
+    def reload_if_changed(self) -> bool:
+        """
+        Reload config.toml if it changed on disk.
+
+        A model chosen with /model stays selected while it still exists;
+        otherwise the current model follows the config's [model] name.
+
+        Returns:
+            True if a new config was swapped in
+        """
+        with self._reload_lock:
+            try:
+                config = self._load_config()
+            except OSError as e:
+                logger.warning(f"Could not read {self.config_path}: {e}")
+                return False
+            except Exception as e:
+                # Usually a half-written file; the next change triggers another attempt
+                logger.warning(f"Ignoring invalid {self.config_path}: {e}")
+                return False
+            if config is self._snapshot.config:
+                return False
+            try:
+                snapshot = _snapshot(config)
+            except ValueError as e:
+                logger.warning(f"Ignoring invalid {self.config_path}: {e}")
+                return False
+
+            self._snapshot = snapshot
+            if not (self.pinned and self.current_model in snapshot.specs):
+                self.current_model = snapshot.default_model
+                self.pinned = False
+            logger.info(f"Reloaded {self.config_path}")
+
+        for listener in self._listeners:
+            try:
+                listener(self)
+            except Exception as e:
+                logger.warning(f"Config reload listener failed: {e}")
+        return True
+
+    def watch(self, interval: float = 1.0) -> threading.Thread:
+        """
+        Start a daemon thread that reloads the config whenever the file changes.
+
+        Args:
+            interval: Seconds between checks; each check is a single stat() unless the file changed
+
+        Returns:
+            The watcher thread (already running; a second call returns the same thread)
+        """
+        if self._watcher is None:
+            def run():
+                while not self._stop_watching.wait(interval):
+                    self.reload_if_changed()
+
+            self._watcher = threading.Thread(target=run, name="config-watcher", daemon=True)
+            self._watcher.start()
+        return self._watcher
+
+    def stop_watching(self):
+        """Stop the watcher thread, if running."""
+        self._stop_watching.set()
     
     def get_current_model(self) -> str:
         """Get the currently active model name."""
@@ -79,7 +312,12 @@ class ModelManager:
             return False
         
         self.current_model = new_model
+        self.pinned = True
         return True
+
+    def unpin(self):
+        """Let the router choose models per request again."""
+        self.pinned = False
     
     def validate_model(self, model_name: str) -> bool:
         """
@@ -103,9 +341,51 @@ class ModelManager:
         Returns:
             The maximum number of tokens for the model.
         """
-        model = model_name or self.current_model
-        return self.get_model_info(model)["max_tokens"]
+        return self.spec(model_name).max_tokens
     
     def get_temperature(self) -> float:
         """Get the temperature setting from config."""
-        return self.config["model"].get("temperature", 1.0)
\ No newline at end of file
+        return self.config["model"].get("temperature", 1.0)
+
+    def get_hedging_config(self) -> Dict[str, Any]:
+        """Get the [hedging] section from config (empty if absent)."""
+        return self.config.get("hedging", {})
+
+    def hedge_threshold(self, model_name: Optional[str] = None) -> float:
+        """
+        Get the time-to-first-token threshold (seconds) after which a request is hedged.
+
+        Starts from the model's ``ttft_target_ms`` (or ``ttft_threshold_ms`` from
+        [hedging] when the model has no target) and, once enough samples exist, adapts to
+        ``multiplier`` times the model's recent ``percentile`` TTFT, never going
+        below ``min_threshold_ms``.
+        """
+        model = model_name or self.current_model
+        config = self.get_hedging_config()
+        target = self.spec(model).ttft_target_ms if self.validate_model(model) else None
+        threshold = (target or config.get("ttft_threshold_ms", 3000)) / 1000
+        if config.get("adaptive", True) and self.latency.count(model) >= config.get("min_samples", 5):
+            observed = self.latency.quantile(model, config.get("percentile", 0.9))
+            threshold = max(config.get("min_threshold_ms", 500) / 1000,
+                            observed * config.get("multiplier", 1.5))
+        return threshold
+
+    def hedge_model(self, model_name: Optional[str] = None) -> str:
+        """
+        Choose the model for a hedge request.
+
+        Uses ``fallback_model`` from config if set; otherwise the available model
+        with the lowest observed median TTFT, if it is faster than this one;
+        otherwise the same model.
+        """
+        model = model_name or self.current_model
+        fallback = self.get_hedging_config().get("fallback_model")
+        if fallback and self.validate_model(fallback):
+            return fallback
+
+        best, best_median = model, self.latency.quantile(model, 0.5)
+        for candidate in self.available_models:
+            median = self.latency.quantile(candidate, 0.5)
+            if median is not None and (best_median is None or median < best_median):
+                best, best_median = candidate, median
+        return best
@@ -0,0 +1,281 @@
+"""
+Normalization and compression of utensil output before it enters the history.
+Strips terminal control sequences, collapses carriage-return overwrites, folds repeated lines and applies size budgets.
+"""
+
+import re
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+
+# CSI sequences (colors, cursor movement), OSC sequences (titles, hyperlinks) and two-byte escapes
+ANSI_ESCAPE = re.compile(r"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)?|[@-Z\\-_])")
+# Other control characters, except tab (newline and carriage return never reach it)
+CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b-\x1f\x7f]")
+# Numbers and hex ids; lines equal apart from these are near-duplicates (progress, timings, counters)
+VARIABLE_PARTS = re.compile(r"0x[0-9a-fA-F]+|\b(?=[0-9a-f]*\d)[0-9a-f]{7,}\b|\d+(?:\.\d+)?")
+
+# Chunk size used when compressing an output that is already a single string
+CHUNK_CHARS = 1 << 16
+# Distinct lines tracked for repeat detection; later new lines are not tracked
+MAX_TRACKED_LINES = 10000
+# Lines shorter than this are never dropped as repeats (braces, "ok", separators)
+MIN_REPEAT_CHARS = 8
+
+# The compressor for the utensil call running in this thread, for utensils that stream output into it
+_active_compressor: ContextVar = ContextVar("active_compressor", default=None)
+
+
+def clean(segment: str) -> str:
+    """Strip escape sequences and control characters from a piece of a line."""
+    if "\x1b" in segment:
+        segment = ANSI_ESCAPE.sub("", segment)
+    return CONTROL_CHARS.sub("", segment).rstrip()
+
+
+class OutputCompressor:
+    """
+    Single-pass compressor for one utensil output, fed in chunks.
+
+    Memory stays bounded by the budget and ``max_line_chars`` however large the
+    output is: lines are processed as they complete, and once the head half of
+    the budget is full only a rolling tail is kept.
+
+    - Escape sequences and control characters are removed.
+    - Text overwritten with ``\\r`` is dropped; the last visible segment of each line is kept.
+    - With ``fold``, runs of identical or near-identical lines (differing only in
+      numbers or ids) keep their first and last line plus a count, and lines
+      already seen ``max_repeats`` times anywhere earlier are dropped and counted.
+    - With a ``budget``, the middle of the output is replaced by a marker.
+    """
+
+    def __init__(self, budget: int = 0, fold: bool = True, max_line_chars: int = 2000, max_repeats: int = 3):
+        """
+        Initialize the compressor.
+
+        Args:
+            budget: Characters of output to keep, split between head and tail (0 for no limit)
+            fold: Whether to fold repeated and near-duplicate lines
+            max_line_chars: Longer lines are truncated
+            max_repeats: Times a line may appear before later copies are dropped
+        """
+        self.budget = budget
+        self.fold = fold
+        self.max_line_chars = max_line_chars
+        self.max_repeats = max_repeats
+
+        self.input_bytes = 0
+        self.output_bytes = 0
+        # Lines removed by folding, repeat dropping or the budget
+        self.removed_lines = 0
+
+        # The line being assembled: its current segment and the last non-empty overwritten one
+        self._segment: List[str] = []
+        self._segment_chars = 0
+        self._overwritten = ""
+
+        # The current run of similar lines
+        self._run_first: Optional[str] = None
+        self._run_last = ""
+        self._run_key = ""
+        self._run_count = 0
+        self._run_exact = True
+
+        self._seen: Dict[str, int] = {}
+        self._repeats_dropped = 0
+
+        self._head: List[str] = []
+        self._head_chars = 0
+        self._tail: deque = deque()
+        self._tail_chars = 0
+        self._omitted_lines = 0
+        self._omitted_chars = 0
+        # Set once finish() has produced the output
+        self.finished = False
+
+    def fresh(self) -> "OutputCompressor":
+        """A new compressor with the same settings."""
+        return OutputCompressor(self.budget, self.fold, self.max_line_chars, self.max_repeats)
+
+    @property
+    def saved_bytes(self) -> int:
+        return max(self.input_bytes - self.output_bytes, 0)
+
+    def feed(self, text: str):
+        """Process the next chunk of output."""
+        self.input_bytes += len(text.encode("utf-8", "replace"))
+        start = 0
+        while True:
+            newline = text.find("\n", start)
+            if newline < 0:
+                self._add_to_line(text[start:])
+                return
+            self._add_to_line(text[start:newline])
+            self._end_line()
+            start = newline + 1
+
+    def finish(self) -> str:
+        """Flush pending lines and return the compressed output."""
+        if self._segment or self._overwritten:
+            self._end_line()
+        self._flush_run()
+
+        lines = list(self._head)
+        if self._omitted_lines:
+            lines.append(f"[... {self._omitted_lines} lines ({self._omitted_chars} chars) omitted ...]")
+        lines.extend(self._tail)
+        if self._repeats_dropped:
+            lines.append(f"[{self._repeats_dropped} more repeats of lines shown above omitted]")
+        output = "\n".join(lines)
+        self.output_bytes = len(output.encode("utf-8", "replace"))
+        if self.removed_lines and self.saved_bytes:
+            output += f"\n[output compressed from {self.input_bytes} to {self.output_bytes} bytes]"
+            self.output_bytes = len(output.encode("utf-8", "replace"))
+        self.finished = True
+        return output
+
+    def compress(self, text: str) -> str:
+        """Compress a complete output string."""
+        return self.compress_stream(text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS))
+
+    def compress_stream(self, chunks: Iterable[str]) -> str:
+        """Compress an output arriving as chunks, e.g. reads from a pipe."""
+        for chunk in chunks:
+            self.feed(chunk)
+        return self.finish()
+
+    def _add_to_line(self, piece: str):
+        if "\r" in piece:
+            *overwritten, piece = piece.split("\r")
+            for part in overwritten:
+                self._segment.append(part)
+                finished = clean("".join(self._segment))
+                if finished:
+                    self._overwritten = finished
+                self._segment, self._segment_chars = [], 0
+        # Keep some slack beyond max_line_chars since escape sequences are not stripped yet
+        room = 2 * self.max_line_chars - self._segment_chars
+        if room > 0 and piece:
+            self._segment.append(piece[:room])
+            self._segment_chars += min(len(piece), room)
+
+    def _end_line(self):
+        line = clean("".join(self._segment)) or self._overwritten
+        self._segment, self._segment_chars, self._overwritten = [], 0, ""
+        if len(line) > self.max_line_chars:
+            line = line[:self.max_line_chars] + " [line truncated]"
+        if not self.fold:
+            self._emit(line)
+            return
+
+        key = " ".join(VARIABLE_PARTS.sub("#", line).split())
+        if self._run_first is not None and key == self._run_key:
+            self._run_count += 1
+            self._run_exact = self._run_exact and line == self._run_first
+            self._run_last = line
+            return
+        self._flush_run()
+
+        if len(line) >= MIN_REPEAT_CHARS:
+            count = self._seen.get(line, 0)
+            if count >= self.max_repeats:
+                self._repeats_dropped += 1
+                self.removed_lines += 1
+                return
+            if count or len(self._seen) < MAX_TRACKED_LINES:
+                self._seen[line] = count + 1
+        self._run_first, self._run_last, self._run_key = line, line, key
+        self._run_count, self._run_exact = 1, True
+
+    def _flush_run(self):
+        if self._run_first is None:
+            return
+        first, last, count = self._run_first, self._run_last, self._run_count
+        self._run_first = None
+        self._emit(first)
+        if count == 1 or not first:
+            # A run of blank lines becomes one blank line
+            self.removed_lines += count - 1
+        elif count == 2:
+            self._emit(last)
+        elif self._run_exact:
+            self._emit(f"[previous line repeated {count - 1} more times]")
+            self.removed_lines += count - 1
+        else:
+            self._emit(f"[... {count - 2} similar lines ...]")
+            self._emit(last)
+            self.removed_lines += count - 2
+
+    def _emit(self, line: str):
+        size = len(line) + 1
+        if not self.budget or (not self._tail and self._head_chars + size <= self.budget // 2):
+            self._head.append(line)
+            self._head_chars += size
+            return
+        self._tail.append(line)
+        self._tail_chars += size
+        while self._tail and self._head_chars + self._tail_chars > self.budget:
+            dropped = self._tail.popleft()
+            self._tail_chars -= len(dropped) + 1
+            self._omitted_lines += 1
+            self._omitted_chars += len(dropped) + 1
+            self.removed_lines += 1
+
+
+@contextmanager
+def compressing(compressor: Optional[OutputCompressor]):
+    """Make ``compressor`` the active one while a utensil call runs, so the utensil can stream into it."""
+    token = _active_compressor.set(compressor)
+    try:
+        yield compressor
+    finally:
+        _active_compressor.reset(token)
+
+
+def active_compressor() -> Optional[OutputCompressor]:
+    """
+    The compressor for the utensil call running in this thread, or None to return output verbatim.
+
+    A utensil that feeds its output into it must return ``finish()``'s result.
+    """
+    return _active_compressor.get()
+
+
+class OutputPolicy:
+    """Per-utensil compression settings from the ``[output]`` section of config.toml."""
+
+    def __init__(self, budgets: Dict[str, int], fold: Iterable[str], max_line_chars: int = 2000,
+                 max_repeats: int = 3):
+        """
+        Initialize the policy.
+
+        Args:
+            budgets: Characters kept per utensil (0 for no limit); utensils not listed are left untouched
+            fold: Utensils whose repeated and near-duplicate lines are folded
+            max_line_chars: Longer lines are truncated
+            max_repeats: Times a line may appear before later copies are dropped
+        """
+        self.budgets = dict(budgets)
+        self.fold = set(fold)
+        self.max_line_chars = max_line_chars
+        self.max_repeats = max_repeats
+
+    @classmethod
+    def from_config(cls, config: Dict) -> Optional["OutputPolicy"]:
+        """Build from the ``[output]`` section of config.toml, or None if disabled."""
+        if not config.get("compress", True):
+            return None
+        return cls(
+            budgets=config.get("budgets", {"execute_command": 20000}),
+            fold=config.get("fold", ["execute_command"]),
+            max_line_chars=config.get("max_line_chars", 2000),
+            max_repeats=config.get("max_repeats", 3),
+        )
+
+    def compressor(self, name: str) -> Optional[OutputCompressor]:
+        """Return a fresh compressor for a utensil's output, or None to keep it verbatim."""
+        if name not in self.budgets and name not in self.fold:
+            return None
+        return OutputCompressor(budget=self.budgets.get(name, 0), fold=name in self.fold,
+                                max_line_chars=self.max_line_chars, max_repeats=self.max_repeats)
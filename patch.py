@@ -0,0 +1,343 @@
+"""
+Unified diff parsing and fuzzy, all-or-nothing application for the apply_patch utensil.
+Every hunk of every file is located before anything is written; files are replaced atomically.
+"""
+
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+DEV_NULL = "/dev/null"
+
+
+class PatchError(Exception):
+    """A patch that cannot be parsed or applied; nothing has been written."""
+
+
+@dataclass
+class Hunk:
+    """One ``@@`` block: its position hint and its lines as (op, text) with op in ' ', '-', '+'."""
+    old_start: int
+    header: str
+    lines: List[Tuple[str, str]] = field(default_factory=list)
+
+    @property
+    def old_lines(self) -> List[str]:
+        return [text for op, text in self.lines if op != "+"]
+
+    @property
+    def added(self) -> int:
+        return sum(1 for op, _ in self.lines if op == "+")
+
+    @property
+    def removed(self) -> int:
+        return sum(1 for op, _ in self.lines if op == "-")
+
+
+@dataclass
+class FilePatch:
+    """The hunks for one file. ``old_path`` is None for a new file, ``new_path`` None for a deletion."""
+    old_path: Optional[str]
+    new_path: Optional[str]
+    hunks: List[Hunk] = field(default_factory=list)
+    # Set by "\ No newline at end of file" after the last added line
+    no_newline_at_end: bool = False
+
+    @property
+    def path(self) -> str:
+        return self.new_path or self.old_path
+
+
+def _strip_prefix(path: str) -> Optional[str]:
+    path = path.split("\t")[0].strip()
+    if path == DEV_NULL:
+        return None
+    if path.startswith(("a/", "b/")):
+        return path[2:]
+    return path
+
+
+def parse_patch(text: str) -> List[FilePatch]:
+    """
+    Parse a unified diff covering one or more files.
+
+    Header line counts are not trusted (models often miscount); a hunk runs
+    until the next hunk or file header. A blank line inside a hunk is read as
+    an empty context line.
+
+    Raises:
+        PatchError: If the text contains no file headers or a hunk is malformed
+    """
+    files: List[FilePatch] = []
+    current: Optional[FilePatch] = None
+    hunk: Optional[Hunk] = None
+    lines = text.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ "):
+            current = FilePatch(_strip_prefix(line[4:]), _strip_prefix(lines[i + 1][4:]))
+            if current.path is None:
+                raise PatchError(f"file header without a path: {line!r}")
+            files.append(current)
+            hunk = None
+            i += 2
+            continue
+        if line.startswith("@@"):
+            match = HUNK_HEADER.match(line)
+            if current is None or not match:
+                raise PatchError(f"unexpected hunk header: {line!r}")
+            hunk = Hunk(int(match.group(1)), line)
+            current.hunks.append(hunk)
+        elif hunk is not None and line[:1] in (" ", "-", "+"):
+            hunk.lines.append((line[0], line[1:]))
+        elif hunk is not None and line == "":
+            hunk.lines.append((" ", ""))
+        elif hunk is not None and line.startswith("\\"):
+            # "\ No newline at end of file" applies to the line before it
+            if hunk.lines and hunk.lines[-1][0] == "+":
+                current.no_newline_at_end = True
+        # Anything else (diff --git, index, prose around the diff) is ignored
+        i += 1
+
+    if not files:
+        raise PatchError("no file headers found (expected '--- a/path' and '+++ b/path' lines)")
+    for file_patch in files:
+        # Trailing blank lines after the last hunk are separators, not context
+        for h in file_patch.hunks:
+            while h.lines and h.lines[-1] == (" ", ""):
+                h.lines.pop()
+        if not file_patch.hunks and file_patch.new_path is not None:
+            raise PatchError(f"no hunks for {file_patch.path}")
+    return files
+
+
+def patched_paths(text: str) -> List[str]:
+    """Return the paths a patch touches, or an empty list if it does not parse."""
+    try:
+        return [p for f in parse_patch(text) for p in {f.old_path, f.new_path} if p]
+    except PatchError:
+        return []
+
+
+def _normalize(line: str) -> str:
+    return " ".join(line.split())
+
+
+def _find(lines: List[str], needle: List[str], hint: int, start: int, loose: bool) -> Optional[int]:
+    """Return the match position of ``needle`` in ``lines[start:]`` closest to ``hint``."""
+    if loose:
+        lines = [_normalize(line) for line in lines]
+        needle = [_normalize(line) for line in needle]
+    last = len(lines) - len(needle)
+    hint = min(max(hint, start), max(last, start))
+    for distance in range(0, max(hint - start, last - hint) + 1):
+        for pos in (hint - distance, hint + distance):
+            if start <= pos <= last and lines[pos:pos + len(needle)] == needle:
+                return pos
+    return None
+
+
+def _locate(lines: List[str], hunk: Hunk, hint: int, start: int, fuzz: int) -> Optional[Tuple[int, int, int, str]]:
+    """
+    Find where a hunk applies.
+
+    Tries an exact match, then one ignoring whitespace differences, each time
+    dropping up to ``fuzz`` context lines from both ends of the hunk.
+
+    Returns:
+        (line index where the kept part of the hunk starts, leading context dropped,
+        trailing context dropped, how it matched) or None
+    """
+    ops = [op for op, _ in hunk.lines]
+    old = hunk.old_lines
+    lead_context = next((i for i, op in enumerate(ops) if op != " "), len(ops))
+    trail_context = next((i for i, op in enumerate(reversed(ops)) if op != " "), len(ops))
+    for drop in range(fuzz + 1):
+        lead, trail = min(drop, lead_context), min(drop, trail_context)
+        if drop and lead + trail == 0:
+            break
+        needle = old[lead:len(old) - trail]
+        if not needle:
+            continue
+        for loose in (False, True):
+            pos = _find(lines, needle, hint + lead, start, loose)
+            if pos is not None:
+                how = ", ".join(([f"fuzz {drop}"] if drop else []) + (["whitespace ignored"] if loose else []))
+                return pos, lead, trail, how or "exact"
+    return None
+
+
+def _apply_file(file_patch: FilePatch, original: Optional[str], fuzz: int) -> Tuple[Optional[str], List[str]]:
+    """
+    Apply one file's hunks in memory.
+
+    Returns:
+        (new content or None for a deletion, notes about inexact matches)
+
+    Raises:
+        PatchError: Listing every hunk that could not be located
+    """
+    lines = original.splitlines() if original else []
+    had_newline = original.endswith("\n") if original else True
+    result: List[str] = []
+    # How far earlier hunks were from their header line numbers; later hunks likely drifted too
+    cursor, drift = 0, 0
+    notes, failures = [], []
+
+    for number, hunk in enumerate(file_patch.hunks, 1):
+        # "-N,0" (a hunk with no old lines) means "insert after line N"
+        expected = hunk.old_start if not hunk.old_lines else max(hunk.old_start - 1, 0)
+        hint = expected + drift
+        if not hunk.old_lines:
+            # Pure insertion: trust the line number
+            pos, lead, trail, how = min(max(hint, cursor), len(lines)), 0, 0, "exact"
+        else:
+            found = _locate(lines, hunk, hint, cursor, fuzz)
+            if found is None:
+                first = next((text for op, text in hunk.lines if op != "+"), "")
+                failures.append(f"hunk {number} ({hunk.header}) does not match; "
+                                f"first line expected: {first!r}")
+                continue
+            pos, lead, trail, how = found
+        if how != "exact":
+            notes.append(f"hunk {number} matched with {how}")
+        if pos - lead != expected and hunk.old_lines:
+            notes.append(f"hunk {number} applied at line {pos - lead + 1} (header said {hunk.old_start})")
+            drift = pos - lead - expected
+
+        result.extend(lines[cursor:pos])
+        file_index = pos
+        body = hunk.lines[lead:len(hunk.lines) - trail]
+        for op, text in body:
+            if op == " ":
+                # Keep the file's own line so whitespace-tolerant matches do not rewrite context
+                result.append(lines[file_index])
+                file_index += 1
+            elif op == "-":
+                file_index += 1
+            else:
+                result.append(text)
+        cursor = file_index
+
+    if failures:
+        raise PatchError(f"{file_patch.path}: " + "; ".join(failures))
+    result.extend(lines[cursor:])
+
+    if file_patch.new_path is None:
+        if result:
+            raise PatchError(f"{file_patch.path}: deletion patch does not remove every line")
+        return None, notes
+    content = "\n".join(result)
+    if result and (had_newline and not file_patch.no_newline_at_end):
+        content += "\n"
+    return content, notes
+
+
+def _atomic_write(path: str, content: str):
+    """Write a file via a temporary file in the same directory and an atomic rename."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    mode = os.stat(path).st_mode if os.path.exists(path) else None
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix=".patch-", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def apply_patch_text(text: str, fuzz: int = 2, root: str = ".") -> Tuple[List[str], List[str]]:
+    """
+    Validate and apply a multi-file unified diff, all or nothing.
+
+    Args:
+        text: The unified diff
+        fuzz: How many context lines may be dropped from each end of a hunk to find a match
+        root: Directory the patch paths are relative to
+
+    Returns:
+        (one summary line per file, notes about inexact matches)
+
+    Raises:
+        PatchError: If the patch does not parse or any hunk does not apply; no file is changed
+    """
+    file_patches = parse_patch(text)
+    # Per path: content before the patch (None if absent) and planned content (None to delete)
+    originals: Dict[str, Optional[str]] = {}
+    planned: Dict[str, Optional[str]] = {}
+    summaries, notes, errors = [], [], []
+
+    def current(path: str) -> Optional[str]:
+        """Content of a path as earlier parts of this patch left it."""
+        if path in planned:
+            return planned[path]
+        if path not in originals:
+            try:
+                with open(path, "r") as f:
+                    originals[path] = f.read()
+            except FileNotFoundError:
+                originals[path] = None
+        return originals[path]
+
+    for file_patch in file_patches:
+        source = os.path.join(root, file_patch.old_path) if file_patch.old_path else None
+        target = os.path.join(root, file_patch.path)
+        try:
+            if source is None:
+                if current(target):
+                    raise PatchError(f"{file_patch.path}: patch creates the file but it already exists")
+                original = None
+            else:
+                original = current(source)
+                if original is None:
+                    raise PatchError(f"{file_patch.path}: file not found")
+            if target != source:
+                current(target)
+            content, file_notes = _apply_file(file_patch, original, fuzz)
+        except PatchError as e:
+            errors.append(str(e))
+            continue
+
+        if source is not None and source != target:
+            planned[source] = None
+        planned[target] = content
+        added = sum(h.added for h in file_patch.hunks)
+        removed = sum(h.removed for h in file_patch.hunks)
+        action = "created" if source is None else "deleted" if content is None else "patched"
+        summaries.append(f"{action} {file_patch.path} ({len(file_patch.hunks)} hunk(s), +{added} -{removed})")
+        notes.extend(f"{file_patch.path}: {note}" for note in file_notes)
+
+    if errors:
+        raise PatchError("\n".join(errors))
+
+    # Everything validated; write, restoring already-written files if a later write fails
+    done: List[str] = []
+    try:
+        for path, content in planned.items():
+            if content is None:
+                if os.path.exists(path):
+                    os.unlink(path)
+            else:
+                _atomic_write(path, content)
+            done.append(path)
+    except OSError as e:
+        for written in reversed(done):
+            try:
+                if originals[written] is None:
+                    if os.path.exists(written):
+                        os.unlink(written)
+                else:
+                    _atomic_write(written, originals[written])
+            except OSError:
+                pass
+        raise PatchError(f"writing {path} failed ({e}); earlier files were restored")
+    return summaries, notes
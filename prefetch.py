@@ -0,0 +1,122 @@
+"""
+Speculative prefetch of read-only utensils.
+Starts a read-only utensil on a background thread as soon as its parameters are parsed,
+so disk I/O overlaps with the rest of the model's response.
+"""
+
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from registry import Utensil
+
+logger = logging.getLogger(__name__)
+
+PrefetchKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(name: str, params: dict) -> PrefetchKey:
+    return name, tuple(sorted(params.items()))
+
+
+def _file_state(path: str) -> Optional[Tuple[int, int]]:
+    """Return (mtime_ns, size) for a path, or None if it cannot be stat'ed."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class Prefetcher:
+    """
+    Runs read-only utensils ahead of time and hands their results to the real execution.
+
+    A prefetched result is used only if the completed call has exactly the
+    parameters that were prefetched and the file is unchanged since it was read.
+    Every result is dropped when a mutating utensil runs, and all leftovers are
+    dropped at the end of each response, so calls that never complete are
+    simply thrown away.
+    """
+
+    def __init__(self, execute: Callable[[str, dict], str], max_workers: int = 4,
+                 lookup: Optional[Callable[[str], Optional[Utensil]]] = None):
+        """
+        Initialize the prefetcher.
+
+        Args:
+            execute: Function that runs a utensil, e.g. utensils.execute_utensil
+            max_workers: Number of background I/O threads
+            lookup: Returns a utensil's registry entry by name (defaults to utensils.REGISTRY.get)
+        """
+        if lookup is None:
+            from utensils import REGISTRY
+            lookup = REGISTRY.get
+        self.execute = execute
+        self.lookup = lookup
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._pending: Dict[PrefetchKey, Future] = {}
+
+    def _path_param(self, name: str) -> Optional[str]:
+        """The file parameter of a prefetchable utensil, or None if it may not run ahead of time."""
+        utensil = self.lookup(name)
+        return utensil.path_param if utensil is not None and utensil.prefetchable else None
+
+    def on_param(self, name: str, params: dict):
+        """Parser callback: start a prefetch once a read-only utensil's file parameter is known."""
+        path_param = self._path_param(name)
+        if path_param is None or path_param not in params:
+            return
+        key = _key(name, params)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending[key] = self.executor.submit(self._run, name, dict(params), params[path_param])
+        logger.debug(f"Prefetching {name} {params}")
+
+    def _run(self, name: str, params: dict, path: str):
+        before = _file_state(path)
+        result = self.execute(name, params)
+        after = _file_state(path)
+        # A file that changed while being read gives no usable snapshot
+        return result, (before if before == after else False)
+
+    def take(self, name: str, params: dict) -> Optional[str]:
+        """
+        Return the prefetched result for a completed call, or None on a miss.
+
+        Waits for an in-flight prefetch of the same call rather than starting a second read.
+        """
+        path_param = self._path_param(name)
+        if path_param is None:
+            return None
+        with self._lock:
+            future = self._pending.pop(_key(name, params), None)
+        if future is None:
+            return None
+        try:
+            result, state = future.result()
+        except Exception as e:
+            logger.debug(f"Prefetch of {name} failed: {e}")
+            return None
+        if state is False or state != _file_state(params.get(path_param, "")):
+            return None
+        return result
+
+    def invalidate(self):
+        """Drop every prefetched result (called after a utensil that may modify files)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.cancel()
+
+    # Leftover prefetches at the end of a response belong to calls that never ran
+    clear = invalidate
+
+    def shutdown(self):
+        """Stop the background threads."""
+        self.invalidate()
+        self.executor.shutdown(wait=False)
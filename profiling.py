@@ -0,0 +1,146 @@
+"""
+Per-turn CPU and memory profiling for the agent REPL.
+Wraps each turn in cProfile and tracemalloc and writes the results to a directory.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Functions whose time is spent waiting on the network rather than in our code
+NETWORK_MARKERS = ("ssl.py", "socket.py", "selectors.py", "httpcore", "h11")
+
+# Project source files, used to separate our own hot spots from library code
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _history_size(message_history: list) -> int:
+    """Return the serialized size in bytes of the message history as sent to the API."""
+    return len(json.dumps(message_history, default=str).encode())
+
+
+class TurnProfiler:
+    """Profiles each agent turn and summarizes the hot spots across a session."""
+
+    def __init__(self, output_dir: str, top_n: int = 15):
+        """
+        Initialize the profiler.
+
+        Args:
+            output_dir: Directory for per-turn .prof files and allocation reports
+            top_n: Number of entries to include in allocation reports and summaries
+        """
+        self.output_dir = output_dir
+        self.top_n = top_n
+        self.turn_count = 0
+        self.profile_paths = []
+        self.turn_seconds = []
+        self.history_growth = []
+        os.makedirs(output_dir, exist_ok=True)
+
+    @contextmanager
+    def turn(self, agent):
+        """
+        Profile one turn of the given agent.
+
+        Writes ``turn-NNN.prof`` (loadable with pstats or snakeviz) and
+        ``turn-NNN-alloc.txt`` with the top allocators, parser buffer
+        allocations and message history growth.
+        """
+        self.turn_count += 1
+        prefix = os.path.join(self.output_dir, f"turn-{self.turn_count:03d}")
+
+        history_len_before = len(agent.message_history)
+        history_bytes_before = _history_size(agent.message_history)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        snapshot_before = tracemalloc.take_snapshot()
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            snapshot_after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+
+            profile.dump_stats(f"{prefix}.prof")
+            self.profile_paths.append(f"{prefix}.prof")
+            self.turn_seconds.append(elapsed)
+
+            growth = {
+                "messages": len(agent.message_history) - history_len_before,
+                "bytes": _history_size(agent.message_history) - history_bytes_before,
+                "total_bytes": _history_size(agent.message_history),
+            }
+            self.history_growth.append(growth)
+
+            with open(f"{prefix}-alloc.txt", 'w') as f:
+                f.write(self._allocation_report(snapshot_before, snapshot_after, peak, elapsed, growth))
+
+    def _allocation_report(self, before, after, peak, elapsed, growth) -> str:
+        """Format the allocation diff for a single turn."""
+        lines = [
+            f"Turn {self.turn_count}: {elapsed:.3f}s, traced peak {peak / 1024:.1f} KiB",
+            f"message_history: +{growth['messages']} messages, "
+            f"+{growth['bytes'] / 1024:.1f} KiB (total {growth['total_bytes'] / 1024:.1f} KiB)",
+            "",
+            f"Top {self.top_n} allocators (by net size):",
+        ]
+        ignore = [tracemalloc.Filter(False, tracemalloc.__file__),
+                  tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+        diff = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+        for stat in diff[:self.top_n]:
+            lines.append(f"  {stat}")
+
+        # Allocations attributed to the parser and history bookkeeping in our own modules
+        for title, pattern in [("Parser buffers", "*streaming_parser.py"),
+                               ("Agent loop / message_history", "*agent.py")]:
+            only = [tracemalloc.Filter(True, pattern)]
+            section = after.filter_traces(only).compare_to(before.filter_traces(only), "lineno")
+            lines.append("")
+            lines.append(f"{title}:")
+            if not section:
+                lines.append("  (none)")
+            for stat in section[:5]:
+                lines.append(f"  {stat}")
+
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> str:
+        """Summarize hot spots across all profiled turns."""
+        if not self.profile_paths:
+            return "No turns were profiled."
+
+        stats = pstats.Stats(*self.profile_paths, stream=io.StringIO())
+        total = sum(self.turn_seconds)
+        network = 0.0
+        own = []
+        for (filename, line, func), (cc, nc, tt, ct, callers) in stats.stats.items():
+            if any(marker in filename for marker in NETWORK_MARKERS):
+                network += tt
+            elif filename.startswith(PROJECT_ROOT):
+                own.append((tt, ct, nc, f"{os.path.relpath(filename, PROJECT_ROOT)}:{line}({func})"))
+
+        lines = [
+            f"Profiled {self.turn_count} turn(s), {total:.2f}s total",
+            f"  Network/TLS wait: {network:.2f}s ({100 * network / total if total else 0:.0f}%)",
+            f"  message_history now {self.history_growth[-1]['total_bytes'] / 1024:.1f} KiB",
+            "Top project functions by own time:",
+        ]
+        for tt, ct, nc, name in sorted(own, reverse=True)[:10]:
+            lines.append(f"  {tt:8.4f}s own  {ct:8.4f}s cum  {nc:7d} calls  {name}")
+        lines.append(f"Profiles written to {self.output_dir}")
+        return "\n".join(lines)
@@ -0,0 +1,446 @@
+"""
+Warm pool of forked Python workers for the run_python utensil.
+A zygote interpreter preloads common modules once; each worker is forked from it in milliseconds.
+"""
+
+import ast
+import atexit
+import json
+import logging
+import os
+import select
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Modules imported once by the zygote so every forked worker starts with them loaded
+DEFAULT_PRELOAD = ("json", "re", "collections", "itertools", "functools", "dataclasses", "typing",
+                   "pathlib", "datetime", "math", "statistics", "textwrap", "difflib", "ast")
+
+# Output kept from one call; the rest is reported as truncated
+MAX_OUTPUT_CHARS = 50000
+# Seconds to wait for the zygote to finish preloading
+ZYGOTE_START_TIMEOUT = 30
+
+_HEADER = struct.Struct("!I")
+
+
+class WorkerError(Exception):
+    """A worker that could not be started or died while running code."""
+
+
+def _send(sock: socket.socket, message: dict):
+    data = json.dumps(message).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _receive_exactly(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise EOFError("connection closed")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _receive(sock: socket.socket) -> dict:
+    (size,) = _HEADER.unpack(_receive_exactly(sock, _HEADER.size))
+    return json.loads(_receive_exactly(sock, size))
+
+
+# ---------------------------------------------------------------------------
+# Worker side: runs inside the zygote and its forked children
+
+
+def _project_modules(root: str) -> Dict[str, int]:
+    """Return {file: mtime_ns} for every loaded module whose source lives under ``root``."""
+    files = {}
+    prefix = root.rstrip(os.sep) + os.sep
+    for module in list(sys.modules.values()):
+        path = getattr(module, "__file__", None)
+        if not path or not path.startswith(prefix) or f"{os.sep}site-packages{os.sep}" in path:
+            continue
+        try:
+            files[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            pass
+    return files
+
+
+def _run_code(code: str) -> Optional[str]:
+    """
+    Execute code in a fresh ``__main__`` namespace, printing the value of a final expression like the REPL.
+
+    Returns:
+        The formatted traceback if the code raised, otherwise None
+    """
+    namespace = {"__name__": "__main__", "__builtins__": __builtins__}
+    try:
+        tree = ast.parse(code, "<run_python>")
+        last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+        exec(compile(tree, "<run_python>", "exec"), namespace)
+        if last is not None:
+            value = eval(compile(ast.Expression(last.value), "<run_python>", "eval"), namespace)
+            if value is not None:
+                print(repr(value))
+        return None
+    except BaseException:
+        kind, error, tb = sys.exc_info()
+        # Drop this function's own frame from the traceback
+        return "".join(traceback.format_exception(kind, error, tb.tb_next if tb else None))
+
+
+def _serve_worker(conn: socket.socket, root: str, memory_mb: int):
+    """Child loop: run each request with stdout and stderr (file descriptors 1 and 2) captured to a file."""
+    if memory_mb:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    os.chdir(root)
+    # Keep print() output in order with writes straight to the file descriptors (subprocesses, C code)
+    sys.stdout.reconfigure(line_buffering=True)
+    _send(conn, {"pid": os.getpid(), "modules": _project_modules(root)})
+    with tempfile.TemporaryFile() as capture:
+        while True:
+            try:
+                request = _receive(conn)
+            except (EOFError, OSError):
+                return
+            capture.seek(0)
+            capture.truncate()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            saved = os.dup(1), os.dup(2)
+            os.dup2(capture.fileno(), 1)
+            os.dup2(capture.fileno(), 2)
+            start = time.perf_counter()
+            try:
+                error = _run_code(request["code"])
+            finally:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os.dup2(saved[0], 1)
+                os.dup2(saved[1], 2)
+                os.close(saved[0])
+                os.close(saved[1])
+            seconds = time.perf_counter() - start
+            size = capture.tell()
+            capture.seek(0)
+            output = capture.read(MAX_OUTPUT_CHARS * 4).decode("utf-8", "replace")
+            truncated = size > MAX_OUTPUT_CHARS * 4 or len(output) > MAX_OUTPUT_CHARS
+            _send(conn, {
+                "output": output[:MAX_OUTPUT_CHARS],
+                "truncated": truncated,
+                "error": error,
+                "seconds": seconds,
+                "memory_error": bool(error and error.rstrip().splitlines()[-1].startswith("MemoryError")),
+                "modules": _project_modules(root),
+            })
+
+
+def _zygote_main(socket_path: str, root: str, memory_mb: int, preload: List[str]):
+    """Zygote loop: preload modules, then fork a worker for each connection until stdin closes."""
+    sys.path.insert(0, root)
+    for name in preload:
+        try:
+            __import__(name)
+        except Exception as e:
+            print(f"preload of {name} failed: {e}", file=sys.stderr)
+    # Forked workers are never waited for
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(16)
+
+    # The agent holds our stdin open; when it exits, so do we
+    def watch_parent():
+        sys.stdin.buffer.read()
+        os._exit(0)
+
+    threading.Thread(target=watch_parent, daemon=True).start()
+    sys.stdout.write("ready\n")
+    sys.stdout.flush()
+    while True:
+        conn, _ = listener.accept()
+        if os.fork() == 0:
+            listener.close()
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            try:
+                _serve_worker(conn, root, memory_mb)
+            finally:
+                os._exit(0)
+        conn.close()
+
+
+# ---------------------------------------------------------------------------
+# Agent side
+
+
+class Worker:
+    """Agent-side handle for one forked worker."""
+
+    def __init__(self, sock: socket.socket, hello: dict):
+        self.sock = sock
+        self.pid = hello["pid"]
+        self.modules: Dict[str, int] = hello["modules"]
+        self.calls = 0
+
+    def stale(self) -> bool:
+        """Check whether any project module this worker has imported changed since it was loaded."""
+        for path, mtime in self.modules.items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def run(self, code: str, timeout: float) -> dict:
+        """
+        Run code, killing the worker if it does not answer within ``timeout`` seconds.
+
+        Raises:
+            TimeoutError: The call timed out (the worker has been killed)
+            WorkerError: The worker died
+        """
+        self.calls += 1
+        self.sock.settimeout(timeout)
+        try:
+            _send(self.sock, {"code": code})
+            response = _receive(self.sock)
+        except socket.timeout:
+            self.kill()
+            raise TimeoutError(f"timed out after {timeout:g} seconds")
+        except (EOFError, OSError, ValueError) as e:
+            self.kill()
+            raise WorkerError(f"worker exited while running code ({e})")
+        # Keep the mtime each module had when first imported, so later edits show as stale
+        for path, mtime in response["modules"].items():
+            self.modules.setdefault(path, mtime)
+        return response
+
+    def kill(self):
+        try:
+            os.kill(self.pid, signal.SIGKILL)
+        except OSError:
+            pass
+        self.close()
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class PythonPool:
+    """
+    Warm pool of worker interpreters forked from a preloaded zygote.
+
+    Each call runs in a fresh ``__main__`` namespace, but modules a worker
+    imports stay loaded for its later calls. A worker is replaced after
+    ``max_calls`` calls, after a timeout or memory error, and before its
+    next call if any project module it has imported changed on disk. The
+    zygote itself is restarted if a module it preloaded from the project changes.
+    """
+
+    def __init__(self, size: int = 2, max_calls: int = 50, timeout: float = 30.0, memory_mb: int = 1024,
+                 preload=DEFAULT_PRELOAD, root: Optional[str] = None):
+        """
+        Initialize the pool (no process starts until ``start`` or the first call).
+
+        Args:
+            size: Idle workers kept ready
+            max_calls: Calls served by one worker before it is replaced
+            timeout: Default seconds allowed per call
+            memory_mb: Address space limit per worker in megabytes (0 for none)
+            preload: Modules imported once in the zygote
+            root: Project directory, importable and the workers' working directory (default: cwd)
+        """
+        self.size = size
+        self.max_calls = max_calls
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.preload = list(preload)
+        self.root = os.path.abspath(root or os.getcwd())
+        self._zygote: Optional[subprocess.Popen] = None
+        self._zygote_modules: Optional[Dict[str, int]] = None
+        self._socket_dir: Optional[str] = None
+        self._idle: List[Worker] = []
+        self._lock = threading.Lock()
+        self.forks = 0
+
+    @classmethod
+    def from_config(cls, config: dict) -> "PythonPool":
+        """Build from the ``[python]`` section of config.toml."""
+        return cls(
+            size=config.get("pool_size", 2),
+            max_calls=config.get("max_calls", 50),
+            timeout=config.get("timeout", 30.0),
+            memory_mb=config.get("memory_mb", 1024),
+            preload=config.get("preload", DEFAULT_PRELOAD),
+        )
+
+    @property
+    def socket_path(self) -> str:
+        return os.path.join(self._socket_dir, "zygote.sock")
+
+    def _start_zygote(self):
+        if not hasattr(os, "fork"):
+            raise WorkerError("run_python needs a platform with fork()")
+        self._stop_zygote()
+        self._socket_dir = tempfile.mkdtemp(prefix="agent-python-")
+        self._zygote = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--zygote", self.socket_path, self.root,
+             str(self.memory_mb), json.dumps(self.preload)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, cwd=self.root,
+        )
+        ready, _, _ = select.select([self._zygote.stdout], [], [], ZYGOTE_START_TIMEOUT)
+        if not ready or self._zygote.stdout.readline().strip() != b"ready":
+            self._stop_zygote()
+            raise WorkerError("Python zygote failed to start")
+        self._zygote_modules = None
+
+    def _stop_zygote(self):
+        if self._zygote is not None:
+            try:
+                self._zygote.stdin.close()
+                self._zygote.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                self._zygote.kill()
+            self._zygote = None
+        if self._socket_dir:
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+            try:
+                os.rmdir(self._socket_dir)
+            except OSError:
+                pass
+            self._socket_dir = None
+
+    def _zygote_stale(self) -> bool:
+        if self._zygote is None or self._zygote.poll() is not None:
+            return True
+        for path, mtime in (self._zygote_modules or {}).items():
+            try:
+                if os.stat(path).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _fork(self) -> Worker:
+        """Ask the zygote for a new worker, restarting the zygote first if needed."""
+        if self._zygote_stale():
+            for worker in self._idle:
+                worker.kill()
+            self._idle.clear()
+            self._start_zygote()
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(ZYGOTE_START_TIMEOUT)
+        try:
+            sock.connect(self.socket_path)
+            worker = Worker(sock, _receive(sock))
+        except (OSError, EOFError, ValueError) as e:
+            sock.close()
+            self._stop_zygote()
+            raise WorkerError(f"could not fork a Python worker: {e}")
+        if self._zygote_modules is None:
+            self._zygote_modules = dict(worker.modules)
+        self.forks += 1
+        return worker
+
+    def start(self):
+        """Start the zygote and fill the pool with idle workers."""
+        with self._lock:
+            while len(self._idle) < self.size:
+                self._idle.append(self._fork())
+
+    def _acquire(self) -> Worker:
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if not worker.stale() and not self._zygote_stale():
+                    return worker
+                worker.kill()
+            return self._fork()
+
+    def _release(self, worker: Worker):
+        with self._lock:
+            if worker.calls >= self.max_calls or len(self._idle) >= self.size:
+                worker.kill()
+            else:
+                self._idle.append(worker)
+
+    def run(self, code: str, timeout: Optional[float] = None) -> dict:
+        """
+        Run code on a warm worker.
+
+        Returns:
+            {"output", "truncated", "error", "seconds"}; "error" is a traceback string or None
+
+        Raises:
+            TimeoutError: If the code ran longer than the timeout
+            WorkerError: If no worker could be started or the worker died
+        """
+        worker = self._acquire()
+        try:
+            response = worker.run(code, timeout or self.timeout)
+        except (TimeoutError, WorkerError):
+            worker.kill()
+            raise
+        if response.get("memory_error"):
+            worker.kill()
+        else:
+            self._release(worker)
+        return response
+
+    def close(self):
+        """Stop every worker and the zygote."""
+        with self._lock:
+            for worker in self._idle:
+                worker.kill()
+            self._idle.clear()
+            self._stop_zygote()
+
+
+_pool: Optional[PythonPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(config: Optional[dict] = None) -> PythonPool:
+    """Return the process-wide pool, creating it from ``config`` (the ``[python]`` section) on first use."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PythonPool.from_config(config or {})
+        return _pool
+
+
+def reset_pool():
+    """Stop and forget the process-wide pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+        _pool = None
+
+
+atexit.register(reset_pool)
+
+
+if __name__ == "__main__" and len(sys.argv) == 6 and sys.argv[1] == "--zygote":
+    _zygote_main(sys.argv[2], sys.argv[3], int(sys.argv[4]), json.loads(sys.argv[5]))
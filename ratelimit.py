@@ -0,0 +1,321 @@
+"""
+Client-side rate-limit scheduler shared by every API call in the process.
+Token buckets per model for requests, input tokens and output tokens, learned from
+the API's rate-limit headers, with waiting work served in priority order.
+"""
+
+import itertools
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from enum import IntEnum
+from typing import Dict, Optional
+
+from history import content_text
+
+logger = logging.getLogger(__name__)
+
+# Rate-limit header families and the bucket each one feeds
+HEADER_BUCKETS = {
+    "requests": "requests",
+    "input-tokens": "input_tokens",
+    "output-tokens": "output_tokens",
+}
+
+
+class Priority(IntEnum):
+    """Scheduling priority; lower values are served first."""
+    INTERACTIVE = 0
+    COMPACTION = 1
+    BULK = 2
+
+
+class TokenBucket:
+    """
+    A bucket refilled continuously up to its capacity.
+
+    An unknown capacity (``math.inf``) never blocks. The level may go negative
+    when actual usage turns out larger than reserved; later work then waits
+    for the debt to refill.
+    """
+
+    def __init__(self, capacity: float = math.inf, per_minute: Optional[float] = None,
+                 clock=time.monotonic):
+        self.clock = clock
+        self.capacity = capacity
+        self.rate = (per_minute if per_minute is not None else capacity) / 60
+        self.level = capacity
+        self.updated = clock()
+
+    def _refill(self, now: float):
+        if self.capacity != math.inf:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Return seconds until ``amount`` can be taken (an amount above capacity needs a full bucket)."""
+        self._refill(self.clock())
+        needed = min(amount, self.capacity) - self.level
+        if needed <= 0:
+            return 0.0
+        return needed / self.rate if self.rate > 0 else math.inf
+
+    def take(self, amount: float):
+        self._refill(self.clock())
+        if self.capacity != math.inf:
+            self.level = min(self.capacity, self.level - amount)
+
+    def sync(self, limit: float, remaining: float, reset_in: Optional[float] = None):
+        """
+        Adopt the server's view of this bucket.
+
+        Args:
+            limit: Bucket capacity per minute
+            remaining: Current level
+            reset_in: Seconds until the bucket is full again, if known
+        """
+        self.capacity = limit
+        self.level = remaining
+        self.updated = self.clock()
+        if reset_in and reset_in > 0 and remaining < limit:
+            self.rate = (limit - remaining) / reset_in
+        else:
+            self.rate = limit / 60
+
+
+class ModelBudget:
+    """The request, input-token and output-token buckets of one model."""
+
+    def __init__(self, config: Optional[Dict] = None, clock=time.monotonic):
+        config = config or {}
+        self.buckets = {
+            "requests": TokenBucket(config.get("requests_per_minute", math.inf), clock=clock),
+            "input_tokens": TokenBucket(config.get("input_tokens_per_minute", math.inf), clock=clock),
+            "output_tokens": TokenBucket(config.get("output_tokens_per_minute", math.inf), clock=clock),
+        }
+
+    def wait_time(self, amounts: Dict[str, float]) -> float:
+        return max(self.buckets[name].wait_time(amount) for name, amount in amounts.items())
+
+    def take(self, amounts: Dict[str, float]):
+        for name, amount in amounts.items():
+            self.buckets[name].take(amount)
+
+
+@dataclass
+class Reservation:
+    """Capacity reserved for one request."""
+    model: str
+    input_tokens: int
+    output_tokens: int
+    priority: Priority
+    waited: float = 0.0
+    # Set once response headers have reported the server's view, which already includes this request
+    synced: bool = False
+
+
+def _reset_in(value: str) -> Optional[float]:
+    """Parse an RFC 3339 reset timestamp into seconds from now."""
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+def estimate_input_tokens(request: dict) -> int:
+    """Roughly estimate a request's input tokens (about four characters per token)."""
+    chars = len(content_text(request.get("system", "")))
+    chars += sum(len(content_text(m["content"])) for m in request.get("messages", []))
+    return chars // 4 + 1
+
+
+class RateLimiter:
+    """
+    Schedules API calls against per-model token buckets.
+
+    ``acquire`` blocks until the model's request, input-token and output-token
+    buckets can cover the call, serving waiters for the same model in priority
+    order (interactive turns before compaction before bulk work), first come
+    first served within a priority. Limits start from config (unlimited when
+    not set) and are replaced by the ``anthropic-ratelimit-*`` headers of each
+    response, so every session in the process backs off together instead of
+    all hitting 429s at once.
+    """
+
+    def __init__(self, config: Optional[Dict] = None, clock=time.monotonic):
+        """
+        Initialize the limiter.
+
+        Args:
+            config: The [rate_limit] section of config.toml
+            clock: Monotonic clock, replaceable in tests
+        """
+        self.config = config or {}
+        self.enabled = self.config.get("enabled", True)
+        self.estimated_output_tokens = self.config.get("estimated_output_tokens", 1024)
+        self.clock = clock
+        self._budgets: Dict[str, ModelBudget] = {}
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+
+    def budget(self, model: str) -> ModelBudget:
+        """Return a model's buckets, creating them from config on first use."""
+        if model not in self._budgets:
+            limits = self.config.get("models", {}).get(model, self.config)
+            self._budgets[model] = ModelBudget(limits, clock=self.clock)
+        return self._budgets[model]
+
+    def acquire(self, model: str, input_tokens: int, output_tokens: Optional[int] = None,
+                priority: Priority = Priority.INTERACTIVE) -> Reservation:
+        """
+        Wait until a request fits the model's budget, then reserve it.
+
+        Args:
+            model: Model the request goes to
+            input_tokens: Estimated input tokens
+            output_tokens: Expected output tokens (defaults to ``estimated_output_tokens``)
+            priority: Scheduling priority
+
+        Returns:
+            The Reservation, to be passed to ``observe`` and ``settle``
+        """
+        if output_tokens is None:
+            output_tokens = self.estimated_output_tokens
+        reservation = Reservation(model, input_tokens, output_tokens, priority)
+        if not self.enabled:
+            return reservation
+
+        amounts = {"requests": 1, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        entry = (priority, next(self._seq), model)
+        start = self.clock()
+        with self._cond:
+            self._waiting.append(entry)
+            try:
+                while True:
+                    first = min(e for e in self._waiting if e[2] == model)
+                    wait = self.budget(model).wait_time(amounts) if first == entry else None
+                    if wait == 0:
+                        self.budget(model).take(amounts)
+                        break
+                    # Woken early whenever capacity or the queue changes
+                    self._cond.wait(timeout=None if wait is None else min(wait, 60.0))
+            finally:
+                self._waiting.remove(entry)
+                self._cond.notify_all()
+
+        reservation.waited = self.clock() - start
+        if reservation.waited > 0.01:
+            logger.debug(f"Rate limiter held {priority.name.lower()} request to {model} "
+                         f"for {reservation.waited:.2f}s")
+        return reservation
+
+    def try_acquire(self, model: str, input_tokens: int, output_tokens: Optional[int] = None,
+                    priority: Priority = Priority.BULK) -> Optional[Reservation]:
+        """
+        Reserve a request only if it fits the model's budget now and nothing is waiting for that model.
+
+        For speculative requests (hedges), which must neither wait nor get ahead of queued work.
+
+        Returns:
+            The Reservation, or None if the request would have to wait
+        """
+        if output_tokens is None:
+            output_tokens = self.estimated_output_tokens
+        reservation = Reservation(model, input_tokens, output_tokens, priority)
+        if not self.enabled:
+            return reservation
+
+        amounts = {"requests": 1, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        with self._cond:
+            if any(entry[2] == model for entry in self._waiting) or self.budget(model).wait_time(amounts) > 0:
+                return None
+            self.budget(model).take(amounts)
+        return reservation
+
+    def observe(self, model: str, headers, reservation: Optional[Reservation] = None):
+        """
+        Learn the model's limits from a response's ``anthropic-ratelimit-*`` headers.
+
+        Args:
+            model: Model the response came from
+            headers: Response headers (any mapping with ``get``)
+            reservation: The request's reservation, marked as accounted for by the server
+        """
+        if not self.enabled or headers is None:
+            return
+        synced = False
+        with self._cond:
+            budget = self.budget(model)
+            for family, bucket in HEADER_BUCKETS.items():
+                prefix = f"anthropic-ratelimit-{family}-"
+                limit, remaining = headers.get(prefix + "limit"), headers.get(prefix + "remaining")
+                if limit is None or remaining is None:
+                    continue
+                try:
+                    limit, remaining = float(limit), float(remaining)
+                except ValueError:
+                    continue
+                reset = headers.get(prefix + "reset")
+                budget.buckets[bucket].sync(limit, remaining, _reset_in(reset) if reset else None)
+                synced = True
+            self._cond.notify_all()
+        if reservation is not None and synced:
+            reservation.synced = True
+
+    def release(self, reservation: Reservation):
+        """
+        Return the output tokens reserved for a request that was cancelled before it generated any.
+
+        The request and its input tokens stay counted, since the server received them.
+        """
+        if not self.enabled or reservation.synced:
+            return
+        with self._cond:
+            self.budget(reservation.model).buckets["output_tokens"].take(-reservation.output_tokens)
+            self._cond.notify_all()
+
+    def settle(self, reservation: Reservation, usage):
+        """
+        Correct a reservation with the request's actual usage.
+
+        Skipped when response headers already reported the server's accounting.
+        """
+        if not self.enabled or reservation.synced or usage is None:
+            return
+        actual_input = usage.input_tokens + (getattr(usage, "cache_creation_input_tokens", 0) or 0)
+        with self._cond:
+            budget = self.budget(reservation.model)
+            budget.buckets["input_tokens"].take(actual_input - reservation.input_tokens)
+            budget.buckets["output_tokens"].take(usage.output_tokens - reservation.output_tokens)
+            self._cond.notify_all()
+
+
+_limiter: Optional[RateLimiter] = None
+_lock = threading.Lock()
+
+
+def get_rate_limiter(config: Optional[Dict] = None) -> RateLimiter:
+    """
+    Return the process-wide rate limiter, creating it on first use.
+
+    Args:
+        config: The [rate_limit] section of config.toml; only used by the first call
+    """
+    global _limiter
+    if _limiter is None:
+        with _lock:
+            if _limiter is None:
+                _limiter = RateLimiter(config)
+    return _limiter
+
+
+def reset_rate_limiter():
+    """Forget the shared rate limiter (used by tests)."""
+    global _limiter
+    with _lock:
+        _limiter = None
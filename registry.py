@@ -0,0 +1,334 @@
+"""
+Declarative utensil registry: parameter schemas, read-only and concurrency metadata, and lazy plugins.
+The system prompt's utensil list, argument validation, prefetch and history policies are all derived from it.
+"""
+
+import importlib
+import logging
+import threading
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Entry point group that installed packages use to provide utensils
+ENTRY_POINT_GROUP = "agencia.utensils"
+
+# Concurrency classes: PARALLEL calls may run alongside any other PARALLEL call
+# (and ahead of time, e.g. prefetch); SERIAL calls run alone, in the order written.
+PARALLEL = "parallel"
+SERIAL = "serial"
+
+_TRUE = {"true", "yes", "1", "on"}
+_FALSE = {"false", "no", "0", "off"}
+
+_MISSING = object()
+
+# Results of calls that were rejected before running, by reason; the model wrote a bad call
+CALL_ERRORS = {
+    "unknown_utensil": "Error: Unknown utensil",
+    "invalid_arguments": "Error: Invalid arguments for utensil",
+}
+
+
+class UtensilArgumentError(ValueError):
+    """Arguments that do not match a utensil's parameter schema."""
+
+
+@dataclass(frozen=True)
+class Param:
+    """One utensil parameter. Values arrive as strings and are converted to ``type``."""
+    name: str
+    type: type = str
+    description: str = ""
+    default: Any = _MISSING
+    multiline: bool = False
+
+    @property
+    def required(self) -> bool:
+        return self.default is _MISSING
+
+    def convert(self, value: Any) -> Any:
+        """Convert a parsed value (a string, or a JSON value from a native tool call) to this parameter's type."""
+        if self.type is str and isinstance(value, (int, float)):
+            return str(value)
+        if not isinstance(value, str) or self.type is str:
+            return value
+        text = value.strip()
+        if self.type is bool:
+            if text.lower() in _TRUE:
+                return True
+            if text.lower() in _FALSE:
+                return False
+            raise UtensilArgumentError(f"{self.name} must be true or false, got '{value}'")
+        try:
+            return self.type(text)
+        except ValueError:
+            raise UtensilArgumentError(f"{self.name} must be {_type_name(self.type)}, got '{value}'")
+
+    def json_schema(self) -> Dict[str, Any]:
+        """The parameter's JSON schema, for native tool definitions."""
+        schema: Dict[str, Any] = {"type": _JSON_TYPES.get(self.type, "string")}
+        description = self.description
+        if not self.required and self.default is not None:
+            description = f"{description} (default {self.default})" if description else f"default {self.default}"
+        if description:
+            schema["description"] = description
+        return schema
+
+    def describe(self) -> str:
+        """Render the parameter for the system prompt."""
+        details = []
+        if self.type is not str:
+            details.append(_type_name(self.type))
+        if self.multiline:
+            details.append("multi-line")
+        if not self.required:
+            details.append("optional" if self.default is None else f"optional, default {self.default}")
+        text = f"{self.name} ({', '.join(details)})" if details else self.name
+        return f"{text}: {self.description}" if self.description else text
+
+
+_JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+
+def _type_name(kind: type) -> str:
+    return {int: "an integer", float: "a number", bool: "true/false"}.get(kind, kind.__name__)
+
+
+@dataclass(frozen=True)
+class Utensil:
+    """
+    A utensil and the metadata the agent needs to schedule, cache and describe it.
+
+    Attributes:
+        name: Name used in UTENSIL:<name>
+        func: Implementation, called with converted keyword arguments; returns the result text
+        description: One-line description for the system prompt
+        params: Parameter schema, in prompt order
+        read_only: True if the utensil never changes files or other state
+        concurrency: PARALLEL or SERIAL
+        path_param: Parameter naming the file the utensil reads or changes, if any
+        paths: Function returning every file a call touches, for utensils without a single path_param
+        elidable: Whether old results may be replaced by a stub (they can be fetched again)
+    """
+    name: str
+    func: Callable[..., str]
+    description: str
+    params: Tuple[Param, ...] = ()
+    read_only: bool = False
+    concurrency: str = SERIAL
+    path_param: Optional[str] = None
+    paths: Optional[Callable[[dict], List[str]]] = None
+    elidable: bool = False
+
+    @property
+    def prefetchable(self) -> bool:
+        """Whether a call may run ahead of time as soon as its file is known."""
+        return self.read_only and self.concurrency == PARALLEL and self.path_param is not None
+
+    def touched_paths(self, params: dict) -> List[str]:
+        """Return the file paths a call reads or changes."""
+        if self.paths is not None:
+            return self.paths(params)
+        if self.path_param and self.path_param in params:
+            return [params[self.path_param]]
+        return []
+
+    def bind(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Validate parsed parameters against the schema and convert their types.
+
+        Raises:
+            UtensilArgumentError: For unknown or missing parameters or unconvertible values
+        """
+        known = {p.name: p for p in self.params}
+        unknown = [key for key in params if key not in known]
+        if unknown:
+            accepted = ", ".join(known) or "none"
+            raise UtensilArgumentError(f"unknown parameter(s) {', '.join(unknown)} (accepted: {accepted})")
+        kwargs = {}
+        for param in self.params:
+            if param.name in params:
+                kwargs[param.name] = param.convert(params[param.name])
+            elif param.required:
+                raise UtensilArgumentError(f"missing required parameter {param.name}")
+            else:
+                kwargs[param.name] = param.default
+        return kwargs
+
+    def tool_definition(self) -> Dict[str, Any]:
+        """The utensil as a native tool definition (name, description, input_schema)."""
+        return {
+            "name": self.name,
+            "description": self.description,
+            "input_schema": {
+                "type": "object",
+                "properties": {param.name: param.json_schema() for param in self.params},
+                "required": [param.name for param in self.params if param.required],
+            },
+        }
+
+    def describe(self) -> str:
+        """Render the utensil's line in the system prompt."""
+        if not self.params:
+            return f"- {self.name}: {self.description}. Parameters: none"
+        return f"- {self.name}: {self.description}. Parameters: {'; '.join(p.describe() for p in self.params)}"
+
+
+class UtensilRegistry(Mapping):
+    """
+    Name-to-Utensil mapping with lazily imported plugins.
+
+    Plugins are named by entry points in ENTRY_POINT_GROUP, or by
+    ``add_plugin(name, "module:attribute")``; the attribute must be a Utensil.
+    Entry point metadata is scanned on the first lookup of a name that is
+    not registered, and a plugin module is imported only when its utensil is
+    first looked up or the system prompt is built, so plugins never slow
+    down startup.
+    """
+
+    def __init__(self, entry_point_group: Optional[str] = ENTRY_POINT_GROUP):
+        self._utensils: Dict[str, Utensil] = {}
+        self._plugins: Dict[str, str] = {}
+        self._entry_point_group = entry_point_group
+        self._discovered = entry_point_group is None
+        self._lock = threading.RLock()
+        self._prompt: Optional[str] = None
+        self._tools: Optional[List[Dict[str, Any]]] = None
+
+    def register(self, utensil: Utensil) -> Utensil:
+        """Add or replace a utensil."""
+        with self._lock:
+            self._utensils[utensil.name] = utensil
+            self._plugins.pop(utensil.name, None)
+            self._prompt = None
+            self._tools = None
+        return utensil
+
+    def add_plugin(self, name: str, target: str):
+        """Declare a plugin utensil ("module:attribute") to import on first use."""
+        with self._lock:
+            if name not in self._utensils:
+                self._plugins[name] = target
+                self._prompt = None
+                self._tools = None
+
+    def _discover(self):
+        """Read plugin names from installed packages' entry points (metadata only, no imports)."""
+        with self._lock:
+            if self._discovered:
+                return
+            self._discovered = True
+            from importlib.metadata import entry_points
+            try:
+                found = entry_points(group=self._entry_point_group)
+            except Exception as e:
+                logger.warning(f"Could not read utensil entry points: {e}")
+                return
+            for entry_point in found:
+                self.add_plugin(entry_point.name, entry_point.value)
+
+    def _load(self, name: str) -> Optional[Utensil]:
+        target = self._plugins.get(name)
+        if target is None:
+            return None
+        module_name, _, attribute = target.partition(":")
+        try:
+            obj = importlib.import_module(module_name.strip())
+            for part in attribute.strip().split(".") if attribute else []:
+                obj = getattr(obj, part)
+        except Exception as e:
+            logger.warning(f"Could not load utensil plugin {name} ({target}): {e}")
+            self._plugins.pop(name, None)
+            return None
+        if not isinstance(obj, Utensil):
+            logger.warning(f"Utensil plugin {name} ({target}) is not a Utensil")
+            self._plugins.pop(name, None)
+            return None
+        return self.register(obj if obj.name == name else replace(obj, name=name))
+
+    def get(self, name: str, default=None) -> Optional[Utensil]:
+        """Look up a utensil, importing its plugin on first use."""
+        utensil = self._utensils.get(name)
+        if utensil is not None:
+            return utensil
+        with self._lock:
+            self._discover()
+            if name in self._utensils:
+                return self._utensils[name]
+            return self._load(name) or default
+
+    def __getitem__(self, name: str) -> Utensil:
+        utensil = self.get(name)
+        if utensil is None:
+            raise KeyError(name)
+        return utensil
+
+    def __contains__(self, name) -> bool:
+        return self.get(name) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        """Iterate over every utensil name, loading all plugins."""
+        with self._lock:
+            self._discover()
+            for name in list(self._plugins):
+                self._load(name)
+            return iter(list(self._utensils))
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    def execute(self, name: str, params: dict) -> str:
+        """
+        Validate parameters and run a utensil.
+
+        Returns:
+            The utensil's result, or an "Error: ..." description
+        """
+        utensil = self.get(name)
+        if utensil is None:
+            return f"{CALL_ERRORS['unknown_utensil']} '{name}'"
+        try:
+            kwargs = utensil.bind(params)
+        except UtensilArgumentError as e:
+            return f"{CALL_ERRORS['invalid_arguments']} '{name}': {e}"
+        try:
+            return utensil.func(**kwargs)
+        except Exception as e:
+            return f"Error executing utensil '{name}': {str(e)}"
+
+    def prompt_section(self) -> str:
+        """The "Available utensils" list for the system prompt, built once per set of utensils."""
+        with self._lock:
+            names = list(iter(self))
+            if self._prompt is None:
+                self._prompt = "\n".join(self._utensils[name].describe() for name in names)
+            return self._prompt
+
+    def tool_definitions(self) -> List[Dict[str, Any]]:
+        """Native tool definitions for every utensil, built once per set of utensils."""
+        with self._lock:
+            names = list(iter(self))
+            if self._tools is None:
+                self._tools = [self._utensils[name].tool_definition() for name in names]
+            return self._tools
+
+
+class FunctionView(Mapping):
+    """Read-only name-to-function view of a registry, for code that expects a plain dict of callables."""
+
+    def __init__(self, registry: UtensilRegistry):
+        self._registry = registry
+
+    def __getitem__(self, name: str) -> Callable[..., str]:
+        return self._registry[name].func
+
+    def __contains__(self, name) -> bool:
+        return name in self._registry
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._registry)
+
+    def __len__(self) -> int:
+        return len(self._registry)
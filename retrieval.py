@@ -0,0 +1,410 @@
+"""
+BM25 index over workspace chunks for the retrieve utensil and first-turn context.
+Stored on disk under .agent/index and updated incrementally from file mtimes; scored with NumPy when installed.
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import struct
+import subprocess
+import tempfile
+import threading
+from array import array
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_UNSET = object()
+# numpy, imported on first use so it is not loaded at startup; None when it is not installed
+_np = _UNSET
+
+DEFAULT_DIRECTORY = os.path.join(".agent", "index")
+INDEX_FILE = "bm25.bin"
+# Bumped when the on-disk layout or tokenization changes; older indexes are rebuilt
+FORMAT_VERSION = 1
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Directories never indexed when the workspace is not a git repository
+SKIP_DIRECTORIES = {".git", ".agent", "__pycache__", "node_modules", ".venv", "venv", ".tox",
+                    ".mypy_cache", ".pytest_cache", "dist", "build"}
+BINARY_SNIFF_BYTES = 8000
+
+TOKEN = re.compile(r"[A-Za-z][A-Za-z0-9_]*|\d+")
+CAMEL_BOUNDARY = re.compile(r"(?<=[a-z0-9])(?=[A-Z])")
+STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "from", "are", "was", "but", "not", "you", "all",
+    "can", "has", "have", "into", "its", "our", "out", "use", "how", "what", "when", "where", "which",
+    "self", "none", "true", "false", "return", "import", "def", "class", "if", "else", "in", "is", "of",
+    "to", "a", "an", "or", "on", "as", "it", "be", "by", "at", "do",
+}
+
+
+def _numpy():
+    """Import numpy on first use; None when it is not installed (the pure-Python path is used)."""
+    global _np
+    if _np is _UNSET:
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover - exercised only without numpy
+            numpy = None
+        _np = numpy
+    return _np
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase terms.
+
+    Identifiers are kept whole and also split into their snake_case and
+    camelCase parts, so "apply_patch_text" matches queries for "patch".
+    """
+    terms = []
+    for match in TOKEN.finditer(text):
+        word = match.group()
+        lower = word.lower()
+        if lower not in STOPWORDS and len(lower) > 1:
+            terms.append(lower)
+        parts = [p for chunk in word.split("_") for p in CAMEL_BOUNDARY.split(chunk)]
+        if len(parts) > 1:
+            terms.extend(p.lower() for p in parts if len(p) > 1 and p.lower() not in STOPWORDS)
+    return terms
+
+
+def chunk_lines(lines: List[str], size: int) -> List[Tuple[int, int]]:
+    """
+    Split a file into (start, end) line ranges of at most ``size`` lines (0-based, end exclusive).
+
+    A chunk ends early, once it is at least half full, before a top-level
+    line that follows a blank line (usually a new function or class).
+    """
+    chunks, start = [], 0
+    for i in range(1, len(lines) + 1):
+        at_boundary = (i < len(lines) and i - start >= size // 2 and lines[i][:1] not in ("", " ", "\t")
+                       and not lines[i - 1].strip())
+        if i - start >= size or at_boundary or i == len(lines):
+            chunks.append((start, i))
+            start = i
+    return chunks
+
+
+@dataclass(frozen=True)
+class Chunk:
+    path: str
+    start: int
+    end: int
+
+
+@dataclass(frozen=True)
+class Hit:
+    chunk: Chunk
+    score: float
+    text: str
+
+
+class BM25Index:
+    """
+    BM25 index over line chunks of the workspace's text files.
+
+    Per-chunk term counts are kept in flat arrays (a CSR matrix of chunks by
+    terms) and inverted into per-term postings for scoring. ``update`` stats
+    every candidate file and re-tokenizes only those whose mtime or size
+    changed, then saves the index atomically.
+    """
+
+    def __init__(self, root: str = ".", directory: Optional[str] = None, chunk_size: int = 40,
+                 max_file_bytes: int = 1024 * 1024):
+        """
+        Initialize the index. The saved copy is loaded on first use, not here.
+
+        Args:
+            root: Workspace directory to index
+            directory: Where the index file lives (default .agent/index under root)
+            chunk_size: Maximum lines per chunk
+            max_file_bytes: Larger files are skipped
+        """
+        self.root = os.path.abspath(root)
+        self.directory = directory or os.path.join(self.root, DEFAULT_DIRECTORY)
+        self.chunk_size = chunk_size
+        self.max_file_bytes = max_file_bytes
+        self._lock = threading.Lock()
+
+        self.vocabulary: Dict[str, int] = {}
+        # path -> (mtime_ns, size, [(start, end, {term id: count})])
+        self.files: Dict[str, Tuple[int, int, List[Tuple[int, int, Dict[int, int]]]]] = {}
+        self._postings = None
+        self._loaded = False
+
+    # -- files ---------------------------------------------------------------
+
+    def _candidates(self) -> List[str]:
+        """Workspace files to index: git's tracked and unignored files, or a directory walk."""
+        try:
+            result = subprocess.run(["git", "ls-files", "-co", "--exclude-standard", "-z"], cwd=self.root,
+                                    capture_output=True, timeout=30)
+            if result.returncode == 0:
+                return [p for p in result.stdout.decode("utf-8", "replace").split("\0")
+                        if p and not p.startswith(".agent/")]
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+        paths = []
+        for directory, subdirectories, names in os.walk(self.root):
+            subdirectories[:] = [d for d in subdirectories if d not in SKIP_DIRECTORIES and not d.startswith(".")]
+            for name in names:
+                paths.append(os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, "/"))
+        return paths
+
+    def _read(self, path: str) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, path), "rb") as f:
+                data = f.read(self.max_file_bytes + 1)
+        except OSError:
+            return None
+        if len(data) > self.max_file_bytes or b"\0" in data[:BINARY_SNIFF_BYTES]:
+            return None
+        return data.decode("utf-8", "replace")
+
+    def _term_id(self, term: str) -> int:
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            term_id = self.vocabulary[term] = len(self.vocabulary)
+        return term_id
+
+    def _index_file(self, path: str, text: str) -> List[Tuple[int, int, Dict[int, int]]]:
+        lines = text.splitlines()
+        chunks = []
+        for start, end in chunk_lines(lines, self.chunk_size):
+            # The path itself is searchable too: "router" finds router.py
+            counts: Dict[int, int] = {}
+            for term in tokenize(path) + tokenize("\n".join(lines[start:end])):
+                term_id = self._term_id(term)
+                counts[term_id] = counts.get(term_id, 0) + 1
+            if counts:
+                chunks.append((start, end, counts))
+        return chunks
+
+    def update(self) -> int:
+        """
+        Bring the index up to date with the workspace and save it if anything changed.
+
+        Returns:
+            The number of files added, changed or removed
+        """
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            seen, changed = set(), 0
+            for path in self._candidates():
+                try:
+                    st = os.stat(os.path.join(self.root, path))
+                except OSError:
+                    continue
+                seen.add(path)
+                record = self.files.get(path)
+                if record is not None and record[0] == st.st_mtime_ns and record[1] == st.st_size:
+                    continue
+                text = self._read(path) if st.st_size <= self.max_file_bytes else None
+                self.files[path] = (st.st_mtime_ns, st.st_size, self._index_file(path, text) if text else [])
+                changed += 1
+            for path in [p for p in self.files if p not in seen]:
+                del self.files[path]
+                changed += 1
+            if changed:
+                self._postings = None
+                self.save()
+            return changed
+
+    # -- storage -------------------------------------------------------------
+
+    def _flatten(self):
+        """Return (chunk list, chunk pointer, term ids, counts) as a CSR matrix of chunks by terms."""
+        chunks, pointer, term_ids, counts = [], array("I", [0]), array("I"), array("I")
+        for path in sorted(self.files):
+            for start, end, chunk_counts in self.files[path][2]:
+                chunks.append(Chunk(path, start, end))
+                term_ids.extend(chunk_counts.keys())
+                counts.extend(chunk_counts.values())
+                pointer.append(len(term_ids))
+        return chunks, pointer, term_ids, counts
+
+    def save(self):
+        """Write the index atomically: a JSON header followed by the CSR arrays."""
+        _, pointer, term_ids, counts = self._flatten()
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "chunk_size": self.chunk_size,
+            "vocabulary": sorted(self.vocabulary, key=self.vocabulary.get),
+            "files": {path: [mtime, size, [[s, e] for s, e, _ in chunks]]
+                      for path, (mtime, size, chunks) in sorted(self.files.items())},
+            "lengths": [len(pointer), len(term_ids)],
+        }).encode()
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".bm25-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(struct.pack("!Q", len(header)))
+                f.write(header)
+                for values in (pointer, term_ids, counts):
+                    f.write(values.tobytes())
+            os.replace(tmp, os.path.join(self.directory, INDEX_FILE))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+
+    def load(self):
+        """Load the saved index, ignoring it if missing, unreadable or from another format version."""
+        self._loaded = True
+        path = os.path.join(self.directory, INDEX_FILE)
+        try:
+            with open(path, "rb") as f:
+                (header_size,) = struct.unpack("!Q", f.read(8))
+                header = json.loads(f.read(header_size))
+                if header["version"] != FORMAT_VERSION or header["chunk_size"] != self.chunk_size:
+                    return
+                arrays = []
+                for length in (header["lengths"][0], header["lengths"][1], header["lengths"][1]):
+                    values = array("I")
+                    values.frombytes(f.read(length * values.itemsize))
+                    arrays.append(values)
+        except (OSError, ValueError, KeyError, struct.error, EOFError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.debug(f"Ignoring unreadable index {path}: {e}")
+            return
+        pointer, term_ids, counts = arrays
+        self.vocabulary = {term: i for i, term in enumerate(header["vocabulary"])}
+        self.files, chunk = {}, 0
+        for file_path, (mtime, size, ranges) in header["files"].items():
+            chunks = []
+            for start, end in ranges:
+                lo, hi = pointer[chunk], pointer[chunk + 1]
+                chunks.append((start, end, dict(zip(term_ids[lo:hi], counts[lo:hi]))))
+                chunk += 1
+            self.files[file_path] = (mtime, size, chunks)
+        self._postings = None
+
+    # -- scoring -------------------------------------------------------------
+
+    def _build_postings(self):
+        """Invert the chunk-by-term matrix into per-term postings (CSC), sorted by term id."""
+        chunks, pointer, term_ids, counts = self._flatten()
+        lengths = [sum(counts[pointer[i]:pointer[i + 1]]) for i in range(len(chunks))]
+        np = _numpy()
+        if np is not None:
+            terms = np.frombuffer(term_ids, dtype=np.uint32) if term_ids else np.zeros(0, np.uint32)
+            rows = np.repeat(np.arange(len(chunks), dtype=np.uint32), np.diff(np.frombuffer(pointer, np.uint32)))
+            order = np.argsort(terms, kind="stable")
+            columns = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+            np.add.at(columns, terms.astype(np.int64) + 1, 1)
+            self._postings = {
+                "chunks": chunks,
+                "indptr": np.cumsum(columns),
+                "rows": rows[order],
+                "tf": np.frombuffer(counts, dtype=np.uint32)[order].astype(np.float64) if counts else np.zeros(0),
+                "lengths": np.asarray(lengths, dtype=np.float64),
+            }
+        else:
+            postings: Dict[int, List[Tuple[int, int]]] = {}
+            for row in range(len(chunks)):
+                for k in range(pointer[row], pointer[row + 1]):
+                    postings.setdefault(term_ids[k], []).append((row, counts[k]))
+            self._postings = {"chunks": chunks, "postings": postings, "lengths": lengths}
+
+    def search(self, query: str, top_k: int = 5) -> List[Tuple[Chunk, float]]:
+        """Return the ``top_k`` chunks with the highest BM25 score for a query, best first."""
+        with self._lock:
+            if not self._loaded:
+                self.load()
+            if self._postings is None:
+                self._build_postings()
+            postings = self._postings
+            chunks = postings["chunks"]
+            term_ids = sorted({self.vocabulary[t] for t in tokenize(query) if t in self.vocabulary})
+            if not chunks or not term_ids:
+                return []
+            n = len(chunks)
+            np = _numpy()
+            if "indptr" in postings:
+                lengths = postings["lengths"]
+                norm = K1 * (1 - B + B * lengths / max(lengths.mean(), 1.0))
+                scores = np.zeros(n)
+                for term_id in term_ids:
+                    lo, hi = postings["indptr"][term_id], postings["indptr"][term_id + 1]
+                    if lo == hi:
+                        continue
+                    rows, tf = postings["rows"][lo:hi], postings["tf"][lo:hi]
+                    idf = math.log(1 + (n - (hi - lo) + 0.5) / ((hi - lo) + 0.5))
+                    np.add.at(scores, rows, idf * tf * (K1 + 1) / (tf + norm[rows]))
+                k = min(top_k, int(np.count_nonzero(scores)))
+                if k == 0:
+                    return []
+                best = np.argpartition(-scores, k - 1)[:k]
+                best = best[np.argsort(-scores[best], kind="stable")]
+                return [(chunks[i], float(scores[i])) for i in best]
+
+            lengths = postings["lengths"]
+            average = max(sum(lengths) / n, 1.0)
+            scores: Dict[int, float] = {}
+            for term_id in term_ids:
+                entries = postings["postings"].get(term_id, [])
+                if not entries:
+                    continue
+                idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+                for row, tf in entries:
+                    norm = K1 * (1 - B + B * lengths[row] / average)
+                    scores[row] = scores.get(row, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+            best = sorted(scores, key=lambda row: (-scores[row], row))[:top_k]
+            return [(chunks[i], scores[i]) for i in best]
+
+    def retrieve(self, query: str, top_k: int = 5) -> List[Hit]:
+        """Update the index, search it, and return the matching chunks with their text."""
+        self.update()
+        hits = []
+        for chunk, score in self.search(query, top_k):
+            text = self._read(chunk.path)
+            if text is None:
+                continue
+            hits.append(Hit(chunk, score, "\n".join(text.splitlines()[chunk.start:chunk.end])))
+        return hits
+
+
+def format_hits(hits: List[Hit], max_chars: int = 12000) -> str:
+    """Render hits as headed, line-numbered excerpts, stopping once ``max_chars`` is reached."""
+    sections, used = [], 0
+    for hit in hits:
+        numbered = "\n".join(f"{hit.chunk.start + i + 1:5d}  {line}"
+                             for i, line in enumerate(hit.text.splitlines()))
+        section = f"--- {hit.chunk.path}:{hit.chunk.start + 1}-{hit.chunk.end} (score {hit.score:.1f}) ---\n{numbered}"
+        if sections and used + len(section) > max_chars:
+            sections.append(f"[{len(hits) - len(sections)} more matches omitted]")
+            break
+        sections.append(section[:max_chars])
+        used += len(section)
+    return "\n\n".join(sections)
+
+
+_indexes: Dict[str, BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(root: str = ".", config: Optional[dict] = None) -> BM25Index:
+    """Return the shared index for a workspace directory, loading it on first use."""
+    root = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            config = config or {}
+            directory = config.get("directory")
+            index = _indexes[root] = BM25Index(
+                root,
+                directory=os.path.join(root, directory) if directory else None,
+                chunk_size=config.get("chunk_lines", 40),
+                max_file_bytes=config.get("max_file_bytes", 1024 * 1024),
+            )
+        return index
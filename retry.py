@@ -0,0 +1,132 @@
+"""
+Retry policy for transient API errors.
+Jittered exponential backoff that honors retry-after headers, used by the agent's resumable streaming.
+"""
+
+import logging
+import random
+import time
+from typing import Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits, server errors and overload
+TRANSIENT_STATUSES = {408, 409, 429, 500, 502, 503, 504, 529}
+
+T = TypeVar("T")
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Check whether an error is worth retrying.
+
+    Covers retryable API status errors, SDK connection and timeout errors, and
+    transport errors raised by httpx while reading a stream (e.g. a dropped
+    connection mid-response), which the SDK does not wrap.
+    """
+    # Errors only come from requests, so the SDK is already loaded by now
+    import anthropic
+
+    if isinstance(error, anthropic.APIStatusError):
+        return error.status_code in TRANSIENT_STATUSES
+    if isinstance(error, (anthropic.APIConnectionError, anthropic.APITimeoutError)):
+        return True
+    module = type(error).__module__
+    return module.startswith(("httpx", "httpcore", "h11"))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Return the server's requested delay in seconds from retry-after headers, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    import email.utils
+    try:
+        parsed = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, parsed.timestamp() - time.time())
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, capped, deferring to retry-after when given."""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 30.0,
+                 max_retry_after: float = 120.0):
+        """
+        Initialize the policy.
+
+        Args:
+            max_attempts: Total attempts including the first
+            base_delay: Backoff ceiling for the first retry, doubled on each later retry
+            max_delay: Upper bound on the computed backoff
+            max_retry_after: Upper bound on a server-requested delay
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    @classmethod
+    def from_config(cls, config: dict) -> "RetryPolicy":
+        """Build from the ``[retry]`` section of config.toml."""
+        return cls(
+            max_attempts=config.get("max_attempts", 5),
+            base_delay=config.get("base_delay", 1.0),
+            max_delay=config.get("max_delay", 30.0),
+            max_retry_after=config.get("max_retry_after", 120.0),
+        )
+
+    def delay(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """
+        Return how long to wait before retry number ``attempt`` (0-based).
+
+        A retry-after header on the error takes precedence over the backoff.
+        """
+        requested = retry_after(error) if error is not None else None
+        if requested is not None:
+            return min(requested, self.max_retry_after)
+        ceiling = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, ceiling)
+
+    def should_retry(self, attempt: int, error: Exception) -> bool:
+        """Check whether retry number ``attempt`` (0-based) should happen for this error."""
+        return attempt + 1 < self.max_attempts and is_transient(error)
+
+    def call(self, fn: Callable[[], T], on_retry: Optional[Callable[[int, Exception, float], None]] = None) -> T:
+        """
+        Call ``fn`` until it succeeds or a non-transient error or the attempt limit is hit.
+
+        Args:
+            fn: Zero-argument function to call
+            on_retry: Optional callback (attempt, error, delay) invoked before each sleep
+        """
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                if not self.should_retry(attempt, e):
+                    raise
+                wait = self.delay(attempt, e)
+                logger.debug(f"Transient error ({e}); retrying in {wait:.2f}s")
+                if on_retry:
+                    on_retry(attempt, e, wait)
+                time.sleep(wait)
+                attempt += 1
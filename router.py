@@ -0,0 +1,130 @@
+"""
+Per-iteration model routing.
+Picks a model for each request of the agentic loop unless the user has pinned one with /model.
+"""
+
+import logging
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from history import content_text, is_result_message
+
+logger = logging.getLogger(__name__)
+
+# Utensil errors that indicate the model got the utensil format wrong
+FORMAT_ERRORS = ("Error: Unknown utensil", "Error: Invalid arguments")
+
+
+@dataclass
+class RoutingDecision:
+    """The model chosen for one request and why."""
+    model: str
+    baseline: str
+    reason: str
+
+    @property
+    def rerouted(self) -> bool:
+        return self.model != self.baseline
+
+
+class ModelRouter:
+    """
+    Routes agentic-loop iterations between the baseline model and a fast model.
+
+    The baseline is ``ModelManager.current_model``. An iteration goes to the
+    fast model only when it follows a utensil result, the history and the
+    latest results are small, the fast model's recent success rate is good,
+    and it is not slower than the baseline. A model pinned with /model is
+    always used as-is.
+
+    Attach to the agent's EventBus; it learns from ``on_request_end`` and
+    ``on_utensil_end`` and records its decisions and the estimated cost and
+    latency saved (compared with always using the baseline) in Metrics.
+    """
+
+    def __init__(self, model_manager, metrics, config: Optional[Dict] = None):
+        self.model_manager = model_manager
+        self.metrics = metrics
+        self.configure(config)
+        self.outcomes: Dict[str, deque] = {}
+        self.last_decision: Optional[RoutingDecision] = None
+
+    def configure(self, config: Optional[Dict]):
+        """Apply a ``[routing]`` config section (again after a config reload)."""
+        self.config = config or {}
+        self.enabled = self.config.get("enabled", False)
+        self.fast_model = self.config.get("fast_model")
+        self.max_history_chars = self.config.get("max_history_chars", 60000)
+        self.max_result_chars = self.config.get("max_result_chars", 8000)
+        self.min_success_rate = self.config.get("min_success_rate", 0.8)
+
+    def success_rate(self, model: str) -> float:
+        """Return the fraction of recent responses from a model without format errors (1.0 if unknown)."""
+        outcomes = self.outcomes.get(model)
+        if not outcomes:
+            return 1.0
+        return sum(outcomes) / len(outcomes)
+
+    def choose(self, history: list) -> RoutingDecision:
+        """Pick the model for the next request given the history it will be sent."""
+        baseline = self.model_manager.get_current_model()
+        decision = self._decide(history, baseline)
+        self.last_decision = decision
+        if decision.rerouted:
+            logger.debug(f"Routing to {decision.model} instead of {baseline}: {decision.reason}")
+        self.metrics.inc("agent_router_decisions_total",
+                         labels={"model": decision.model, "reason": decision.reason})
+        return decision
+
+    def _decide(self, history: list, baseline: str) -> RoutingDecision:
+        if not self.enabled or not self.fast_model or self.fast_model == baseline:
+            return RoutingDecision(baseline, baseline, "default")
+        if self.model_manager.pinned:
+            return RoutingDecision(baseline, baseline, "pinned")
+        if not self.model_manager.validate_model(self.fast_model):
+            return RoutingDecision(baseline, baseline, "default")
+        if not history or not is_result_message(history[-1]):
+            return RoutingDecision(baseline, baseline, "user_prompt")
+        if len(content_text(history[-1]["content"])) > self.max_result_chars:
+            return RoutingDecision(baseline, baseline, "large_result")
+        history_chars = sum(len(content_text(m["content"])) for m in history)
+        if history_chars > self.max_history_chars:
+            return RoutingDecision(baseline, baseline, "large_history")
+        # About four characters per token; leave room for the system prompt and the response
+        if history_chars / 4 > 0.8 * self.model_manager.spec(self.fast_model).context_window:
+            return RoutingDecision(baseline, baseline, "exceeds_context_window")
+        if self.success_rate(self.fast_model) < self.min_success_rate:
+            return RoutingDecision(baseline, baseline, "fast_model_failing")
+
+        latency = self.model_manager.latency
+        fast_ttft, baseline_ttft = latency.quantile(self.fast_model, 0.5), latency.quantile(baseline, 0.5)
+        if fast_ttft is not None and baseline_ttft is not None and fast_ttft > baseline_ttft:
+            return RoutingDecision(baseline, baseline, "fast_model_slower")
+
+        return RoutingDecision(self.fast_model, baseline, "after_utensil_result")
+
+    def _cost(self, model: str, usage) -> Optional[float]:
+        """Return the USD cost of a request's usage on a model, or None without prices."""
+        if not self.model_manager.validate_model(model):
+            return None
+        return self.model_manager.spec(model).cost(usage.input_tokens, usage.output_tokens)
+
+    def on_request_end(self, model, ttft_seconds, usage, **_):
+        decision = self.last_decision
+        if decision is None or not decision.rerouted or usage is None:
+            return
+
+        actual, baseline = self._cost(model, usage), self._cost(decision.baseline, usage)
+        if actual is not None and baseline is not None:
+            self.metrics.inc("agent_router_saved_usd_total", baseline - actual)
+
+        baseline_ttft = self.model_manager.latency.quantile(decision.baseline, 0.5)
+        if baseline_ttft is not None and ttft_seconds is not None:
+            self.metrics.inc("agent_router_saved_seconds_total", baseline_ttft - ttft_seconds)
+
+    def on_utensil_end(self, result, **_):
+        if self.last_decision is None:
+            return
+        outcomes = self.outcomes.setdefault(self.last_decision.model, deque(maxlen=20))
+        outcomes.append(not result.startswith(FORMAT_ERRORS))
@@ -0,0 +1,240 @@
+"""
+Compare the two utensil protocols on a recorded task suite: the UTENSIL: text format and native tool use.
+
+Every task runs in a fresh temporary workspace seeded with its files, once per protocol
+and repetition, with a new Agent each time. The report compares output tokens, model turns
+(API requests), latency and parse failures per protocol, and how many runs passed the
+task's check command.
+
+Usage:
+    python scripts/protocol_benchmark.py [--suite FILE] [--protocols utensils,tools] [--repeat N]
+                                         [--model ID] [--token-budget N] [--json FILE]
+
+Requires ANTHROPIC_API_KEY; every run makes real API requests.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent import PROTOCOLS, Agent  # noqa: E402
+from model_manager import ModelManager  # noqa: E402
+from pyworkers import reset_pool  # noqa: E402
+from subagents import TokenBudget, TokenBudgetExceeded  # noqa: E402
+
+DEFAULT_SUITE = os.path.join(ROOT, "scripts", "protocol_tasks.json")
+# Tokens one run may use before it is stopped
+TOKEN_BUDGET = 150000
+
+
+class RunStats:
+    """Event observer collecting the measurements of one run."""
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.ttfts = []
+        self.utensil_calls = 0
+        self.utensil_errors = 0
+        self.parse_failures = 0
+
+    def on_request_end(self, usage=None, ttft_seconds=None, **_):
+        self.requests += 1
+        if usage is not None:
+            self.input_tokens += usage.input_tokens or 0
+            self.output_tokens += usage.output_tokens or 0
+        if ttft_seconds is not None:
+            self.ttfts.append(ttft_seconds)
+
+    def on_utensil_end(self, result, **_):
+        self.utensil_calls += 1
+        if result.startswith("Error"):
+            self.utensil_errors += 1
+
+    def on_parse_failure(self, **_):
+        self.parse_failures += 1
+
+
+def load_suite(path: str) -> list:
+    """Read the task list: name, prompt, files ({path: content}) and an optional check command."""
+    with open(path) as f:
+        return json.load(f)["tasks"]
+
+
+def run_task(task: dict, protocol: str, config_path: str, model: str = None,
+             token_budget: int = TOKEN_BUDGET, client=None) -> dict:
+    """
+    Run one task under one protocol in a fresh workspace.
+
+    Args:
+        task: A task from the suite
+        protocol: "utensils" or "tools"
+        config_path: config.toml to run with
+        model: Model to pin for every request (default: the config's, with routing)
+        token_budget: Tokens the run may use before it is stopped
+        client: Client to use instead of the shared API client (for tests)
+
+    Returns:
+        The run's measurements
+    """
+    manager = ModelManager(config_path)
+    workspace = tempfile.mkdtemp(prefix=f"protocol-{task['name']}-")
+    for path, content in task.get("files", {}).items():
+        full_path = os.path.join(workspace, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w") as f:
+            f.write(content)
+
+    previous_cwd = os.getcwd()
+    os.chdir(workspace)
+    try:
+        agent = Agent(model_manager=manager)
+        if client is not None:
+            agent.client = client
+        agent.set_protocol(protocol)
+        if model and not agent.switch_model(model):
+            raise ValueError(f"unknown model {model}")
+        agent.quiet = True
+        agent.metrics_config = {}
+        agent.token_budget = TokenBudget(token_budget)
+        agent.events.attach(agent.token_budget)
+        stats = RunStats()
+        agent.events.attach(stats)
+
+        status = "done"
+        start = time.perf_counter()
+        try:
+            agent.run_with_utensils(task["prompt"])
+        except TokenBudgetExceeded:
+            status = "budget"
+        except Exception as e:
+            status = f"error: {type(e).__name__}: {e}"
+        seconds = time.perf_counter() - start
+
+        passed = None
+        if task.get("check"):
+            check = subprocess.run(task["check"], shell=True, cwd=workspace, capture_output=True, timeout=120)
+            passed = check.returncode == 0
+    finally:
+        os.chdir(previous_cwd)
+        # The worker pool is rooted at the workspace that is about to be removed
+        reset_pool()
+        shutil.rmtree(workspace, ignore_errors=True)
+
+    return {
+        "task": task["name"],
+        "protocol": protocol,
+        "status": status,
+        "passed": passed,
+        "seconds": seconds,
+        "turns": stats.requests,
+        "input_tokens": stats.input_tokens,
+        "output_tokens": stats.output_tokens,
+        "mean_ttft_seconds": statistics.mean(stats.ttfts) if stats.ttfts else None,
+        "utensil_calls": stats.utensil_calls,
+        "utensil_errors": stats.utensil_errors,
+        "parse_failures": stats.parse_failures,
+    }
+
+
+def summarize(runs: list) -> dict:
+    """Aggregate runs per protocol."""
+    summary = {}
+    for protocol in [p for p in PROTOCOLS if any(run["protocol"] == p for run in runs)]:
+        mine = [run for run in runs if run["protocol"] == protocol]
+        checked = [run for run in mine if run["passed"] is not None]
+        ttfts = [run["mean_ttft_seconds"] for run in mine if run["mean_ttft_seconds"] is not None]
+        summary[protocol] = {
+            "runs": len(mine),
+            "completed": sum(run["status"] == "done" for run in mine),
+            "passed": sum(bool(run["passed"]) for run in checked),
+            "checked": len(checked),
+            "output_tokens": sum(run["output_tokens"] for run in mine),
+            "input_tokens": sum(run["input_tokens"] for run in mine),
+            "turns": sum(run["turns"] for run in mine),
+            "median_seconds": statistics.median(run["seconds"] for run in mine),
+            "total_seconds": sum(run["seconds"] for run in mine),
+            "mean_ttft_seconds": statistics.mean(ttfts) if ttfts else None,
+            "utensil_calls": sum(run["utensil_calls"] for run in mine),
+            "parse_failures": sum(run["parse_failures"] for run in mine),
+        }
+    return summary
+
+
+def format_report(runs: list, summary: dict) -> str:
+    """Per-task and per-protocol tables, with the relative difference when both protocols ran."""
+    lines = [f"{'task':<24} {'protocol':<9} {'status':<8} {'pass':<5} {'turns':>5} {'out tok':>8} "
+             f"{'seconds':>8} {'calls':>5} {'parse err':>9}"]
+    for run in sorted(runs, key=lambda run: (run["task"], run["protocol"])):
+        passed = "-" if run["passed"] is None else ("yes" if run["passed"] else "no")
+        lines.append(f"{run['task'][:24]:<24} {run['protocol']:<9} {run['status'][:8]:<8} {passed:<5} "
+                     f"{run['turns']:>5} {run['output_tokens']:>8} {run['seconds']:>8.1f} "
+                     f"{run['utensil_calls']:>5} {run['parse_failures']:>9}")
+
+    lines.append("")
+    lines.append(f"{'protocol':<9} {'runs':>4} {'passed':>8} {'turns':>6} {'out tok':>8} {'in tok':>9} "
+                 f"{'median s':>8} {'ttft s':>7} {'parse err':>9}")
+    for protocol, row in summary.items():
+        ttft = "-" if row["mean_ttft_seconds"] is None else f"{row['mean_ttft_seconds']:.2f}"
+        lines.append(f"{protocol:<9} {row['runs']:>4} {row['passed']:>4}/{row['checked']:<3} {row['turns']:>6} "
+                     f"{row['output_tokens']:>8} {row['input_tokens']:>9} {row['median_seconds']:>8.1f} "
+                     f"{ttft:>7} {row['parse_failures']:>9}")
+
+    if len(summary) == 2:
+        (first, a), (second, b) = summary.items()
+        lines.append("")
+        for key, label in (("output_tokens", "output tokens"), ("turns", "turns"),
+                           ("median_seconds", "median seconds"), ("input_tokens", "input tokens")):
+            if a[key]:
+                lines.append(f"{second} vs {first}: {label} {(b[key] - a[key]) / a[key]:+.0%}")
+        lines.append(f"parse failures: {first} {a['parse_failures']}, {second} {b['parse_failures']}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suite", default=DEFAULT_SUITE, help="Task suite JSON file")
+    parser.add_argument("--protocols", default=",".join(PROTOCOLS), help="Comma-separated protocols to run")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per task and protocol")
+    parser.add_argument("--model", help="Pin a model instead of routing")
+    parser.add_argument("--token-budget", type=int, default=TOKEN_BUDGET, help="Tokens per run")
+    parser.add_argument("--config", default=os.path.join(ROOT, "config.toml"))
+    parser.add_argument("--json", help="Also write every run and the summary to this file")
+    args = parser.parse_args()
+
+    protocols = [p.strip() for p in args.protocols.split(",") if p.strip()]
+    unknown = [p for p in protocols if p not in PROTOCOLS]
+    if unknown:
+        parser.error(f"unknown protocol(s): {', '.join(unknown)}")
+    tasks = load_suite(args.suite)
+
+    runs = []
+    for repetition in range(args.repeat):
+        for index, task in enumerate(tasks):
+            # Alternate the order so neither protocol always runs against a warmer cache
+            ordered = protocols if (repetition + index) % 2 == 0 else protocols[::-1]
+            for protocol in ordered:
+                run = run_task(task, protocol, os.path.abspath(args.config), args.model, args.token_budget)
+                print(f"{task['name']} [{protocol}]: {run['status']}, {run['turns']} turns, "
+                      f"{run['output_tokens']} output tokens, {run['seconds']:.1f}s", file=sys.stderr)
+                runs.append(run)
+
+    summary = summarize(runs)
+    print(format_report(runs, summary))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"runs": runs, "summary": summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
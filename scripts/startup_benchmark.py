@@ -0,0 +1,120 @@
+"""
+Measure agent startup: import time of main.py (-X importtime) and wall time until the Agent> prompt.
+
+Usage:
+    python scripts/startup_benchmark.py [--runs N] [--wall-budget-ms MS] [--import-budget-ms MS]
+
+Exits with status 1 when the median of either measurement is over its budget,
+so it can guard against startup regressions in CI.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets for the median run, in milliseconds
+WALL_BUDGET_MS = 400
+IMPORT_BUDGET_MS = 200
+
+# Modules that must stay out of the startup path
+DEFERRED_MODULES = ("anthropic", "dotenv", "toml", "readline", "cProfile", "tracemalloc", "numpy")
+
+
+def parse_importtime(stderr: str):
+    """
+    Parse ``-X importtime`` output.
+
+    Returns:
+        (total microseconds of top-level imports, {module: cumulative microseconds})
+    """
+    cumulative = {}
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:"):].split("|", 2)
+        name = raw_name.strip()
+        cumulative[name] = int(cumulative_us)
+        # Top-level imports are indented by one space, nested ones by two more per level
+        if len(raw_name) - len(raw_name.lstrip()) <= 1:
+            total += int(cumulative_us)
+    return total, cumulative
+
+
+def measure_imports(env):
+    """Import main.py under ``-X importtime`` in a fresh interpreter."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return parse_importtime(result.stderr)
+
+
+def measure_prompt(env):
+    """Start the REPL, time how long its prompt takes to appear, then close stdin so it exits."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "main.py", "--repl"],
+        cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    seen = b""
+    while b"Agent> " not in seen:
+        chunk = proc.stdout.read1(4096)
+        if not chunk:
+            proc.wait()
+            raise RuntimeError(f"REPL exited before showing its prompt:\n{proc.stderr.read().decode()}")
+        seen += chunk
+    wall_ms = (time.perf_counter() - start) * 1000
+    # End of input makes the REPL exit (its warm-up thread is a daemon)
+    proc.communicate(input=b"", timeout=30)
+    return wall_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--wall-budget-ms", type=float, default=WALL_BUDGET_MS)
+    parser.add_argument("--import-budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault("ANTHROPIC_API_KEY", "startup-benchmark")
+    env["PYTHONUNBUFFERED"] = "1"
+
+    walls, imports = [], []
+    cumulative = {}
+    for _ in range(args.runs):
+        total_us, cumulative = measure_imports(env)
+        imports.append(total_us / 1000)
+        walls.append(measure_prompt(env))
+
+    wall, imported = statistics.median(walls), statistics.median(imports)
+    print(f"Wall time to prompt: median {wall:.0f} ms (budget {args.wall_budget_ms:.0f} ms), "
+          f"min {min(walls):.0f} ms over {args.runs} runs")
+    print(f"Import time:         median {imported:.0f} ms (budget {args.import_budget_ms:.0f} ms)")
+    print("\nSlowest imports (last run, cumulative):")
+    for name, us in sorted(cumulative.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if wall > args.wall_budget_ms:
+        failures.append(f"wall time {wall:.0f} ms > {args.wall_budget_ms:.0f} ms")
+    if imported > args.import_budget_ms:
+        failures.append(f"import time {imported:.0f} ms > {args.import_budget_ms:.0f} ms")
+    eager = [m for m in DEFERRED_MODULES if m in cumulative]
+    if eager:
+        failures.append(f"imported at startup: {', '.join(eager)}")
+    if failures:
+        print("\nStartup budget exceeded: " + "; ".join(failures))
+        sys.exit(1)
+    print("\nWithin budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 
 import logging
 from enum import Enum
-from typing import Optional
+from typing import Callable, Optional
 
 # Configure logger for this module
 logger = logging.getLogger(__name__)
@@ -17,6 +17,10 @@ if not logger.handlers:
     logger.addHandler(handler)
 
 
+# Line prefixes that show the model has started inventing utensil results
+FAKE_RESULT_PREFIXES = ("[Result of", "Result of ")
+
+
 class ParserState(Enum):
     """States for the utensil call parser state machine."""
     NORMAL = "normal"  # Accumulating regular text
@@ -42,8 +46,15 @@ class StreamingUtensilParser:
     Multi-line parameters use: PARAM:key=BEGIN_VALUE ... END_VALUE
     """
 
-    def __init__(self):
-        """Initialize the parser in NORMAL state."""
+    def __init__(self, on_param: Optional[Callable[[str, dict], None]] = None):
+        """
+        Initialize the parser in NORMAL state.
+
+        Args:
+            on_param: Optional callback invoked with (utensil_name, params_so_far)
+                each time a parameter of an in-progress utensil call is complete
+        """
+        self.on_param = on_param
         self.state = ParserState.NORMAL
         self.text_buffer = ""  # Accumulates regular text (non-utensil)
         self.token_buffer = ""  # Accumulates tokens to form complete lines
@@ -56,6 +67,10 @@ class StreamingUtensilParser:
         self.multiline_lines = []
         # Queue for multiple utensil calls in one response
         self.utensil_queue = []
+        # Text after the most recent END_UTENSIL, and whether it looks like an invented result
+        self.completed_utensils = 0
+        self.trailing_text = ""
+        self.fake_result_detected = False
 
     def add_token(self, token: str):
         """
@@ -93,6 +108,10 @@ class StreamingUtensilParser:
             else:
                 # Regular text
                 self.text_buffer += line + "\n"
+                if self.completed_utensils:
+                    self.trailing_text += line + "\n"
+                    if line.startswith(FAKE_RESULT_PREFIXES):
+                        self.fake_result_detected = True
 
         elif self.state == ParserState.IN_UTENSIL:
             self.utensil_text += line + "\n"
@@ -114,6 +133,8 @@ class StreamingUtensilParser:
                         logger.debug(f"Starting multi-line value for key: {key}")
                     else:
                         self.utensil_params[key] = value
+                        if self.on_param:
+                            self.on_param(self.utensil_name, self.utensil_params)
 
             # Check for end marker
             elif line == "END_UTENSIL":
@@ -124,6 +145,8 @@ class StreamingUtensilParser:
                     "text": self.utensil_text.strip()
                 })
                 logger.debug(f"Queued utensil: {self.utensil_name}")
+                self.completed_utensils += 1
+                self.trailing_text = ""
                 # Reset for next utensil
                 self.state = ParserState.NORMAL
                 self.utensil_name = None
@@ -140,6 +163,8 @@ class StreamingUtensilParser:
                 # Join accumulated lines and store as parameter
                 self.utensil_params[self.multiline_key] = "\n".join(self.multiline_lines)
                 logger.debug(f"Completed multi-line value for key: {self.multiline_key}")
+                if self.on_param:
+                    self.on_param(self.utensil_name, self.utensil_params)
                 self.multiline_key = None
                 self.multiline_lines = []
                 self.state = ParserState.IN_UTENSIL
@@ -187,6 +212,11 @@ class StreamingUtensilParser:
         """
         return len(self.utensil_queue)
 
+    @property
+    def incomplete_calls(self) -> int:
+        """1 if the response ended inside a utensil call (e.g. cut off by max_tokens), else 0."""
+        return 0 if self.state == ParserState.NORMAL else 1
+
     def get_text(self) -> str:
         """
         Get accumulated non-utensil text.
@@ -196,6 +226,25 @@ class StreamingUtensilParser:
         """
         return self.text_buffer.strip()
 
+    def discard_trailing_text(self) -> str:
+        """
+        Remove the text that followed the last completed utensil call.
+
+        Used when generation is cut short because the model began inventing
+        utensil results; that text, including any unfinished line still in the
+        token buffer, must not reach the message history.
+
+        Returns:
+            The discarded text
+        """
+        discarded = self.trailing_text
+        if discarded and self.text_buffer.endswith(discarded):
+            self.text_buffer = self.text_buffer[:-len(discarded)]
+        discarded += self.token_buffer
+        self.trailing_text = ""
+        self.token_buffer = ""
+        return discarded
+
     def finalize(self):
         """
         Finalize parsing by processing any remaining tokens in the buffer.
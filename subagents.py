@@ -0,0 +1,180 @@
+"""
+Parallel sub-agents: child agents that work on independent parts of a task at the same time.
+Children share the parent's client, model settings, metrics, rate limiter and process-wide caches.
+"""
+
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# A line of three or more dashes separates tasks in spawn_agents' tasks parameter
+TASK_SEPARATOR = re.compile(r"^\s*-{3,}\s*$", re.MULTILINE)
+
+# The agent whose utensil call is running in this thread
+_current_agent: ContextVar = ContextVar("current_agent", default=None)
+
+CHILD_PROMPT = """You are a sub-agent. You are working on one part of a larger task while other sub-agents work on the other parts in parallel. Work only on your part, and do not change files that belong to other parts.
+{instructions}
+Your task:
+{task}
+
+When you are done, reply without calling any utensil. Give a short final answer for the agent that started you: what you did or found, and anything left unresolved."""
+
+
+class TokenBudgetExceeded(Exception):
+    """A sub-agent used up its token budget."""
+
+
+class TokenBudget:
+    """
+    Event observer counting one agent's tokens against a limit.
+
+    The limit is checked before each request, so an agent may exceed it by
+    at most the tokens of one request.
+    """
+
+    def __init__(self, limit: int = 0):
+        self.limit = limit
+        self.used = 0
+        self.requests = 0
+
+    def on_request_end(self, usage=None, **_):
+        self.requests += 1
+        if usage is not None:
+            self.used += sum(getattr(usage, field, 0) or 0 for field in (
+                "input_tokens", "output_tokens", "cache_read_input_tokens", "cache_creation_input_tokens"))
+
+    @property
+    def exhausted(self) -> bool:
+        return 0 < self.limit <= self.used
+
+    def check(self):
+        """
+        Raises:
+            TokenBudgetExceeded: If the budget is used up
+        """
+        if self.exhausted:
+            raise TokenBudgetExceeded(f"used {self.used} of {self.limit} tokens in {self.requests} requests")
+
+
+@contextmanager
+def acting_for(agent):
+    """Make ``agent`` the current agent while one of its utensil calls runs."""
+    token = _current_agent.set(agent)
+    try:
+        yield agent
+    finally:
+        _current_agent.reset(token)
+
+
+def current_agent():
+    """The agent whose utensil call is running in this thread, or None."""
+    return _current_agent.get()
+
+
+def split_tasks(text: str) -> List[str]:
+    """Split spawn_agents' tasks parameter at separator lines, dropping empty tasks."""
+    return [task.strip() for task in TASK_SEPARATOR.split(text) if task.strip()]
+
+
+@dataclass
+class ChildResult:
+    task: str
+    # "done", "budget" or "failed"
+    status: str
+    answer: str
+    tokens: int
+    seconds: float
+
+
+def _run_child(parent, task: str, instructions: Optional[str], token_budget: int) -> ChildResult:
+    start = time.perf_counter()
+    child = parent.spawn_child(token_budget)
+    prompt = CHILD_PROMPT.format(task=task, instructions=f"\n{instructions.strip()}\n" if instructions else "")
+    try:
+        answer = child.run_with_utensils(prompt) or "(no answer)"
+        status = "done"
+    except TokenBudgetExceeded as e:
+        progress = next((m["content"] for m in reversed(child.message_history)
+                         if m["role"] == "assistant" and isinstance(m["content"], str)), "")
+        answer = f"Stopped: {e}." + (f" Last progress:\n{progress}" if progress else "")
+        status = "budget"
+    except Exception as e:
+        answer = f"Failed: {type(e).__name__}: {e}"
+        status = "failed"
+    return ChildResult(task, status, answer, child.token_budget.used, time.perf_counter() - start)
+
+
+def run_children(parent, tasks: List[str], instructions: Optional[str] = None, max_parallel: int = 4,
+                 token_budget: int = 0) -> List[ChildResult]:
+    """
+    Run one sub-agent per task, at most max_parallel at a time.
+
+    Args:
+        parent: The agent starting the children
+        tasks: One task description per child
+        instructions: Instructions given to every child, before its task
+        max_parallel: Children running at the same time
+        token_budget: Tokens each child may use (0 for no limit)
+
+    Returns:
+        One result per task, in task order
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix="subagent") as executor:
+        futures = [executor.submit(_run_child, parent, task, instructions, token_budget) for task in tasks]
+        return [future.result() for future in futures]
+
+
+def format_results(results: List[ChildResult], seconds: float, max_answer_chars: int = 3000) -> str:
+    """Combine the children's final answers into one result, with a summary line first."""
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    labels = {"done": "done", "budget": "stopped at their token budget", "failed": "failed"}
+    summary = ", ".join(f"{counts[status]} {label}" for status, label in labels.items() if status in counts)
+    lines = [f"[{len(results)} sub-agents: {summary}; {sum(r.tokens for r in results)} tokens, "
+             f"{seconds:.1f}s]"]
+    for i, result in enumerate(results, 1):
+        title = result.task.splitlines()[0]
+        if len(title) > 80:
+            title = title[:77] + "..."
+        answer = result.answer.strip()
+        if len(answer) > max_answer_chars:
+            answer = answer[:max_answer_chars] + "\n[... answer truncated]"
+        lines.append(f"\n### {i}. {title} ({result.status}, {result.tokens} tokens, {result.seconds:.1f}s)")
+        lines.append(answer)
+    return "\n".join(lines)
+
+
+def spawn(parent, tasks: List[str], instructions: Optional[str] = None, max_parallel: Optional[int] = None,
+          token_budget: Optional[int] = None) -> str:
+    """
+    Run sub-agents for the tasks and return their combined answers.
+
+    Limits come from the ``[subagents]`` section of config.toml; the parent's
+    max_parallel and token_budget may only lower them.
+
+    Raises:
+        ValueError: If there are no tasks, too many, or sub-agents may not spawn here
+    """
+    config = parent.model_manager.config.get("subagents", {})
+    if parent.depth >= config.get("max_depth", 1):
+        raise ValueError("sub-agents cannot start further sub-agents")
+    if not tasks:
+        raise ValueError("no tasks given; separate tasks with a line containing only ---")
+    max_tasks = config.get("max_tasks", 12)
+    if len(tasks) > max_tasks:
+        raise ValueError(f"{len(tasks)} tasks given, at most {max_tasks} allowed; group smaller tasks together")
+
+    limit = config.get("max_parallel", 4)
+    parallel = min(max_parallel, limit) if max_parallel else limit
+    budget_limit = config.get("token_budget", 200000)
+    budget = min(token_budget, budget_limit) if token_budget and budget_limit else token_budget or budget_limit
+
+    start = time.perf_counter()
+    results = run_children(parent, tasks, instructions, parallel, budget)
+    return format_results(results, time.perf_counter() - start, config.get("max_answer_chars", 3000))
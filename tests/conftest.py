@@ -5,4 +5,73 @@ from pathlib import Path
 
 # Add the project root to the Python path so tests can import modules
 project_root = Path(__file__).parent.parent
-sys.path.insert(0, str(project_root))
\ No newline at end of file
+sys.path.insert(0, str(project_root))
+
+import pytest
+from types import SimpleNamespace
+
+
+class FakeStream:
+    """Minimal stand-in for the SDK's MessageStream."""
+
+    def __init__(self, text, input_tokens=10, output_tokens=None):
+        self.tokens = [text[i:i + 4] for i in range(0, len(text), 4)]
+        self.usage = SimpleNamespace(
+            input_tokens=input_tokens,
+            output_tokens=output_tokens if output_tokens is not None else len(self.tokens),
+            cache_read_input_tokens=0,
+            cache_creation_input_tokens=0,
+        )
+        self.closed = False
+        self.consumed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+        return False
+
+    @property
+    def text_stream(self):
+        for token in self.tokens:
+            self.consumed += 1
+            yield token
+
+    @property
+    def current_message_snapshot(self):
+        return SimpleNamespace(usage=self.usage, stop_reason=None)
+
+    def get_final_message(self):
+        return SimpleNamespace(usage=self.usage, stop_reason="end_turn")
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient:
+    """Fake Anthropic client that replays scripted responses in order."""
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.messages = self
+
+    def stream(self, **kwargs):
+        self.requests.append(kwargs)
+        self.last_stream = FakeStream(self.responses.pop(0))
+        return self.last_stream
+
+
+@pytest.fixture
+def fake_agent(monkeypatch, tmp_path):
+    """Build an Agent whose client replays scripted responses."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    from agent import Agent
+
+    def build(responses):
+        agent = Agent()
+        agent.client = FakeClient(responses)
+        return agent
+
+    return build
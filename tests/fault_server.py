@@ -0,0 +1,117 @@
+"""
+Local fault-injecting stand-in for the Messages API.
+Serves scripted streaming responses, overload errors and mid-stream disconnects over real HTTP.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _sse(event: str, data: dict) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+def message_events(text: str, chunk: int = 8, stop_reason: str = "end_turn") -> list:
+    """Return the SSE events of a streamed text response, one delta per ``chunk`` characters."""
+    events = [
+        _sse("message_start", {"type": "message_start", "message": {
+            "id": "msg_fault", "type": "message", "role": "assistant", "model": "fault-model",
+            "content": [], "stop_reason": None, "stop_sequence": None,
+            "usage": {"input_tokens": 10, "output_tokens": 1}}}),
+        _sse("content_block_start", {"type": "content_block_start", "index": 0,
+                                     "content_block": {"type": "text", "text": ""}}),
+    ]
+    for i in range(0, len(text), chunk):
+        events.append(_sse("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                                   "delta": {"type": "text_delta", "text": text[i:i + chunk]}}))
+    events += [
+        _sse("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        _sse("message_delta", {"type": "message_delta",
+                               "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                               "usage": {"output_tokens": max(1, len(text) // 4)}}),
+        _sse("message_stop", {"type": "message_stop"}),
+    ]
+    return events
+
+
+class FaultServer:
+    """
+    HTTP server replaying a script of faults and responses, one entry per request.
+
+    Script entries:
+        ("status", code, retry_after): an error response, e.g. 529 overloaded
+        ("drop", text, after_chars): stream ``text`` but cut the connection after ``after_chars``
+        ("ok", text): a complete streamed response
+
+    Every request body is recorded in ``requests``. Use as a context manager;
+    ``base_url`` points the SDK at the server.
+    """
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("content-length", 0)))
+                server.requests.append(json.loads(body))
+                entry = server.script.pop(0) if server.script else ("status", 500, None)
+                getattr(self, f"_{entry[0]}")(*entry[1:])
+
+            def _status(self, code, retry_after):
+                payload = json.dumps({"type": "error", "error": {
+                    "type": "overloaded_error", "message": "Overloaded"}}).encode()
+                self.send_response(code)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(payload)))
+                if retry_after is not None:
+                    self.send_header("retry-after", str(retry_after))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _start_stream(self):
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _ok(self, text):
+                self._start_stream()
+                for event in message_events(text):
+                    self._write_chunk(event)
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _drop(self, text, after_chars):
+                self._start_stream()
+                # Only the events carrying the first after_chars characters, then no terminating chunk
+                for event in message_events(text[:after_chars])[:-3]:
+                    self._write_chunk(event)
+                self.close_connection = True
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        return False
@@ -0,0 +1,44 @@
+"""Tests for the shared API client."""
+
+import pytest
+
+import client
+from commands import CommandHandler
+
+
+@pytest.fixture(autouse=True)
+def fresh_client():
+    client.reset_client()
+    yield
+    client.reset_client()
+
+
+def test_client_is_shared(monkeypatch):
+    """Test that every caller gets the same client."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    assert client.get_client() is client.get_client()
+
+
+def test_missing_key_raises(monkeypatch):
+    """Test that a missing API key raises ValueError."""
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    with pytest.raises(ValueError):
+        client.get_client()
+
+
+def test_api_key_resolved_once(monkeypatch):
+    """Test that the key is read from the environment only once."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "first")
+    assert client.get_api_key() == "first"
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "second")
+    assert client.get_api_key() == "first"
+
+
+def test_agent_and_commands_share_client(monkeypatch):
+    """Test that /compact uses the agent's client instead of its own."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    from agent import Agent
+
+    agent = Agent()
+    handler = CommandHandler(agent)
+    assert handler.client is agent.client is client.get_client()
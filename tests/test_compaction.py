@@ -0,0 +1,101 @@
+"""Tests for map-reduce history compaction."""
+
+import threading
+from types import SimpleNamespace
+
+from commands import CommandHandler
+from compaction import SUMMARY_PREFIX, Compactor, build_chunks, split_turns
+from history import result_block
+from model_manager import _Snapshot
+
+
+class SummaryClient:
+    """Fake client whose messages.create returns a numbered summary."""
+
+    def __init__(self):
+        self.prompts = []
+        self.lock = threading.Lock()
+        self.messages = self
+
+    def create(self, model, max_tokens, messages):
+        with self.lock:
+            self.prompts.append((model, messages[0]["content"]))
+            n = len(self.prompts)
+        return SimpleNamespace(content=[SimpleNamespace(text=f"summary {n}")])
+
+
+def _turn(prompt, size=100):
+    return [
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": "UTENSIL:read_file\nPARAM:file_path=a.py\nEND_UTENSIL"},
+        {"role": "user", "content": [result_block("read_file", "x" * size)]},
+    ]
+
+
+def test_split_turns_on_user_prompts():
+    """Test that result messages stay with the turn that produced them."""
+    history = _turn("one") + _turn("two")
+    turns = split_turns(history)
+    assert [len(t) for t in turns] == [3, 3]
+    assert turns[1][0]["content"] == "two"
+
+
+def test_chunk_boundaries_are_stable_when_appending():
+    """Test that adding turns only affects the tail chunk."""
+    turns = split_turns(_turn("one") + _turn("two") + _turn("three"))
+    before = build_chunks(turns, chunk_chars=400)
+    after = build_chunks(turns + split_turns(_turn("four")), chunk_chars=400)
+    assert after[:len(before) - 1] == before[:-1]
+
+
+def test_compact_merges_and_caches_chunks():
+    """Test that chunks are summarized, merged, and not re-sent on a second compaction."""
+    client = SummaryClient()
+    compactor = Compactor(client, model="cheap", merge_model="smart", chunk_chars=400)
+    history = _turn("one") + _turn("two") + _turn("three")
+
+    compactor.compact(history)
+    chunk_calls = [p for p in client.prompts if p[0] == "cheap"]
+    assert len(chunk_calls) == len(build_chunks(split_turns(history), 400)) > 1
+    assert client.prompts[-1][0] == "smart"
+
+    client.prompts.clear()
+    compactor.compact(history + _turn("four"))
+    # Only the changed tail chunk is summarized again, then merged
+    assert len([p for p in client.prompts if p[0] == "cheap"]) == 1
+
+
+def test_previous_summary_is_not_resummarized():
+    """Test that an earlier summary is passed through to the merge step."""
+    client = SummaryClient()
+    compactor = Compactor(client, model="cheap", chunk_chars=400)
+    history = [{"role": "user", "content": f"{SUMMARY_PREFIX}earlier work"}] + _turn("next")
+
+    compactor.compact(history)
+    assert len(client.prompts) == 2
+    assert "earlier work" in client.prompts[-1][1]
+    assert "earlier work" not in client.prompts[0][1]
+
+
+def test_compact_follows_model_switches_and_config_reloads(fake_agent):
+    """Test that /compact picks up a new model or [compact] section instead of the first one it saw."""
+    agent = fake_agent([])
+    manager = agent.model_manager
+    handler = CommandHandler(agent)
+
+    def reload(compact):
+        snapshot = manager._snapshot
+        manager._snapshot = _Snapshot({**snapshot.config, "compact": compact}, snapshot.models,
+                                      snapshot.specs, snapshot.default_model)
+
+    reload({})
+    first = handler.compactor
+    assert handler.compactor is first and first.model == agent.model
+
+    agent.model = "claude-other"
+    assert handler.compactor.model == "claude-other"
+
+    reload({"model": "cheap", "chunk_chars": 500})
+    compactor = handler.compactor
+    assert (compactor.model, compactor.chunk_chars) == ("cheap", 500)
+    assert handler.compactor is compactor
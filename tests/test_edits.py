@@ -0,0 +1,106 @@
+"""Tests for compacting file edits in the message history."""
+
+from types import SimpleNamespace
+
+import pytest
+
+from edits import EditCompactor, format_call
+from history import utensil_calls
+from journal import SessionJournal
+from subagents import acting_for
+from utensils import edit_file, read_blob, write_file
+
+BODY = "".join(f"def function_{i}():\n    return {i}\n\n" for i in range(40))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def run(compactor, name, params):
+    """Execute a call as the agent does and return its history text."""
+    call = {"name": name, "params": params, "text": format_call(name, params)}
+    before = compactor.before(name, params)
+    result = {"write_file": write_file, "edit_file": edit_file}[name](**params)
+    return compactor.compact(call, before, result)
+
+
+def test_new_file_becomes_hash_that_read_blob_expands(workdir):
+    text = run(EditCompactor(), "write_file", {"file_path": "big.py", "content": BODY})
+    assert BODY not in text
+    assert "[new file, 120 lines" in text
+    digest = text.split("sha256:")[1].split(";")[0]
+    assert read_blob(digest) == BODY
+    assert read_blob(f"sha256:{digest}") == BODY
+    assert read_blob("ffffffffffff").startswith("Error:")
+
+
+def test_rewrite_of_existing_file_becomes_diff(workdir):
+    (workdir / "big.py").write_text(BODY)
+    changed = BODY.replace("return 7\n", "return 700\n")
+    text = run(EditCompactor(), "write_file", {"file_path": "big.py", "content": changed})
+    assert "-    return 7\n+    return 700" in text
+    assert "return 30" not in text
+    assert len(text) < len(BODY) // 3
+
+
+def test_large_edit_file_becomes_diff(workdir):
+    (workdir / "big.py").write_text(BODY)
+    old = BODY[:600]
+    new = old.replace("return 3\n", "return 3 + 0\n")
+    text = run(EditCompactor(), "edit_file", {"file_path": "big.py", "old_text": old, "new_text": new})
+    assert "old_text=[elided, see new_text]" in text
+    assert "+    return 3 + 0" in text
+    assert len(text) < len(old)
+
+
+def test_small_and_failed_calls_are_kept(workdir):
+    compactor = EditCompactor()
+    params = {"file_path": "small.py", "content": "x = 1\n"}
+    assert run(compactor, "write_file", params) == format_call("write_file", params)
+
+    params = {"file_path": "missing.py", "old_text": BODY, "new_text": BODY + "\n"}
+    assert run(compactor, "edit_file", params) == format_call("edit_file", params)
+
+
+def test_compacted_call_still_parses(workdir):
+    text = run(EditCompactor(), "write_file", {"file_path": "big.py", "content": BODY})
+    [(name, params)] = utensil_calls({"role": "assistant", "content": "Writing it.\n\n" + text})
+    assert name == "write_file"
+    assert params["file_path"] == "big.py"
+    assert params["content"].startswith("[new file")
+
+
+def test_disabled_by_config():
+    assert EditCompactor.from_config({"compact": False}) is None
+    assert EditCompactor.from_config({"min_chars": 10}).min_chars == 10
+
+
+def test_agent_stores_compacted_call_in_history(fake_agent, tmp_path, monkeypatch):
+    call = format_call("write_file", {"file_path": "big.py", "content": BODY})
+    agent = fake_agent([f"I'll write it.\n{call}", "Done."])
+    monkeypatch.chdir(tmp_path)
+    workdir = tmp_path
+    agent.run_with_utensils("write big.py")
+
+    assert (workdir / "big.py").read_text() == BODY
+    assistant = agent.message_history[1]["content"]
+    assert assistant.startswith("I'll write it.")
+    assert BODY not in assistant and "sha256:" in assistant
+    # The next request carries the compact form, not the body
+    assert BODY not in str(agent.client.requests[1]["messages"])
+
+
+def test_blobs_live_with_the_configured_journal(workdir):
+    journal = SessionJournal(directory="elsewhere/sessions")
+    compactor = EditCompactor.from_config({}, journal.blobs.root)
+    text = run(compactor, "write_file", {"file_path": "big.py", "content": BODY})
+    digest = text.split("sha256:")[1].split(";")[0]
+    assert journal.blobs.find(digest)
+
+    assert read_blob(digest).startswith("Error:")
+    with acting_for(SimpleNamespace(blob_directory=journal.blobs.root)):
+        assert read_blob(digest) == BODY
+
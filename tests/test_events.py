@@ -0,0 +1,94 @@
+"""Tests for the agent event bus."""
+
+import pytest
+
+from events import EventBus
+
+
+def test_sync_listener_receives_payload():
+    """Test that a synchronous listener gets the payload as keyword arguments."""
+    bus = EventBus()
+    received = []
+    bus.subscribe("on_token", lambda token: received.append(token))
+
+    bus.emit("on_token", token="abc")
+    assert received == ["abc"]
+
+
+def test_wants_and_unsubscribe():
+    """Test that wants() reflects registration and unsubscribe removes the listener."""
+    bus = EventBus()
+    assert not bus.wants("on_token")
+
+    unsubscribe = bus.subscribe("on_token", lambda token: None)
+    assert bus.wants("on_token")
+
+    unsubscribe()
+    assert not bus.wants("on_token")
+
+
+def test_unknown_event_rejected():
+    """Test that subscribing to an unknown event raises."""
+    bus = EventBus()
+    with pytest.raises(ValueError):
+        bus.subscribe("on_nothing", lambda: None)
+
+
+def test_background_dispatch():
+    """Test that background listeners are delivered in order on the dispatch thread."""
+    bus = EventBus()
+    received = []
+    bus.subscribe("on_token", lambda token: received.append(token), background=True)
+
+    for token in "abc":
+        bus.emit("on_token", token=token)
+    bus.flush()
+    bus.close()
+
+    assert received == ["a", "b", "c"]
+
+
+def test_listener_errors_are_contained():
+    """Test that a failing listener does not stop other listeners."""
+    bus = EventBus()
+    received = []
+
+    def broken(token):
+        raise RuntimeError("boom")
+
+    bus.subscribe("on_token", broken)
+    bus.subscribe("on_token", lambda token: received.append(token))
+    bus.emit("on_token", token="x")
+    assert received == ["x"]
+
+
+def test_agent_emits_turn_events(fake_agent):
+    """Test the order of events emitted during a turn with one utensil call."""
+    agent = fake_agent([
+        "UTENSIL:read_file\nPARAM:file_path=/nonexistent\nEND_UTENSIL\n",
+        "Done.",
+    ])
+
+    class Recorder:
+        def __init__(self):
+            self.events = []
+
+        def on_turn_start(self, **_):
+            self.events.append("turn_start")
+
+        def on_utensil_parsed(self, call):
+            self.events.append(f"parsed:{call['name']}")
+
+        def on_utensil_end(self, name, **_):
+            self.events.append(f"end:{name}")
+
+        def on_turn_end(self, response, **_):
+            self.events.append(f"turn_end:{response}")
+
+    recorder = Recorder()
+    agent.events.attach(recorder)
+    agent.run_with_utensils("read it")
+
+    assert recorder.events == [
+        "turn_start", "parsed:read_file", "end:read_file", "turn_end:Done.",
+    ]
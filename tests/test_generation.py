@@ -0,0 +1,46 @@
+"""Tests for stopping generation after a complete utensil batch."""
+
+import pytest
+
+from generation import RESULT_STOP_SEQUENCE, GenerationControl
+
+
+def test_modes_control_stop_sequences():
+    """Test which modes send a server-side stop sequence."""
+    assert GenerationControl("both").stop_sequences() == [RESULT_STOP_SEQUENCE]
+    assert GenerationControl("stop_sequences").stop_sequences() == [RESULT_STOP_SEQUENCE]
+    assert GenerationControl("client").stop_sequences() == []
+    with pytest.raises(ValueError):
+        GenerationControl("sometimes")
+
+
+def test_savings_estimate_uses_output_rate():
+    """Test that latency saved is derived from the response's token rate."""
+    control = GenerationControl(estimated_tail_tokens=100)
+    savings = control.estimate_savings(True, output_tokens=50, generation_seconds=1.0)
+    assert savings.tokens == 100
+    assert savings.seconds == pytest.approx(2.0)
+    assert control.estimate_savings(False, 50, 1.0).tokens == 0
+
+
+def test_agent_cancels_invented_results(fake_agent):
+    """Test that the agent stops reading once the model invents a result."""
+    agent = fake_agent([
+        "UTENSIL:read_file\nPARAM:file_path=/nonexistent\nEND_UTENSIL\n"
+        "[Result of read_file]\n" + "made up contents\n" * 50,
+        "Done.",
+    ])
+    client = agent.client
+    first_request = None
+
+    def remember(**_):
+        nonlocal first_request
+        first_request = first_request or client.last_stream
+
+    agent.events.subscribe("on_stream_open", remember)
+    agent.run_with_utensils("read it")
+
+    assert client.requests[0]["stop_sequences"] == [RESULT_STOP_SEQUENCE]
+    assert first_request.consumed < len(first_request.tokens)
+    assert "made up" not in agent.message_history[1]["content"]
+    assert agent.metrics.counter_total("agent_early_stops_total") == 1
@@ -0,0 +1,95 @@
+"""Tests for the git utensils and their persistent batch processes."""
+
+import subprocess
+
+import pytest
+
+import gitbatch
+from utensils import execute_utensil, git_blob, git_commit, git_log, git_status, git_tree
+
+
+def git(root, *args):
+    subprocess.run(["git", "-c", "user.name=Tester", "-c", "user.email=t@example.com", *args],
+                   cwd=root, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    git(tmp_path, "init", "-q", "-b", "main")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "app.py").write_text("".join(f"line {i}\n" for i in range(1, 11)))
+    (tmp_path / "README").write_text("hello\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-qm", "Initial import")
+    (tmp_path / "README").write_text("hello again\n")
+    git(tmp_path, "commit", "-qam", "Update readme")
+    (tmp_path / "src" / "app.py").write_text("changed\n")
+    (tmp_path / "new.txt").write_text("untracked\n")
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    gitbatch.close_repositories()
+
+
+def test_blob_reads_committed_version_with_line_window(repo):
+    assert git_blob("src/app.py").startswith("blob ")
+    assert "line 10" in git_blob("src/app.py")
+    window = git_blob("src/app.py", start_line=3, max_lines=2)
+    assert window.splitlines()[1:] == ["line 3", "line 4", "[... 6 more lines; use start_line=5 to continue]"]
+    assert git_blob("README", rev="HEAD~1").splitlines()[1] == "hello"
+    assert git_blob("missing.txt").startswith("Error: 'HEAD:missing.txt' is missing")
+    assert git_blob("src").startswith("Error: 'src' is a tree")
+
+
+def test_tree_lists_entries(repo):
+    listing = git_tree(recursive=True)
+    assert "tree   " in listing and "src/\n" in listing
+    assert listing.rstrip().endswith("src/app.py")
+    assert git_tree(max_entries=1).endswith("[... 1 more entries not shown]")
+
+
+def test_log_and_path_filter(repo):
+    lines = git_log().splitlines()
+    assert [line.split(": ", 1)[1] for line in lines] == ["Update readme", "Initial import"]
+    assert "Tester" in lines[0]
+    assert git_log(path="src").splitlines()[0].endswith("Initial import")
+    assert len(git_log(path="src").splitlines()) == 1
+    assert len(git_log(max_count=1).splitlines()) == 1
+
+
+def test_commit_lists_changed_files(repo):
+    shown = git_commit()
+    assert "Update readme" in shown
+    assert "  M README" in shown
+    assert "  A src/app.py" in git_commit("HEAD~1")
+
+
+def test_status_groups_changes(repo):
+    status = git_status()
+    assert "Branch: main" in status
+    assert "Unstaged (1):\n  M src/app.py" in status
+    assert "Untracked (1):\n  new.txt" in status
+
+
+def test_processes_are_reused_and_objects_cached(repo):
+    git_blob("README")
+    repository = gitbatch.get_repository(".")
+    pid = repository.batch.proc.pid
+    misses = repository.misses
+    git_blob("README")
+    assert repository.batch.proc.pid == pid
+    assert repository.misses == misses
+    assert repository.hits > 0
+
+
+def test_dead_process_is_restarted(repo):
+    git_blob("README")
+    repository = gitbatch.get_repository(".")
+    repository.check.proc.kill()
+    repository.check.proc.wait()
+    assert git_blob("README", rev="HEAD~1").splitlines()[1] == "hello"
+
+
+def test_registered_with_typed_params(repo, tmp_path_factory):
+    assert execute_utensil("git_log", {"max_count": "1"}).count("\n") == 0
+    outside = tmp_path_factory.mktemp("outside")
+    assert git_blob(str(outside / "x")).startswith("Error: not a git repository")
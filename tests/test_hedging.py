@@ -0,0 +1,127 @@
+"""Tests for hedged streaming requests and per-model latency statistics."""
+
+import time
+
+import pytest
+
+from tests.conftest import FakeStream
+from hedging import open_hedged_stream
+from model_manager import ModelManager
+
+
+class DelayedStream(FakeStream):
+    """FakeStream whose first token arrives after a delay."""
+
+    def __init__(self, text, delay):
+        super().__init__(text)
+        self.delay = delay
+
+    @property
+    def text_stream(self):
+        deadline = time.monotonic() + self.delay
+        while time.monotonic() < deadline:
+            if self.closed:
+                return
+            time.sleep(0.005)
+        yield from super().text_stream
+
+
+def test_fast_primary_is_not_hedged():
+    """Test that no hedge is sent when the first token beats the threshold."""
+    opened = []
+
+    def open_stream(model):
+        opened.append(model)
+        return DelayedStream("hello world", delay=0)
+
+    with open_hedged_stream(open_stream, "primary", "fallback", threshold=1.0) as stream:
+        text = "".join(stream.text_stream)
+
+    assert text == "hello world"
+    assert opened == ["primary"]
+    assert stream.model == "primary" and not stream.hedged
+
+
+def test_slow_primary_loses_to_hedge():
+    """Test that the hedge wins when the primary is slow, and the primary is cancelled."""
+    streams = {}
+
+    def open_stream(model):
+        streams[model] = DelayedStream(f"from {model}", delay=2.0 if model == "primary" else 0)
+        return streams[model]
+
+    start = time.monotonic()
+    with open_hedged_stream(open_stream, "primary", "fallback", threshold=0.05) as stream:
+        text = "".join(stream.text_stream)
+
+    assert time.monotonic() - start < 1.0
+    assert text == "from fallback"
+    assert stream.model == "fallback" and stream.hedged
+    assert streams["primary"].closed
+
+
+def test_hedge_needs_a_reservation():
+    """Test that no hedge is sent when the rate limiter has no room for it."""
+    opened, reserved = [], []
+
+    def open_stream(model):
+        opened.append(model)
+        return DelayedStream(f"from {model}", delay=0.2 if model == "primary" else 0)
+
+    def reserve(model):
+        reserved.append(model)
+        return None
+
+    with open_hedged_stream(open_stream, "primary", "fallback", threshold=0.02, reserve=reserve) as stream:
+        text = "".join(stream.text_stream)
+
+    assert text == "from primary"
+    assert reserved == ["fallback"] and opened == ["primary"]
+    assert not stream.hedged and stream.reservation is None
+
+    with open_hedged_stream(open_stream, "primary", "fallback", threshold=0.02,
+                            reserve=lambda model: f"reservation for {model}") as stream:
+        "".join(stream.text_stream)
+    assert stream.hedged and stream.reservation == "reservation for fallback"
+
+
+def test_each_request_is_timed_from_its_own_start_and_the_loser_released():
+    """Test TTFT samples for both requests of a race, and that the cancelled request's reservation is released."""
+    samples, released = {}, []
+
+    def open_stream(model):
+        return DelayedStream(f"from {model}", delay=2.0 if model == "primary" else 0)
+
+    with open_hedged_stream(open_stream, "primary", "fallback", threshold=0.2, reservation="primary's",
+                            reserve=lambda model: "fallback's", release=released.append,
+                            record_ttft=lambda model, seconds: samples.setdefault(model, seconds)) as stream:
+        "".join(stream.text_stream)
+
+    assert stream.model == "fallback" and stream.reservation == "fallback's"
+    assert released == ["primary's"]
+    # The hedge's sample excludes the threshold wait; the primary's is a lower bound of at least that wait
+    assert samples["fallback"] < 0.15
+    assert 0.2 <= samples["primary"] < 2.0
+
+
+def test_errors_propagate_when_all_requests_fail():
+    """Test that the primary's error is raised if nothing succeeds."""
+    def open_stream(model):
+        raise RuntimeError(f"{model} overloaded")
+
+    with pytest.raises(RuntimeError, match="primary overloaded"):
+        open_hedged_stream(open_stream, "primary", "primary", threshold=0.01)
+
+
+def test_threshold_adapts_and_fastest_model_chosen():
+    """Test adaptive thresholds and hedge model selection from latency stats."""
+    manager = ModelManager()
+    slow, fast = list(manager.available_models)[:2]
+    base = manager.hedge_threshold(slow)
+
+    for _ in range(10):
+        manager.latency.record(slow, 8.0)
+        manager.latency.record(fast, 0.4)
+
+    assert manager.hedge_threshold(slow) > base
+    assert manager.hedge_model(slow) == fast
@@ -0,0 +1,85 @@
+"""Tests for message history helpers and stale result elision."""
+
+from history import content_text, elide_stale_results, is_result_message, result_block
+
+
+def _call(name, **params):
+    lines = [f"UTENSIL:{name}"] + [f"PARAM:{k}={v}" for k, v in params.items()] + ["END_UTENSIL"]
+    return {"role": "assistant", "content": "\n".join(lines)}
+
+
+def _results(*pairs):
+    return {"role": "user", "content": [result_block(name, body) for name, body in pairs]}
+
+
+BIG = "line of file content\n" * 50
+
+
+def test_content_text_and_result_detection():
+    """Test flattening block content and recognizing result messages."""
+    message = _results(("read_file", "abc"), ("execute_command", "ok"))
+    assert is_result_message(message)
+    assert not is_result_message({"role": "user", "content": "hello"})
+    assert content_text(message["content"]) == "[Result of read_file]\nabc\n\n[Result of execute_command]\nok"
+
+
+def test_superseded_read_is_elided():
+    """Test that a read is elided once a later call edits the same file."""
+    history = [
+        {"role": "user", "content": "fix a.py"},
+        _call("read_file", file_path="a.py"),
+        _results(("read_file", BIG)),
+        _call("edit_file", file_path="a.py", old_text="x", new_text="y"),
+        _results(("edit_file", "Successfully edited 'a.py'")),
+    ]
+    elided = elide_stale_results(history, max_age_turns=0)
+
+    assert "stale result elided: 'a.py'" in elided[2]["content"][0]["text"]
+    assert elided[4] is history[4]
+    # The stored history is never modified
+    assert history[2]["content"][0]["text"].endswith(BIG)
+
+
+def test_old_results_are_elided_by_age():
+    """Test that results older than max_age_turns are elided and recent ones kept."""
+    history = [
+        {"role": "user", "content": "turn 1"},
+        _call("execute_command", command="pytest"),
+        _results(("execute_command", BIG)),
+        {"role": "user", "content": "turn 2"},
+        _call("read_file", file_path="b.py"),
+        _results(("read_file", BIG)),
+        {"role": "user", "content": "turn 3"},
+    ]
+    elided = elide_stale_results(history, max_age_turns=2)
+
+    assert "stale result elided: 'pytest'" in elided[2]["content"][0]["text"]
+    assert elided[5] is history[5]
+
+
+def test_small_results_kept():
+    """Test that short results are never elided."""
+    history = [
+        {"role": "user", "content": "turn 1"},
+        _call("read_file", file_path="a.py"),
+        _results(("read_file", "short")),
+        {"role": "user", "content": "turn 2"},
+    ]
+    assert elide_stale_results(history, max_age_turns=1) is history
+
+
+def test_stub_is_stable_across_turns():
+    """Test that an elided prefix is byte-for-byte identical as the history grows."""
+    history = [
+        {"role": "user", "content": "turn 1"},
+        _call("read_file", file_path="a.py"),
+        _results(("read_file", BIG)),
+        {"role": "user", "content": "turn 2"},
+    ]
+    first = elide_stale_results(history, max_age_turns=1)
+
+    history += [_call("write_file", file_path="a.py", content="new"), _results(("write_file", "ok")),
+                {"role": "user", "content": "turn 3"}]
+    second = elide_stale_results(history, max_age_turns=1)
+
+    assert second[:4] == first
@@ -0,0 +1,110 @@
+"""Tests for the session journal and resume."""
+
+from journal import SessionJournal, list_sessions, load_session, read_session, resume_session
+
+
+def test_round_trip_with_blobs(tmp_path):
+    """Test that messages round-trip and large texts are stored once by hash."""
+    directory = str(tmp_path)
+    journal = SessionJournal(directory, session_id="s1", blob_threshold=10, fsync=False)
+    big = "x" * 100
+    journal.on_message({"role": "user", "content": "hi"})
+    journal.on_message({"role": "assistant", "content": big})
+    journal.on_message({"role": "user", "content": [{"type": "text", "text": big}]})
+    journal.close()
+
+    history = load_session("s1", directory)
+    assert history == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": big},
+        {"role": "user", "content": [{"type": "text", "text": big}]},
+    ]
+    # The large text is referenced by hash rather than inlined
+    assert big not in (tmp_path / "s1.jsonl").read_text()
+
+
+def test_reset_drops_earlier_records(tmp_path):
+    """Test that a reset record discards the history before it."""
+    journal = SessionJournal(str(tmp_path), session_id="s1", fsync=False)
+    journal.on_message({"role": "user", "content": "old"})
+    journal.on_history_reset([{"role": "user", "content": "[Previous conversation summary]: x"}])
+    journal.on_message({"role": "assistant", "content": "new"})
+    journal.close()
+
+    history = load_session("s1", str(tmp_path))
+    assert [m["content"] for m in history] == ["[Previous conversation summary]: x", "new"]
+
+
+def test_torn_final_line_is_ignored_and_repaired(tmp_path):
+    """Test crash safety: a partial last line is skipped and cut before new appends."""
+    journal = SessionJournal(str(tmp_path), session_id="s1", fsync=False)
+    journal.on_message({"role": "user", "content": "kept"})
+    journal.close()
+    with open(tmp_path / "s1.jsonl", "a") as f:
+        f.write('{"r":"assistant","c":"tor')
+
+    assert load_session("s1", str(tmp_path)) == [{"role": "user", "content": "kept"}]
+
+    journal = SessionJournal(str(tmp_path), session_id="s1", fsync=False)
+    journal.on_message({"role": "assistant", "content": "after"})
+    journal.close()
+    assert [m["content"] for m in load_session("s1", str(tmp_path))] == ["kept", "after"]
+
+
+def test_agent_journal_and_resume(fake_agent, tmp_path):
+    """Test that an attached journal records a turn and resume restores it."""
+    agent = fake_agent(["Hello!"])
+    journal = SessionJournal(str(tmp_path), session_id="s1", fsync=False)
+    agent.events.attach(journal)
+    agent.run_with_utensils("hi")
+    journal.close()
+
+    assert list_sessions(str(tmp_path)) == ["s1"]
+
+    resumed = fake_agent([])
+    new_journal = SessionJournal(str(tmp_path), fsync=False)
+    resumed.events.attach(new_journal)
+    count = resume_session(resumed, new_journal, "s1")
+
+    assert count == 1
+    assert resumed.message_history == [{"role": "user", "content": "hi"}]
+    assert new_journal.session_id == "s1"
+
+
+def test_resume_restores_the_recorded_protocol(fake_agent, tmp_path):
+    """Test that a session recorded with native tool use is resumed in that protocol."""
+    agent = fake_agent([])
+    agent.set_protocol("tools")
+    journal = SessionJournal(str(tmp_path), session_id="s1", fsync=False, protocol=agent.protocol)
+    agent.events.attach(journal)
+    agent._append_message({"role": "user", "content": "read a.py"})
+    agent._append_message({"role": "assistant", "content": [
+        {"type": "tool_use", "id": "t1", "name": "read_file", "input": {"file_path": "a.py"}}]})
+    agent._append_message({"role": "user", "content": [
+        {"type": "tool_result", "tool_use_id": "t1", "content": "x = 1"}]})
+    journal.close()
+    assert read_session("s1", str(tmp_path))[1] == "tools"
+
+    resumed = fake_agent([])
+    assert resumed.protocol == "utensils"
+    resumed.message_history = [{"role": "user", "content": "unrelated"}]
+    new_journal = SessionJournal(str(tmp_path), fsync=False, protocol=resumed.protocol)
+    resumed.events.attach(new_journal)
+    assert resume_session(resumed, new_journal, "s1") == 3
+    assert resumed.protocol == "tools" and resumed.native_tools
+    assert resumed.message_history[1]["content"][0]["type"] == "tool_use"
+
+    # Switching protocols starts a new conversation, recorded after the reset
+    resumed.set_protocol("utensils")
+    new_journal.close()
+    assert read_session("s1", str(tmp_path)) == ([], "utensils")
+
+
+def test_protocol_is_inferred_for_sessions_without_a_record(tmp_path):
+    """Test that older sessions with tool blocks are recognized as native tool use."""
+    journal = SessionJournal(str(tmp_path), session_id="old", fsync=False)
+    journal.on_message({"role": "user", "content": [{"type": "tool_result", "tool_use_id": "t", "content": "ok"}]})
+    journal.on_message({"role": "user", "content": "plain"})
+    journal.close()
+    assert read_session("old", str(tmp_path))[1] == "tools"
+    assert "protocol" not in (tmp_path / "old.jsonl").read_text()
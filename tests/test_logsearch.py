@@ -0,0 +1,120 @@
+"""Tests for memory-mapped log search."""
+
+import threading
+import time
+
+import pytest
+
+from logsearch import LogFile, parse_time, parse_timestamp
+from utensils import execute_utensil, log_search
+
+
+def stamp(second):
+    return f"2024-05-01T12:{second // 60:02d}:{second % 60:02d}.000Z"
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = tmp_path / "app.log"
+    lines = []
+    for second in range(600):
+        level = "ERROR" if second % 100 == 50 else "INFO"
+        lines.append(f"{stamp(second)} {level} request {second * 7919 % 10007} took {second % 13}ms")
+        if second == 300:
+            lines += ["Traceback (most recent call last):", '  File "app.py", line 3', "KeyError: 'user'"]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def offsets(output):
+    return [int(line.split()[1][1:]) for line in output.splitlines() if line.startswith(">")]
+
+
+def test_parse_timestamp_formats():
+    assert parse_timestamp(b"2024-05-01T12:00:00Z x") == 1714564800
+    assert parse_timestamp(b"2024-05-01 14:00:00,250 +02:00 x") == 1714564800.25
+    assert parse_timestamp(b"127.0.0.1 - - [01/May/2024:12:00:00 +0000] GET /") == 1714564800
+    assert parse_timestamp(b"1714564800.5 started") == 1714564800.5
+    assert parse_timestamp(b"no time here") is None
+    assert parse_time("-90s", 1714564800.0) == 1714564710
+    assert parse_time("2024-05-01", None) == 1714521600
+    with pytest.raises(ValueError):
+        parse_time("-5m", None)
+
+
+def test_search_shows_context_with_byte_offsets(log):
+    output = log_search(str(log), "KeyError", context=1)
+    hit = offsets(output)[0]
+    assert log.read_bytes()[hit:].startswith(b"KeyError: 'user'")
+    assert "  File \"app.py\", line 3" in output
+    assert output.endswith("[1 distinct matching lines; end of range]")
+
+
+def test_similar_hits_are_folded(log):
+    output = log_search(str(log), "ERROR", context=0)
+    assert len(offsets(output)) == 1
+    assert "5 more similar lines, last at @" in output
+    assert "5 similar lines folded" in output
+
+
+def test_hit_limit_pages_forward_and_backward(log):
+    pattern = "ERROR|Traceback|File|KeyError"
+    first = log_search(str(log), pattern, max_hits=2, context=0)
+    assert len(offsets(first)) == 2
+    resume = int(first.rsplit("start_offset=", 1)[1].rstrip("]"))
+    second = log_search(str(log), pattern, start_offset=resume, max_hits=2, context=0)
+    assert offsets(second) and min(offsets(second)) >= resume
+    assert offsets(second)[0] == resume
+
+    newest = log_search(str(log), pattern, newest_first=True, max_hits=2, context=0)
+    assert stamp(550) in newest.splitlines()[1] and "KeyError" in newest
+    resume = int(newest.rsplit("end_offset=", 1)[1].rstrip("]"))
+    older = log_search(str(log), pattern, end_offset=resume, newest_first=True, max_hits=2, context=0)
+    assert older.splitlines()[0].endswith(f"-@{resume}")
+    assert '"app.py"' in older and "KeyError" not in older
+
+
+def test_time_range_bisection(log):
+    output = log_search(str(log), since=stamp(120), until=stamp(122))
+    shown = [line for line in output.splitlines() if line.startswith("  @")]
+    assert [line.split()[1] for line in shown] == [stamp(120), stamp(121), stamp(122)]
+
+    with LogFile(str(log)) as mapped:
+        assert mapped.offset_for_time(0) == 0
+        assert mapped.offset_for_time(2e9) == mapped.size
+        # The traceback belongs to the line stamped before it
+        start = mapped.offset_for_time(parse_timestamp(stamp(301).encode()))
+        assert mapped.data[start:start + 24] == stamp(301).encode()
+
+    recent = log_search(str(log), "ERROR", since="-2m", context=0)
+    assert len(offsets(recent)) == 1 and stamp(550) in recent
+
+
+def test_tail_and_follow(log):
+    tail = log_search(str(log), lines=2)
+    assert stamp(598) in tail and stamp(599) in tail and stamp(597) not in tail
+    end = int(tail.rsplit("start_offset=", 1)[1].split()[0])
+
+    def append():
+        time.sleep(0.3)
+        with open(log, "a") as f:
+            f.write(f"{stamp(600)} INFO shutting down\n")
+
+    writer = threading.Thread(target=append)
+    writer.start()
+    followed = log_search(str(log), start_offset=end, follow=5)
+    writer.join()
+    assert "shutting down" in followed
+    assert stamp(599) not in followed
+
+    log.write_text("rotated\n")
+    assert "truncated or rotated" in log_search(str(log), start_offset=end)
+
+
+def test_errors_are_reported(log, tmp_path):
+    assert execute_utensil("log_search", {"path": str(tmp_path / "missing.log")}).startswith("Error: File not found")
+    assert log_search(str(log), "[").startswith("Error: Invalid pattern")
+    assert log_search(str(log), since="yesterday") == "Error: unrecognized time 'yesterday'"
+    empty = tmp_path / "empty.log"
+    empty.write_text("")
+    assert log_search(str(empty), "x").endswith("(no lines in range)")
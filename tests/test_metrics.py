@@ -0,0 +1,69 @@
+"""Tests for the metrics registry and agent instrumentation."""
+
+import json
+
+from metrics import Histogram, Metrics
+
+
+def test_histogram_buckets_and_quantiles():
+    """Test that observations land in the right bucket and quantiles stay in range."""
+    hist = Histogram(buckets=(1, 2, 5))
+    for value in (0.5, 1.5, 1.5, 4, 10):
+        hist.observe(value)
+
+    assert hist.count == 5
+    assert hist.bucket_counts == [1, 2, 1]
+    assert hist.min == 0.5 and hist.max == 10
+    assert 1 <= hist.quantile(0.5) <= 2
+    assert hist.quantile(1.0) == 10
+
+
+def test_prometheus_export():
+    """Test the Prometheus text exposition output."""
+    metrics = Metrics()
+    metrics.describe("agent_requests_total", "API requests sent")
+    metrics.inc("agent_requests_total", labels={"model": "m"})
+    metrics.inc("agent_requests_total", labels={"model": "m"})
+    metrics.observe("agent_ttft_seconds", 0.3, {"model": "m"})
+
+    text = metrics.to_prometheus()
+    assert "# HELP agent_requests_total API requests sent" in text
+    assert 'agent_requests_total{model="m"} 2' in text
+    assert 'agent_ttft_seconds_bucket{model="m",le="0.5"} 1' in text
+    assert 'agent_ttft_seconds_bucket{model="m",le="+Inf"} 1' in text
+    assert 'agent_ttft_seconds_count{model="m"} 1' in text
+
+
+def test_otlp_export_appends_json_lines(tmp_path):
+    """Test that OTLP export appends one JSON document per call."""
+    metrics = Metrics()
+    metrics.inc("agent_requests_total")
+    metrics.observe("agent_turn_seconds", 1.2)
+
+    path = tmp_path / "metrics.jsonl"
+    metrics.export(str(path), "otlp")
+    metrics.export(str(path), "otlp")
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    payload = json.loads(lines[0])
+    names = [m["name"] for m in payload["resourceMetrics"][0]["scopeMetrics"][0]["metrics"]]
+    assert names == ["agent_requests_total", "agent_turn_seconds"]
+
+
+def test_agent_records_turn_metrics(fake_agent):
+    """Test that a turn with a utensil call records request, token and utensil metrics."""
+    agent = fake_agent([
+        "Reading.\nUTENSIL:read_file\nPARAM:file_path=/nonexistent\nEND_UTENSIL\n",
+        "Done.",
+    ])
+    agent.run_with_utensils("read it")
+
+    metrics = agent.metrics
+    assert metrics.counter_total("agent_requests_total") == 2
+    assert metrics.histogram("agent_turn_seconds").count == 1
+    assert metrics.histogram("agent_utensil_seconds", {"utensil": "read_file"}).count == 1
+    assert metrics.counter_value("agent_utensil_errors_total", {"utensil": "read_file"}) == 1
+    input_tokens = sum(v for k, v in metrics.counters["agent_tokens_total"].items() if ("type", "input") in k)
+    assert input_tokens == 20
+    assert "Time to first token" in metrics.summary()
@@ -0,0 +1,120 @@
+"""Tests for model specs and hot-reloading the model configuration."""
+
+import os
+import time
+
+import pytest
+
+from model_manager import ModelManager, ModelSpec
+
+CONFIG = """
+[model]
+name = "big"
+
+[models.big]
+display_name = "Big"
+max_tokens = 8192
+input_price = 3.0
+output_price = 15.0
+context_window = 200000
+ttft_target_ms = 2000
+
+[models.small]
+display_name = "Small"
+max_tokens = 4096
+"""
+
+
+def _write(path, text):
+    """Write the config and move its mtime forward so the change is seen even within one tick."""
+    path.write_text(text)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "config.toml"
+    _write(path, CONFIG)
+    return path
+
+
+def test_spec_exposes_model_metadata(config_path):
+    """Test the query API for context window, prices and latency target."""
+    manager = ModelManager(str(config_path))
+    spec = manager.spec()
+    assert spec == ModelSpec("big", "Big", max_tokens=8192, input_price=3.0, output_price=15.0,
+                             context_window=200000, ttft_target_ms=2000)
+    assert spec.cost(1_000_000, 100_000) == pytest.approx(4.5)
+    assert manager.spec("small").cost(10, 10) is None
+    assert manager.spec("small").context_window == 200000
+    with pytest.raises(ValueError):
+        manager.spec("missing")
+
+
+def test_hedge_threshold_starts_from_latency_target(config_path):
+    """Test that a model's ttft_target_ms is its initial hedging threshold."""
+    manager = ModelManager(str(config_path))
+    assert manager.hedge_threshold("big") == 2.0
+    assert manager.hedge_threshold("small") == 3.0
+
+
+def test_reload_swaps_config_and_notifies(config_path):
+    """Test that an edited config is swapped in and listeners are told."""
+    manager = ModelManager(str(config_path))
+    reloaded = []
+    manager.on_reload(lambda m: reloaded.append(m.current_model))
+    assert not manager.reload_if_changed()
+
+    _write(config_path, CONFIG.replace('name = "big"', 'name = "small"').replace("2000", "1500"))
+    assert manager.reload_if_changed()
+    assert manager.current_model == "small"
+    assert manager.spec("big").ttft_target_ms == 1500
+    assert reloaded == ["small"]
+
+
+def test_pinned_model_survives_reload(config_path):
+    """Test that a /model choice is kept while the model still exists."""
+    manager = ModelManager(str(config_path))
+    manager.switch_model("small")
+    _write(config_path, CONFIG + "\n# edited\n")
+    assert manager.reload_if_changed()
+    assert manager.current_model == "small" and manager.pinned
+
+
+def test_invalid_config_keeps_old_one(config_path):
+    """Test that a broken or half-written file is ignored."""
+    manager = ModelManager(str(config_path))
+    before = manager.config
+    _write(config_path, "[model\nname = ")
+    assert not manager.reload_if_changed()
+    _write(config_path, "[other]\nx = 1\n")
+    assert not manager.reload_if_changed()
+    assert manager.config is before
+
+
+def test_watcher_reloads_in_background(config_path):
+    """Test that the watcher thread picks up changes on its own."""
+    manager = ModelManager(str(config_path))
+    manager.watch(interval=0.01)
+    try:
+        _write(config_path, CONFIG.replace('name = "big"', 'name = "small"'))
+        deadline = time.monotonic() + 2
+        while manager.current_model != "small" and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert manager.current_model == "small"
+    finally:
+        manager.stop_watching()
+
+
+def test_agent_follows_reload(fake_agent):
+    """Test that the agent updates its model and system prompt after a reload."""
+    agent = fake_agent([])
+    events = []
+    agent.events.subscribe("on_config_reload", lambda model: events.append(model))
+    prompt = agent.system_prompt
+    agent.model_manager.current_model = "claude-haiku-4-5-20251001"
+    agent._on_config_reload(agent.model_manager)
+    assert agent.model == "claude-haiku-4-5-20251001"
+    assert agent.system_prompt != prompt
+    assert events == ["claude-haiku-4-5-20251001"]
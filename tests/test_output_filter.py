@@ -0,0 +1,112 @@
+"""Tests for normalizing and compressing utensil output."""
+
+from edits import format_call
+from output_filter import OutputCompressor, OutputPolicy, compressing
+
+
+def test_strips_escape_codes_and_carriage_return_overwrites():
+    text = "\x1b[1;32mPASSED\x1b[0m \x1b]0;title\x07tests\n" + "".join(f"\r{i}% [{'#' * (i // 10)}]" for i in range(101)) + "\r\n"
+    assert OutputCompressor().compress(text) == "PASSED tests\n100% [##########]"
+
+
+def test_folds_identical_and_near_duplicate_runs():
+    text = "start\n" + "same warning line\n" * 500 + "".join(f"Downloading pkg-{i}.tar.gz ({i * 3} kB)\n" for i in range(40))
+    compressor = OutputCompressor()
+    output = compressor.compress(text)
+    lines = output.splitlines()
+    assert lines[:-1] == [
+        "start",
+        "same warning line",
+        "[previous line repeated 499 more times]",
+        "Downloading pkg-0.tar.gz (0 kB)",
+        "[... 38 similar lines ...]",
+        "Downloading pkg-39.tar.gz (117 kB)",
+    ]
+    assert lines[-1].startswith(f"[output compressed from {compressor.input_bytes} to ")
+    assert compressor.saved_bytes > 0.9 * len(text)
+
+
+def test_drops_interleaved_repeats_after_limit():
+    text = "".join(f"test_{i} ok\nDeprecationWarning: old api\n" for i in ["a", "b", "c", "d", "e"])
+    output = OutputCompressor(max_repeats=2).compress(text)
+    assert output.count("DeprecationWarning") == 2
+    assert "test_e ok" in output
+    assert "[3 more repeats of lines shown above omitted]" in output
+
+
+def test_budget_keeps_head_and_tail():
+    text = "".join(f"line {i}\n" for i in range(100000))
+    compressor = OutputCompressor(budget=1000, fold=False)
+    output = compressor.compress(text)
+    assert output.startswith("line 0\nline 1\n")
+    assert "line 99999\n[output compressed" in output
+    assert "lines (" in output and "omitted ...]" in output
+    assert len(output) < 1200
+
+
+def test_streaming_chunks_match_whole_input():
+    text = "\x1b[31merror\x1b[0m: a\rb\n" + "x" * 5000 + "\n" + "repeat me please\n" * 20
+    whole = OutputCompressor(max_line_chars=100).compress(text)
+    chunks = [text[i:i + 3] for i in range(0, len(text), 3)]
+    assert OutputCompressor(max_line_chars=100).compress_stream(chunks) == whole
+    assert "x" * 100 + " [line truncated]" in whole
+
+
+def test_small_clean_output_is_unchanged():
+    compressor = OutputCompressor(budget=1000)
+    assert compressor.compress("a\nb\n\nc") == "a\nb\n\nc"
+    assert compressor.removed_lines == 0
+
+
+def test_policy_only_applies_to_configured_utensils():
+    policy = OutputPolicy.from_config({"budgets": {"execute_command": 100}, "fold": ["validate_python"]})
+    assert policy.compressor("read_file") is None
+    assert policy.compressor("execute_command").budget == 100
+    assert not policy.compressor("execute_command").fold
+    assert policy.compressor("validate_python").fold
+    assert OutputPolicy.from_config({"compress": False}) is None
+
+
+def test_agent_compresses_command_output(fake_agent):
+    call = format_call("execute_command", {"command": "for i in $(seq 300); do echo 'same line here'; done"})
+    agent = fake_agent([call, "Done."])
+    ends = []
+    agent.events.subscribe("on_utensil_end", lambda **kw: ends.append(kw))
+    agent.run_with_utensils("run it")
+
+    result = agent.message_history[2]["content"][0]["text"]
+    assert result.count("same line here") == 1
+    assert "[previous line repeated 299 more times]" in result
+    assert ends[0]["saved_bytes"] > 4000
+    assert agent.metrics.counter_total("agent_utensil_output_saved_bytes_total") == ends[0]["saved_bytes"]
+    assert "# HELP agent_utensil_output_saved_bytes_total" in agent.metrics.to_prometheus()
+
+
+def test_command_output_is_compressed_while_it_streams(monkeypatch):
+    import utensils
+
+    kept = []
+    compressor = OutputCompressor(budget=2000, fold=False)
+    original_feed = compressor.feed
+
+    def feed(text):
+        original_feed(text)
+        kept.append(compressor._head_chars + compressor._tail_chars)
+
+    monkeypatch.setattr(compressor, "feed", feed)
+    with compressing(compressor):
+        result = utensils.execute_command("seq 1 300000; echo oops >&2")
+
+    # About 2 MB went through, but never more than the budget was held
+    assert compressor.input_bytes > 1_900_000
+    assert len(kept) > 10 and max(kept) <= 2000
+    assert result.startswith("1\n2\n3\n") and "lines" in result and "omitted" in result
+    assert "300000\n\nSTDERR:\noops" in result
+
+
+def test_command_timeout_kills_the_process(monkeypatch):
+    import utensils
+
+    monkeypatch.setattr(utensils, "COMMAND_TIMEOUT", 0.3)
+    with compressing(OutputCompressor(budget=100)):
+        assert utensils.execute_command("echo started; sleep 5") == "Error: Command timed out after 0.3 seconds"
@@ -0,0 +1,161 @@
+"""Tests for the apply_patch utensil and unified diff application."""
+
+import os
+
+import pytest
+
+from history import elide_stale_results, result_block
+from patch import PatchError, apply_patch_text, parse_patch
+from utensils import apply_patch
+
+ORIGINAL = "".join(f"line {i}\n" for i in range(1, 31))
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.txt").write_text(ORIGINAL)
+    (tmp_path / "b.py").write_text("def f():\n    return 1\n")
+    return tmp_path
+
+
+MULTI = """--- a/a.txt
++++ b/a.txt
+@@ -2,3 +2,3 @@
+ line 2
+-line 3
++LINE THREE
+ line 4
+@@ -20,3 +20,4 @@
+ line 20
+ line 21
++inserted
+ line 22
+--- a/b.py
++++ b/b.py
+@@ -1,2 +1,2 @@
+ def f():
+-    return 1
++    return 2
+"""
+
+
+def test_multi_file_multi_hunk(workdir):
+    """Test a patch touching two files with several hunks."""
+    result = apply_patch(MULTI)
+    assert result.startswith("Successfully applied patch")
+    text = (workdir / "a.txt").read_text()
+    assert "LINE THREE\n" in text and "line 3\n" not in text
+    assert "line 21\ninserted\nline 22\n" in text
+    assert (workdir / "b.py").read_text() == "def f():\n    return 2\n"
+
+
+def test_wrong_line_numbers_and_whitespace_are_tolerated(workdir):
+    """Test that hunks are found away from their header line and despite whitespace drift."""
+    patch = """--- a/b.py
++++ b/b.py
+@@ -40,2 +40,2 @@
+ def f():
+-  return 1
++    return 3
+"""
+    result = apply_patch(patch)
+    assert "Successfully" in result
+    assert "whitespace ignored" in result and "header said 40" in result
+    assert (workdir / "b.py").read_text() == "def f():\n    return 3\n"
+
+
+def test_fuzz_drops_mismatched_context(workdir):
+    """Test that stale edge context is accepted within the fuzz tolerance only."""
+    patch = """--- a/a.txt
++++ b/a.txt
+@@ -9,3 +9,3 @@
+ stale context
+-line 10
++line ten
+ line 11
+"""
+    assert apply_patch(patch, fuzz="0").startswith("Error")
+    assert "fuzz 1" in apply_patch(patch, fuzz="1")
+    assert "line ten\nline 11\n" in (workdir / "a.txt").read_text()
+
+
+def test_zero_context_insertions_follow_their_line(workdir):
+    """Test that "-N,0" hunks, as diff -U0 writes them, insert after line N."""
+    patch = """--- a/a.txt
++++ b/a.txt
+@@ -5,0 +6 @@
++middle
+@@ -30,0 +32,2 @@
++end 1
++end 2
+"""
+    assert apply_patch(patch).startswith("Successfully applied patch")
+    lines = (workdir / "a.txt").read_text().splitlines()
+    assert lines[3:7] == ["line 4", "line 5", "middle", "line 6"]
+    assert lines[-3:] == ["line 30", "end 1", "end 2"]
+
+
+def test_failing_hunk_changes_nothing(workdir):
+    """Test that one bad hunk leaves every file untouched."""
+    bad = MULTI.replace(" line 21\n", " no such line\n").replace(" line 20\n", " nor this\n")
+    result = apply_patch(bad, fuzz="0")
+    assert result.startswith("Error: Patch not applied")
+    assert "hunk 2" in result
+    assert (workdir / "a.txt").read_text() == ORIGINAL
+    assert (workdir / "b.py").read_text() == "def f():\n    return 1\n"
+
+
+def test_create_and_delete_files(workdir):
+    """Test /dev/null headers for new and removed files."""
+    patch = """--- /dev/null
++++ b/pkg/new.py
+@@ -0,0 +1,2 @@
++x = 1
++y = 2
+--- a/b.py
++++ /dev/null
+@@ -1,2 +0,0 @@
+-def f():
+-    return 1
+"""
+    result = apply_patch(patch)
+    assert "created pkg/new.py" in result and "deleted b.py" in result
+    assert (workdir / "pkg" / "new.py").read_text() == "x = 1\ny = 2\n"
+    assert not (workdir / "b.py").exists()
+
+
+def test_writes_are_atomic_and_keep_mode(workdir):
+    """Test that the file is replaced, not rewritten in place, and keeps its permissions."""
+    path = workdir / "b.py"
+    os.chmod(path, 0o755)
+    inode = os.stat(path).st_ino
+    apply_patch(MULTI)
+    assert os.stat(path).st_mode & 0o777 == 0o755
+    assert os.stat(path).st_ino != inode
+    assert not [p for p in os.listdir(workdir) if p.startswith(".patch-")]
+
+
+def test_parse_errors():
+    """Test that text without file headers is rejected."""
+    with pytest.raises(PatchError):
+        parse_patch("just some text")
+    with pytest.raises(PatchError):
+        apply_patch_text("--- a/x\n+++ b/x\n")
+    assert apply_patch("nonsense").startswith("Error: Patch not applied")
+    assert apply_patch(MULTI, fuzz="lots").startswith("Error")
+
+
+def test_patch_supersedes_earlier_reads():
+    """Test that stale-result elision sees the files an apply_patch call changed."""
+    read = "UTENSIL:read_file\nPARAM:file_path=a.txt\nEND_UTENSIL"
+    patch_call = "UTENSIL:apply_patch\nPARAM:patch=BEGIN_VALUE\n" + MULTI + "END_VALUE\nEND_UTENSIL"
+    history = [
+        {"role": "user", "content": "go"},
+        {"role": "assistant", "content": read},
+        {"role": "user", "content": [result_block("read_file", "x" * 500)]},
+        {"role": "assistant", "content": patch_call},
+        {"role": "user", "content": [result_block("apply_patch", "Successfully applied patch")]},
+    ]
+    elided = elide_stale_results(history, max_age_turns=0)
+    assert "x" * 500 not in elided[2]["content"][0]["text"]
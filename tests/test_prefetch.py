@@ -0,0 +1,73 @@
+"""Tests for speculative prefetch of read-only utensils."""
+
+import os
+
+from prefetch import Prefetcher
+from streaming_parser import StreamingUtensilParser
+from utensils import execute_utensil
+
+
+class CountingExecute:
+    """Wraps execute_utensil and counts calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, name, params):
+        self.calls.append(name)
+        return execute_utensil(name, params)
+
+
+def test_parser_starts_prefetch_before_end_utensil(tmp_path):
+    """Test that the read starts as soon as the file_path line is parsed."""
+    path = tmp_path / "a.txt"
+    path.write_text("hello")
+    execute = CountingExecute()
+    prefetcher = Prefetcher(execute)
+    parser = StreamingUtensilParser(on_param=prefetcher.on_param)
+
+    parser.add_token(f"UTENSIL:read_file\nPARAM:file_path={path}\n")
+    assert not parser.has_utensil_call()
+
+    assert prefetcher.take("read_file", {"file_path": str(path)}) == "hello"
+    assert execute.calls == ["read_file"]
+
+
+def test_changed_file_is_a_miss(tmp_path):
+    """Test that a prefetched read is not used after the file changes."""
+    path = tmp_path / "a.txt"
+    path.write_text("old")
+    prefetcher = Prefetcher(CountingExecute())
+    prefetcher.on_param("read_file", {"file_path": str(path)})
+    prefetcher.executor.shutdown(wait=True)
+
+    path.write_text("new contents")
+    os.utime(path, ns=(1, 1))
+    assert prefetcher.take("read_file", {"file_path": str(path)}) is None
+
+
+def test_mutating_and_unknown_utensils_not_prefetched(tmp_path):
+    """Test that only read-only utensils are prefetched and invalidate drops results."""
+    execute = CountingExecute()
+    prefetcher = Prefetcher(execute)
+    prefetcher.on_param("write_file", {"file_path": str(tmp_path / "x")})
+    prefetcher.on_param("read_file", {"file_path": str(tmp_path / "y")})
+    prefetcher.invalidate()
+    prefetcher.executor.shutdown(wait=True)
+
+    assert "write_file" not in execute.calls
+    assert prefetcher.take("read_file", {"file_path": str(tmp_path / "y")}) is None
+
+
+def test_agent_uses_prefetched_read(fake_agent, tmp_path):
+    """Test that the agent serves a read_file call from the prefetch."""
+    path = tmp_path / "a.txt"
+    path.write_text("prefetched contents")
+    agent = fake_agent([
+        f"UTENSIL:read_file\nPARAM:file_path={path}\nEND_UTENSIL\n",
+        "Done.",
+    ])
+    agent.run_with_utensils("read it")
+
+    assert agent.metrics.counter_total("agent_prefetch_hits_total") == 1
+    assert "prefetched contents" in agent.message_history[2]["content"][0]["text"]
@@ -0,0 +1,30 @@
+"""Tests for per-turn profiling."""
+
+from profiling import TurnProfiler
+
+
+def test_turn_writes_profile_and_allocation_report(fake_agent, tmp_path):
+    """Test that a profiled turn writes its .prof and allocation report."""
+    agent = fake_agent([
+        "UTENSIL:read_file\nPARAM:file_path=/nonexistent\nEND_UTENSIL\n",
+        "Done.",
+    ])
+    profiler = TurnProfiler(str(tmp_path / "profiles"))
+
+    with profiler.turn(agent):
+        agent.run_with_utensils("read it")
+
+    assert (tmp_path / "profiles" / "turn-001.prof").exists()
+    report = (tmp_path / "profiles" / "turn-001-alloc.txt").read_text()
+    assert "message_history: +3 messages" in report
+    assert "Parser buffers:" in report
+
+    summary = profiler.summary()
+    assert "Profiled 1 turn(s)" in summary
+    assert "agent.py" in summary
+
+
+def test_summary_without_turns(tmp_path):
+    """Test the summary when nothing was profiled."""
+    profiler = TurnProfiler(str(tmp_path))
+    assert profiler.summary() == "No turns were profiled."
@@ -0,0 +1,73 @@
+"""Tests for the run_python worker pool."""
+
+import os
+import sys
+import time
+
+import pytest
+
+from pyworkers import PythonPool
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+
+
+@pytest.fixture
+def pool(tmp_path):
+    (tmp_path / "helper.py").write_text("VALUE = 1\n")
+    pool = PythonPool(size=1, max_calls=3, timeout=5, memory_mb=512, preload=["json"], root=str(tmp_path))
+    yield pool
+    pool.close()
+
+
+def test_runs_code_with_captured_output_and_final_expression(pool):
+    response = pool.run("import sys, os\nprint('out')\nsys.stderr.write('err\\n')\nos.system('echo shell')\n6 * 7")
+    assert response["output"] == "out\nerr\nshell\n42\n"
+    assert response["error"] is None
+
+
+def test_namespace_is_fresh_but_project_is_importable(pool):
+    assert pool.run("x = 5")["error"] is None
+    assert "NameError" in pool.run("x")["error"]
+    assert pool.run("import helper\nhelper.VALUE")["output"] == "1\n"
+
+
+def test_worker_is_reused_then_recycled_after_max_calls(pool):
+    pool.start()
+    pids = [pool.run("import os\nos.getpid()")["output"] for _ in range(4)]
+    assert pids[0] == pids[1] == pids[2]
+    assert pids[3] != pids[0]
+
+
+def test_edit_to_imported_module_recycles_worker(pool, tmp_path):
+    assert pool.run("import helper\nhelper.VALUE")["output"] == "1\n"
+    (tmp_path / "helper.py").write_text("VALUE = 2\n")
+    os.utime(tmp_path / "helper.py", ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert pool.run("import helper\nhelper.VALUE")["output"] == "2\n"
+
+
+def test_timeout_kills_worker(pool):
+    with pytest.raises(TimeoutError):
+        pool.run("while True: pass", timeout=0.3)
+    assert pool.run("'alive'")["output"] == "'alive'\n"
+
+
+def test_memory_limit(pool):
+    response = pool.run("block = bytearray(2 * 1024 ** 3)")
+    assert response["error"].rstrip().endswith("MemoryError")
+    assert pool.run("1")["output"] == "1\n"
+
+
+def test_run_python_utensil(monkeypatch, tmp_path):
+    import pyworkers
+    from utensils import execute_utensil
+
+    monkeypatch.chdir(tmp_path)
+    pyworkers.reset_pool()
+    try:
+        assert execute_utensil("run_python", {"code": "print('hi')\nsum(range(4))"}) == "hi\n6"
+        assert execute_utensil("run_python", {"code": "1/0"}).endswith("ZeroDivisionError: division by zero")
+        assert execute_utensil("run_python", {"code": "import time\ntime.sleep(5)", "timeout": "0.2"}) == \
+            "Error: run_python timed out after 0.2 seconds; the worker was killed"
+        assert execute_utensil("run_python", {"code": "x = 1"}) == "(no output)"
+    finally:
+        pyworkers.reset_pool()
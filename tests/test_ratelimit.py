@@ -0,0 +1,159 @@
+"""Tests for the client-side rate-limit scheduler."""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import ratelimit
+from ratelimit import Priority, RateLimiter, TokenBucket, estimate_input_tokens
+from tests.conftest import FakeClient, FakeStream
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _headers(family, limit, remaining):
+    prefix = f"anthropic-ratelimit-{family}-"
+    return {prefix + "limit": str(limit), prefix + "remaining": str(remaining)}
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter():
+    ratelimit.reset_rate_limiter()
+    yield
+    ratelimit.reset_rate_limiter()
+
+
+def test_bucket_refills_over_time():
+    """Test that an emptied bucket refills at capacity per minute."""
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock=clock)
+    bucket.take(60)
+    assert bucket.wait_time(30) == pytest.approx(30.0)
+    clock.now += 10
+    assert bucket.wait_time(30) == pytest.approx(20.0)
+    clock.now += 120
+    assert bucket.wait_time(60) == 0.0
+
+
+def test_unknown_limits_never_block():
+    """Test that models without configured or learned limits are not throttled."""
+    limiter = RateLimiter()
+    for _ in range(100):
+        assert limiter.acquire("m", 100000).waited < 0.5
+
+
+def test_headers_replace_limits():
+    """Test that rate-limit headers set each bucket's capacity and level."""
+    clock = FakeClock()
+    limiter = RateLimiter(clock=clock)
+    headers = {**_headers("requests", 50, 0), **_headers("input-tokens", 30000, 12000)}
+    reservation = limiter.acquire("m", 100)
+    limiter.observe("m", headers, reservation)
+
+    budget = limiter.budget("m")
+    assert budget.buckets["requests"].capacity == 50
+    assert budget.buckets["input_tokens"].level == 12000
+    assert budget.buckets["requests"].wait_time(1) == pytest.approx(60 / 50)
+    assert reservation.synced
+
+
+def test_settle_corrects_estimates_without_headers():
+    """Test that actual usage replaces the reserved estimate."""
+    clock = FakeClock()
+    limiter = RateLimiter({"input_tokens_per_minute": 1000, "output_tokens_per_minute": 1000}, clock=clock)
+    reservation = limiter.acquire("m", 100, 100)
+    limiter.settle(reservation, SimpleNamespace(input_tokens=300, output_tokens=50,
+                                                cache_creation_input_tokens=0))
+    buckets = limiter.budget("m").buckets
+    assert buckets["input_tokens"].level == pytest.approx(700)
+    assert buckets["output_tokens"].level == pytest.approx(950)
+
+
+def test_waiters_are_served_by_priority():
+    """Test that an interactive request jumps ahead of waiting bulk and compaction work."""
+    clock = FakeClock()
+    limiter = RateLimiter({"requests_per_minute": 1}, clock=clock)
+    limiter.acquire("m", 1)
+    order = []
+
+    def worker(priority):
+        limiter.acquire("m", 1, 1, priority)
+        order.append(priority)
+
+    threads = []
+    for priority in (Priority.BULK, Priority.COMPACTION, Priority.INTERACTIVE):
+        thread = threading.Thread(target=worker, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.05)
+
+    # Release one request at a time via the server's headers
+    for expected in range(1, 4):
+        limiter.observe("m", _headers("requests", 1, 1))
+        deadline = time.monotonic() + 2
+        while len(order) < expected and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    for thread in threads:
+        thread.join(timeout=2)
+    assert order == [Priority.INTERACTIVE, Priority.COMPACTION, Priority.BULK]
+
+
+def test_try_acquire_never_waits_or_jumps_the_queue():
+    """Test that speculative requests are reserved only when capacity is free and nobody is waiting."""
+    clock = FakeClock()
+    limiter = RateLimiter({"requests_per_minute": 2}, clock=clock)
+    assert limiter.try_acquire("m", 1).priority == Priority.BULK
+    assert limiter.try_acquire("m", 1) is not None
+    assert limiter.try_acquire("m", 1) is None
+    clock.now += 30
+    limiter._waiting.append((Priority.INTERACTIVE, -1, "m"))
+    assert limiter.try_acquire("m", 1) is None
+    limiter._waiting.clear()
+    assert limiter.try_acquire("m", 1) is not None
+    assert limiter.try_acquire("other", 1) is not None
+
+
+def test_release_returns_reserved_output_tokens():
+    """Test that a cancelled request gives back its output tokens but still counts as a request."""
+    clock = FakeClock()
+    limiter = RateLimiter({"requests_per_minute": 10, "output_tokens_per_minute": 1000}, clock=clock)
+    reservation = limiter.acquire("m", 1, 400)
+    limiter.release(reservation)
+    buckets = limiter.budget("m").buckets
+    assert buckets["output_tokens"].level == pytest.approx(1000)
+    assert buckets["requests"].level == pytest.approx(9)
+
+
+def test_estimate_input_tokens():
+    """Test the rough character-based input estimate."""
+    request = {"system": "x" * 400, "messages": [{"role": "user", "content": "y" * 400}]}
+    assert estimate_input_tokens(request) == 201
+
+
+def test_agent_learns_from_response_headers(fake_agent):
+    """Test that the agent's requests feed response headers into the shared limiter."""
+    class HeaderStream(FakeStream):
+        response = SimpleNamespace(headers=_headers("output-tokens", 8000, 7000))
+
+    class HeaderClient(FakeClient):
+        def stream(self, **kwargs):
+            self.requests.append(kwargs)
+            return HeaderStream(self.responses.pop(0))
+
+    agent = fake_agent([])
+    agent.client = HeaderClient(["Done."])
+    agent.run_with_utensils("hi")
+
+    assert agent.rate_limiter is ratelimit.get_rate_limiter()
+    bucket = agent.rate_limiter.budget(agent.model).buckets["output_tokens"]
+    assert bucket.capacity == 8000
+    assert bucket.level <= 7000
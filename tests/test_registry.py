@@ -0,0 +1,124 @@
+"""Tests for the declarative utensil registry."""
+
+import sys
+from importlib import metadata
+
+import pytest
+
+from prefetch import Prefetcher
+from registry import PARALLEL, Param, Utensil, UtensilArgumentError, UtensilRegistry
+from utensils import REGISTRY, UTENSIL_FUNCTIONS, execute_utensil, get_utensils_system_prompt, read_file
+
+PLUGIN = '''
+from registry import Param, Utensil
+
+LOADED = True
+
+def shout(text, times):
+    return (text.upper() + "!") * times
+
+shout_utensil = Utensil("shout", shout, "Shout some text", (Param("text"), Param("times", int, default=1)))
+'''
+
+
+@pytest.fixture
+def plugin_module(tmp_path, monkeypatch):
+    (tmp_path / "shout_plugin.py").write_text(PLUGIN)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "shout_plugin"
+    sys.modules.pop("shout_plugin", None)
+
+
+def echo(text, count=1, loud=False):
+    return (text.upper() if loud else text) * count
+
+
+def make_registry():
+    registry = UtensilRegistry(entry_point_group=None)
+    registry.register(Utensil("echo", echo, "Echo text", (
+        Param("text", multiline=True),
+        Param("count", int, default=1),
+        Param("loud", bool, description="uppercase it", default=False),
+    )))
+    return registry
+
+
+def test_parameters_are_converted_and_defaulted():
+    registry = make_registry()
+    assert registry.execute("echo", {"text": "ab"}) == "ab"
+    assert registry.execute("echo", {"text": "ab", "count": " 3 ", "loud": "yes"}) == "ABABAB"
+
+
+def test_invalid_arguments_are_reported():
+    registry = make_registry()
+    assert "count must be an integer, got 'many'" in registry.execute("echo", {"text": "a", "count": "many"})
+    assert "missing required parameter text" in registry.execute("echo", {})
+    assert "unknown parameter(s) colour" in registry.execute("echo", {"text": "a", "colour": "red"})
+    assert registry.execute("nope", {}) == "Error: Unknown utensil 'nope'"
+    with pytest.raises(UtensilArgumentError):
+        registry["echo"].bind({"loud": "maybe", "text": "a"})
+
+
+def test_prompt_section_is_generated_and_cached():
+    registry = make_registry()
+    section = registry.prompt_section()
+    assert section == ("- echo: Echo text. Parameters: text (multi-line); count (an integer, optional, default 1); "
+                       "loud (true/false, optional, default False): uppercase it")
+    assert registry.prompt_section() is section
+    registry.register(Utensil("noop", lambda: "", "Do nothing"))
+    assert registry.prompt_section().endswith("- noop: Do nothing. Parameters: none")
+
+
+def test_plugin_is_imported_on_first_use(plugin_module):
+    registry = make_registry()
+    registry.add_plugin("shout", f"{plugin_module}:shout_utensil")
+    assert plugin_module not in sys.modules
+    assert registry.execute("shout", {"text": "hi", "times": "2"}) == "HI!HI!"
+    assert sys.modules[plugin_module].LOADED
+
+
+def test_entry_point_plugins_are_discovered_lazily(plugin_module, monkeypatch):
+    scans = []
+
+    def entry_points(group):
+        scans.append(group)
+        return [metadata.EntryPoint("yell", f"{plugin_module}:shout_utensil", group)]
+
+    monkeypatch.setattr(metadata, "entry_points", entry_points)
+    registry = UtensilRegistry()
+    assert scans == []
+    assert "- yell: Shout some text" in registry.prompt_section()
+    assert registry["yell"].name == "yell"
+    assert scans == ["agencia.utensils"]
+
+
+def test_broken_plugin_is_skipped():
+    registry = make_registry()
+    registry.add_plugin("ghost", "no_such_module_here:thing")
+    assert registry.get("ghost") is None
+    assert list(registry) == ["echo"]
+
+
+def test_prefetch_uses_registry_metadata(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("hello")
+    registry = UtensilRegistry(entry_point_group=None)
+    registry.register(Utensil("peek", read_file, "Read", (Param("file_path"),),
+                              read_only=True, concurrency=PARALLEL, path_param="file_path"))
+    registry.register(Utensil("poke", read_file, "Not read-only", (Param("file_path"),), path_param="file_path"))
+    calls = []
+    prefetcher = Prefetcher(lambda name, params: calls.append(name) or "hello", lookup=registry.get)
+    prefetcher.on_param("poke", {"file_path": str(path)})
+    prefetcher.on_param("peek", {"file_path": str(path)})
+    assert prefetcher.take("peek", {"file_path": str(path)}) == "hello"
+    assert calls == ["peek"]
+
+
+def test_builtins_keep_their_interfaces():
+    assert UTENSIL_FUNCTIONS["read_file"] is read_file
+    assert set(UTENSIL_FUNCTIONS) == set(REGISTRY)
+    assert REGISTRY["apply_patch"].touched_paths({"patch": "--- a/x.py\n+++ b/x.py\n@@ -1 +1 @@\n-a\n+b\n"}) == ["x.py"]
+    assert not REGISTRY["execute_command"].read_only
+    assert "- read_file: Read file contents. Parameters: file_path" in get_utensils_system_prompt()
+    assert execute_utensil("apply_patch", {"patch": "x", "fuzz": "lots"}).startswith(
+        "Error: Invalid arguments for utensil 'apply_patch': fuzz must be an integer")
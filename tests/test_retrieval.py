@@ -0,0 +1,107 @@
+"""Tests for the BM25 workspace index and the retrieve utensil."""
+
+import os
+
+import pytest
+
+import retrieval
+from retrieval import BM25Index, chunk_lines, tokenize
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    (tmp_path / "bucket.py").write_text(
+        "class TokenBucket:\n    def take(self, tokens):\n        self.level -= tokens\n")
+    (tmp_path / "parser.py").write_text("def parse_header(line):\n    return line.split(':')\n")
+    (tmp_path / "notes.md").write_text("Shopping list: eggs, flour, milk.\n")
+    (tmp_path / "image.bin").write_bytes(b"\0\1\2bucket")
+    return tmp_path
+
+
+def index_for(root):
+    return BM25Index(str(root), directory=str(root / ".agent" / "index"))
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("applyPatch apply_patch_text the") == [
+        "applypatch", "apply", "patch", "apply_patch_text", "apply", "patch", "text"]
+
+
+def test_chunks_break_before_top_level_definitions():
+    lines = ["import os", "", "def a():", "    pass", "", "def b():", "    pass"]
+    assert chunk_lines(lines, 4) == [(0, 2), (2, 5), (5, 7)]
+    assert chunk_lines(["x"] * 5, 2) == [(0, 2), (2, 4), (4, 5)]
+
+
+def test_search_ranks_relevant_chunk_first(workspace):
+    index = index_for(workspace)
+    assert index.update() == 4
+    results = index.search("token bucket take", top_k=3)
+    assert results[0][0].path == "bucket.py"
+    assert all(chunk.path != "image.bin" for chunk, _ in results)
+    assert index.search("zebra") == []
+
+
+def test_update_reindexes_only_changed_files(workspace, monkeypatch):
+    index = index_for(workspace)
+    index.update()
+    indexed = []
+    original = BM25Index._index_file
+    monkeypatch.setattr(BM25Index, "_index_file", lambda self, path, text: indexed.append(path) or original(self, path, text))
+
+    assert index.update() == 0
+    (workspace / "notes.md").write_text("Remember to refill the token bucket.\n")
+    os.utime(workspace / "notes.md", ns=(1, 1))
+    (workspace / "parser.py").unlink()
+    assert index.update() == 2
+    assert indexed == ["notes.md"]
+    assert {chunk.path for chunk, _ in index.search("bucket", 5)} == {"bucket.py", "notes.md"}
+
+
+def test_index_persists_across_instances(workspace, monkeypatch):
+    first = index_for(workspace)
+    first.update()
+    expected = first.search("parse header", 2)
+
+    second = index_for(workspace)
+    monkeypatch.setattr(BM25Index, "_index_file", lambda *args: pytest.fail("reloaded index re-tokenized a file"))
+    assert second.update() == 0
+    assert second.search("parse header", 2) == expected
+
+
+def test_python_fallback_matches_numpy(workspace, monkeypatch):
+    pytest.importorskip("numpy")
+    index = index_for(workspace)
+    index.update()
+    vectorized = index.search("token bucket line", 5)
+    monkeypatch.setattr(retrieval, "_np", None)
+    index._postings = None
+    fallback = index.search("token bucket line", 5)
+    assert [c for c, _ in fallback] == [c for c, _ in vectorized]
+    assert [round(s, 6) for _, s in fallback] == [round(s, 6) for _, s in vectorized]
+
+
+def test_retrieve_utensil_formats_excerpts(workspace, monkeypatch):
+    from utensils import retrieve
+
+    monkeypatch.chdir(workspace)
+    monkeypatch.setattr(retrieval, "_indexes", {})
+    output = retrieve("parse header")
+    assert output.startswith("--- parser.py:1-2 (score ")
+    assert "    1  def parse_header(line):" in output
+    assert retrieve("zebra") == "No matches for 'zebra'"
+
+
+def test_first_turn_gets_retrieved_context(fake_agent, workspace, monkeypatch):
+    agent = fake_agent(["Done.", "Done again."])
+    agent.retrieval_config = {"attach_on_first_turn": True, "attach_min_score": 0.1}
+    monkeypatch.chdir(workspace)
+    monkeypatch.setattr(retrieval, "_indexes", {})
+
+    agent.run_with_utensils("Why does TokenBucket take go negative?")
+    first = agent.message_history[0]["content"]
+    assert first.startswith("Why does TokenBucket take go negative?\n\n[Workspace excerpts")
+    assert "--- bucket.py:1-3" in first
+
+    agent.run_with_utensils("And the parser?")
+    assert agent.message_history[-1]["content"] == "And the parser?"
@@ -0,0 +1,138 @@
+"""Tests for retrying transient API errors and resuming broken streams."""
+
+import importlib
+
+import anthropic
+import pytest
+
+import retry
+from retry import RetryPolicy, is_transient, retry_after
+from tests.fault_server import FaultServer
+
+# The httpx build the SDK was installed with, as in client._build_client
+httpx = importlib.import_module(type(anthropic.DEFAULT_CONNECTION_LIMITS).__module__.split(".")[0])
+
+UTENSIL_RESPONSE = """Let me read it.
+
+UTENSIL: read_file
+PARAM: file_path=notes.txt
+END_UTENSIL
+"""
+
+
+def _status_error(code, headers=None):
+    request = httpx.Request("POST", "http://test/v1/messages")
+    response = httpx.Response(code, headers=headers or {}, request=request)
+    return anthropic.APIStatusError("error", response=response, body=None)
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(retry.time, "sleep", sleeps.append)
+    import agent
+    monkeypatch.setattr(agent.time, "sleep", sleeps.append)
+    return sleeps
+
+
+@pytest.fixture
+def server_agent(monkeypatch):
+    """Build an Agent whose real SDK client talks to a FaultServer."""
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    from agent import Agent
+
+    def build(server):
+        agent = Agent()
+        agent.client = anthropic.Anthropic(api_key="test-key", base_url=server.base_url, max_retries=0)
+        agent.router.enabled = False
+        return agent
+
+    return build
+
+
+def test_transient_errors():
+    """Test which errors are considered worth retrying."""
+    assert is_transient(_status_error(529))
+    assert is_transient(_status_error(429))
+    assert not is_transient(_status_error(400))
+    assert is_transient(httpx.RemoteProtocolError("peer closed connection"))
+    assert not is_transient(ValueError("bad"))
+
+
+def test_retry_after_headers():
+    """Test that retry-after-ms and retry-after seconds are both understood."""
+    assert retry_after(_status_error(529, {"retry-after-ms": "1500"})) == 1.5
+    assert retry_after(_status_error(529, {"retry-after": "3"})) == 3.0
+    assert retry_after(_status_error(529)) is None
+
+
+def test_delay_is_capped_and_honors_retry_after():
+    """Test full-jitter backoff bounds and the server-requested delay."""
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0, max_retry_after=10.0)
+    for attempt in range(6):
+        assert 0 <= policy.delay(attempt) <= min(4.0, 2 ** attempt)
+    assert policy.delay(0, _status_error(529, {"retry-after": "2"})) == 2.0
+    assert policy.delay(0, _status_error(529, {"retry-after": "600"})) == 10.0
+
+
+def test_call_retries_until_success(no_sleep):
+    """Test that call() retries transient errors and gives up on the attempt limit."""
+    failures = [_status_error(529), _status_error(503)]
+
+    def flaky():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    assert RetryPolicy(max_attempts=3).call(flaky) == "ok"
+    assert len(no_sleep) == 2
+
+    with pytest.raises(anthropic.APIStatusError):
+        RetryPolicy(max_attempts=1).call(lambda: (_ for _ in ()).throw(_status_error(529)))
+
+
+def test_agent_recovers_from_overload(server_agent, no_sleep):
+    """Test that a 529 is retried after the server's retry-after delay."""
+    with FaultServer([("status", 529, 2), ("ok", "All done.")]) as server:
+        agent = server_agent(server)
+        agent._append_message({"role": "user", "content": "hi"})
+        parser = agent._stream_request()
+
+    assert parser.get_text().strip() == "All done."
+    assert len(server.requests) == 2
+    assert no_sleep == [2.0]
+    assert agent.metrics.counter_total("agent_retries_total") == 1
+
+
+def test_agent_resumes_dropped_stream_with_prefill(server_agent, no_sleep, tmp_path):
+    """Test that a stream cut mid-utensil is continued from its partial text."""
+    cut = UTENSIL_RESPONSE.index("file_path") + 5
+    with FaultServer([
+        ("drop", UTENSIL_RESPONSE, cut),
+        ("ok", UTENSIL_RESPONSE[cut:]),
+    ]) as server:
+        agent = server_agent(server)
+        agent._append_message({"role": "user", "content": "read notes"})
+        parser = agent._stream_request()
+
+    prefill = server.requests[1]["messages"][-1]
+    assert prefill["role"] == "assistant"
+    assert UTENSIL_RESPONSE.startswith(prefill["content"])
+    assert not prefill["content"][-1].isspace()
+
+    calls = parser.get_all_utensil_calls()
+    assert [c["name"] for c in calls] == ["read_file"]
+    assert calls[0]["params"] == {"file_path": "notes.txt"}
+    assert agent.metrics.counter_total("agent_resumed_streams_total") == 1
+
+
+def test_non_transient_error_is_raised(server_agent, no_sleep):
+    """Test that client errors are not retried."""
+    with FaultServer([("status", 400, None)]) as server:
+        agent = server_agent(server)
+        agent._append_message({"role": "user", "content": "hi"})
+        with pytest.raises(anthropic.BadRequestError):
+            agent._stream_request()
+
+    assert len(server.requests) == 1
+    assert no_sleep == []
@@ -0,0 +1,67 @@
+"""Tests for per-iteration model routing."""
+
+from types import SimpleNamespace
+
+from history import result_block
+from metrics import Metrics
+from model_manager import ModelManager
+from router import ModelRouter
+
+FAST = "claude-haiku-4-5-20251001"
+
+
+def _router(**config):
+    manager = ModelManager()
+    return ModelRouter(manager, Metrics(), {"enabled": True, "fast_model": FAST, **config})
+
+
+def _after_result(body="ok"):
+    return [
+        {"role": "user", "content": "do it"},
+        {"role": "assistant", "content": "UTENSIL:read_file\nPARAM:file_path=a\nEND_UTENSIL"},
+        {"role": "user", "content": [result_block("read_file", body)]},
+    ]
+
+
+def test_user_prompt_goes_to_baseline():
+    """Test that the first iteration of a turn uses the baseline model."""
+    router = _router()
+    decision = router.choose([{"role": "user", "content": "hi"}])
+    assert decision.model == router.model_manager.current_model
+    assert decision.reason == "user_prompt"
+
+
+def test_small_result_iteration_goes_to_fast_model():
+    """Test that a small utensil-result iteration is routed to the fast model."""
+    router = _router()
+    decision = router.choose(_after_result())
+    assert decision.model == FAST and decision.rerouted
+
+
+def test_large_result_and_pinned_model_stay_on_baseline():
+    """Test the large-result guard and that /model pins override routing."""
+    router = _router(max_result_chars=10)
+    assert router.choose(_after_result("x" * 100)).reason == "large_result"
+
+    router = _router()
+    router.model_manager.switch_model(router.model_manager.current_model)
+    assert router.choose(_after_result()).reason == "pinned"
+
+
+def test_failing_fast_model_is_avoided():
+    """Test that format errors from the fast model disable routing to it."""
+    router = _router()
+    router.choose(_after_result())
+    for _ in range(5):
+        router.on_utensil_end(result="Error: Unknown utensil 'reed_file'")
+    assert router.choose(_after_result()).reason == "fast_model_failing"
+
+
+def test_savings_recorded_against_baseline():
+    """Test that cost saved is computed from both models' prices."""
+    router = _router()
+    router.choose(_after_result())
+    usage = SimpleNamespace(input_tokens=1_000_000, output_tokens=0)
+    router.on_request_end(model=FAST, ttft_seconds=0.5, usage=usage)
+    # Sonnet input is $3/MTok, Haiku $1/MTok
+    assert router.metrics.counter_total("agent_router_saved_usd_total") == 2.0
@@ -0,0 +1,60 @@
+"""Tests for lazy imports and the cached config."""
+
+import os
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+from model_manager import load_config
+
+ROOT = Path(__file__).parent.parent
+
+
+def test_heavy_modules_are_not_imported_at_startup():
+    """Test that creating an agent imports neither the SDK nor other deferred modules."""
+    code = (
+        "import sys, main\n"
+        "from agent import Agent\n"
+        "from commands import CommandHandler\n"
+        "CommandHandler(Agent())\n"
+        "print(' '.join(m for m in ('anthropic', 'dotenv', 'toml', 'readline', 'cProfile', 'numpy') if m in sys.modules))\n"
+    )
+    env = {**os.environ, "ANTHROPIC_API_KEY": "test-key"}
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_client_is_created_on_first_use(fake_agent):
+    """Test that the agent builds its client lazily."""
+    from agent import Agent
+    agent = Agent()
+    assert agent._client is None
+    assert agent.client is not None
+
+
+def test_config_is_cached_until_file_changes(tmp_path):
+    """Test that an unchanged config file is parsed once and re-parsed after an edit."""
+    path = tmp_path / "config.toml"
+    path.write_text('[model]\nname = "a"\n')
+    first = load_config(str(path))
+    assert load_config(str(path)) is first
+
+    path.write_text('[model]\nname = "bb"\n')
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000))
+    assert load_config(str(path))["model"]["name"] == "bb"
+
+
+def test_python_pool_starts_after_the_prompt(fake_agent, monkeypatch):
+    """Test that the worker pool prestart waits for the REPL prompt instead of competing with startup."""
+    import main
+
+    started = threading.Event()
+    monkeypatch.setattr(main, "get_pool", lambda: SimpleNamespace(start=started.set))
+    prompt_shown = threading.Event()
+    main.prestart_python(fake_agent([]), prompt_shown)
+    assert not started.wait(0.1)
+    prompt_shown.set()
+    assert started.wait(2)
@@ -259,3 +259,28 @@ if __name__ == "__main__":
     test_get_utensil_call_pops_from_queue()
 
     print("\n✅ All tests passed!")
+
+
+def test_fake_result_after_batch_detected_and_discarded():
+    """Test that an invented result after END_UTENSIL is flagged and can be discarded."""
+    parser = StreamingUtensilParser()
+    text = ("Reading it.\nUTENSIL:read_file\nPARAM:file_path=a.txt\nEND_UTENSIL\n"
+            "\n[Result of read_file]\nhello\npartial")
+    for token in text:
+        parser.add_token(token)
+
+    assert parser.fake_result_detected
+    discarded = parser.discard_trailing_text()
+    assert "[Result of read_file]" in discarded and discarded.endswith("partial")
+
+    parser.finalize()
+    assert parser.get_text() == "Reading it."
+    assert parser.utensil_count() == 1
+
+
+def test_result_prefix_without_utensil_not_flagged():
+    """Test that result-like text before any utensil call is not flagged."""
+    parser = StreamingUtensilParser()
+    for token in "[Result of thinking] nothing\n":
+        parser.add_token(token)
+    assert not parser.fake_result_detected
@@ -0,0 +1,129 @@
+"""Tests for parallel sub-agents started with spawn_agents."""
+
+import threading
+
+import pytest
+
+from tests.conftest import FakeStream
+from edits import format_call
+from ratelimit import Priority
+from subagents import TokenBudget, TokenBudgetExceeded, split_tasks
+
+
+class RoutingClient:
+    """Fake client that answers each request with respond(request); safe to call from several threads."""
+
+    def __init__(self, respond, input_tokens=10):
+        self.respond = respond
+        self.input_tokens = input_tokens
+        self.requests = []
+        self.messages = self
+        self.lock = threading.Lock()
+
+    def stream(self, **kwargs):
+        with self.lock:
+            self.requests.append(kwargs)
+        return FakeStream(self.respond(kwargs), input_tokens=self.input_tokens)
+
+
+def first_prompt(request):
+    return request["messages"][0]["content"]
+
+
+def spawn_call(tasks, **params):
+    return format_call("spawn_agents", {"tasks": "\n---\n".join(tasks), **params})
+
+
+def test_split_tasks():
+    assert split_tasks("fix a\n---\n\n  fix b\nin detail\n-----\n---\n") == ["fix a", "fix b\nin detail"]
+
+
+def test_children_run_in_parallel_and_answers_are_combined(fake_agent):
+    agent = fake_agent([])
+    barrier = threading.Barrier(2, timeout=5)
+
+    def respond(request):
+        prompt = first_prompt(request)
+        if "sub-agent" not in prompt:
+            return spawn_call(["update package alpha", "update package beta"],
+                              instructions="Keep changes small.") if len(request["messages"]) == 1 else "Both done."
+        # Both children must be streaming at once to get past the barrier
+        barrier.wait()
+        return "alpha updated" if "alpha" in prompt else "beta updated"
+
+    agent.client = RoutingClient(respond)
+    assert agent.run_with_utensils("update every package") == "Both done."
+
+    child_prompts = [first_prompt(r) for r in agent.client.requests if "sub-agent" in first_prompt(r)]
+    assert len(child_prompts) == 2
+    assert all("Keep changes small." in prompt for prompt in child_prompts)
+    assert not any("beta" in prompt for prompt in child_prompts if "alpha" in prompt)
+
+    result = agent.message_history[-1]["content"][0]["text"]
+    assert result.startswith("[Result of spawn_agents]\n[2 sub-agents: 2 done; ")
+    assert "### 1. update package alpha (done" in result and "alpha updated" in result
+    assert result.index("alpha updated") < result.index("beta updated")
+    # Children keep their own history; the parent only sees the combined result
+    assert len(agent.message_history) == 3
+
+
+def test_children_share_client_and_metrics_at_bulk_priority(fake_agent):
+    agent = fake_agent([])
+    child = agent.spawn_child(token_budget=100)
+    assert child.client is agent.client
+    assert child.metrics is agent.metrics
+    assert child.model_manager is agent.model_manager
+    assert child.rate_limiter is agent.rate_limiter
+    assert child.priority == Priority.BULK
+    assert child.depth == 1 and child.quiet
+    assert child.message_history == []
+
+
+def test_child_stops_at_token_budget(fake_agent):
+    agent = fake_agent([])
+
+    def respond(request):
+        prompt = first_prompt(request)
+        if "sub-agent" not in prompt:
+            if len(request["messages"]) == 1:
+                return spawn_call(["read forever"], token_budget="500", max_parallel="8")
+            return "Gave up."
+        return "Reading the spec.\n\n" + format_call("read_file", {"file_path": "missing.txt"})
+
+    agent.client = RoutingClient(respond, input_tokens=300)
+    agent.run_with_utensils("go")
+    result = agent.message_history[-1]["content"][0]["text"]
+    assert "1 stopped at their token budget" in result
+    assert "Stopped: used " in result and "of 500 tokens in 2 requests" in result
+    assert "Last progress:\nReading the spec." in result
+
+
+def test_budget_and_depth_limits():
+    budget = TokenBudget(100)
+    budget.on_request_end(usage=type("Usage", (), {"input_tokens": 60, "output_tokens": 40})())
+    with pytest.raises(TokenBudgetExceeded):
+        budget.check()
+    TokenBudget(0).check()
+
+
+def test_sub_agents_cannot_spawn_further(fake_agent):
+    agent = fake_agent([])
+    agent.model_manager.config.setdefault("subagents", {})["max_depth"] = 1
+
+    def respond(request):
+        prompt = first_prompt(request)
+        if "sub-agent" not in prompt:
+            return spawn_call(["split again"]) if len(request["messages"]) == 1 else "ok"
+        if len(request["messages"]) == 1:
+            return spawn_call(["nested"])
+        return "could not nest: " + request["messages"][-1]["content"][0]["text"]
+
+    agent.client = RoutingClient(respond)
+    agent.run_with_utensils("go")
+    result = agent.message_history[-1]["content"][0]["text"]
+    assert "Error: sub-agents cannot start further sub-agents" in result
+
+
+def test_spawn_agents_outside_an_agent():
+    from utensils import execute_utensil
+    assert execute_utensil("spawn_agents", {"tasks": "a"}) == "Error: spawn_agents can only be called by an agent"
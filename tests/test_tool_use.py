@@ -0,0 +1,265 @@
+"""Tests for the native tool-use protocol and the protocol benchmark."""
+
+import importlib.util
+import os
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+from tests.conftest import FakeClient, FakeStream
+from edits import format_call
+from history import elide_stale_results
+from registry import PARALLEL, SERIAL, Param, Utensil, UtensilRegistry
+from tool_use import ToolUseParser
+from utensils import REGISTRY
+
+ROOT = Path(__file__).parent.parent
+
+
+def tool_use(tool_use_id, name, **params):
+    return {"id": tool_use_id, "name": name, "input": params}
+
+
+def events(parts):
+    """Stream events for a response made of text and tool_use blocks."""
+    for index, part in enumerate(parts):
+        if isinstance(part, str):
+            yield SimpleNamespace(type="content_block_start", index=index,
+                                  content_block=SimpleNamespace(type="text", text=""))
+            for i in range(0, len(part), 4):
+                yield SimpleNamespace(type="text", text=part[i:i + 4])
+            yield SimpleNamespace(type="content_block_stop", index=index,
+                                  content_block=SimpleNamespace(type="text", text=part))
+        else:
+            block = SimpleNamespace(type="tool_use", **part)
+            yield SimpleNamespace(type="content_block_start", index=index,
+                                  content_block=SimpleNamespace(type="tool_use", id=part["id"],
+                                                                name=part["name"], input={}))
+            yield SimpleNamespace(type="content_block_stop", index=index, content_block=block)
+
+
+class ToolStream(FakeStream):
+    """FakeStream that also yields the SDK's events, including tool_use blocks."""
+
+    def __init__(self, parts):
+        super().__init__("".join(part for part in parts if isinstance(part, str)))
+        self.parts = parts
+
+    def __iter__(self):
+        return events(self.parts)
+
+    def get_final_message(self):
+        uses_tools = any(not isinstance(part, str) for part in self.parts)
+        return SimpleNamespace(usage=self.usage, stop_reason="tool_use" if uses_tools else "end_turn")
+
+
+class ToolClient(FakeClient):
+    """Fake client replaying responses given as lists of text and tool_use blocks."""
+
+    def stream(self, **kwargs):
+        self.requests.append(kwargs)
+        parts = self.responses.pop(0)
+        self.last_stream = ToolStream([parts] if isinstance(parts, str) else parts)
+        return self.last_stream
+
+
+def tools_agent(fake_agent, responses):
+    agent = fake_agent([])
+    agent.set_protocol("tools")
+    agent.client = ToolClient(responses)
+    return agent
+
+
+def test_tool_definitions_follow_the_parameter_schema():
+    registry = UtensilRegistry()
+    registry.register(Utensil("echo", lambda text, count=1, loud=False: text, "Echo text", params=(
+        Param("text", str, multiline=True),
+        Param("count", int, default=1),
+        Param("loud", bool, description="uppercase it", default=False),
+    )))
+    tools = registry.tool_definitions()
+    assert tools == [{
+        "name": "echo",
+        "description": "Echo text",
+        "input_schema": {
+            "type": "object",
+            "properties": {
+                "text": {"type": "string"},
+                "count": {"type": "integer", "description": "default 1"},
+                "loud": {"type": "boolean", "description": "uppercase it (default False)"},
+            },
+            "required": ["text"],
+        },
+    }]
+    assert registry.tool_definitions() is tools
+    # JSON values are accepted as they are; numbers given for string parameters become strings
+    assert registry["echo"].bind({"text": 12, "count": 3, "loud": True}) == {"text": "12", "count": 3, "loud": True}
+
+
+def test_parser_queues_complete_tool_use_blocks():
+    parsed = []
+    parser = ToolUseParser(on_param=lambda name, params: parsed.append(name))
+    parts = ["Reading both.", tool_use("t1", "read_file", file_path="a.py"), tool_use("t2", "list_files")]
+    for token in parser.text_tokens(events(parts)):
+        parser.add_token(token)
+    parser.finalize()
+
+    assert parser.get_text() == "Reading both."
+    assert parsed == ["read_file", "list_files"]
+    calls = parser.get_all_utensil_calls()
+    assert [(c["id"], c["name"], c["params"]) for c in calls] == [
+        ("t1", "read_file", {"file_path": "a.py"}), ("t2", "list_files", {})]
+    assert calls[0]["text"] == format_call("read_file", {"file_path": "a.py"})
+    assert parser.incomplete_calls == 0
+
+    # A stream cut off inside a tool_use block leaves the call incomplete
+    parser = ToolUseParser()
+    cut = list(events([tool_use("t3", "read_file", file_path="a.py")]))[:-1]
+    list(parser.text_tokens(cut))
+    parser.finalize()
+    assert not parser.has_utensil_call()
+    assert parser.incomplete_calls == 1
+
+
+def test_tool_calls_and_results_are_native_blocks(fake_agent, tmp_path):
+    path = tmp_path / "notes.txt"
+    path.write_text("hello\n")
+    agent = tools_agent(fake_agent, [
+        ["Let me look.", tool_use("toolu_1", "read_file", file_path=str(path))],
+        "It says hello.",
+    ])
+    assert agent.run_with_utensils("what is in notes.txt?") == "It says hello."
+
+    first, second = agent.client.requests
+    assert {tool["name"] for tool in first["tools"]} == set(REGISTRY)
+    assert "stop_sequences" not in first
+    assert "UTENSIL:" not in first["system"]
+    assistant, results = second["messages"][1:3]
+    assert assistant["content"] == [
+        {"type": "text", "text": "Let me look."},
+        {"type": "tool_use", "id": "toolu_1", "name": "read_file", "input": {"file_path": str(path)}},
+    ]
+    assert results["content"][0]["tool_use_id"] == "toolu_1"
+    assert "hello" in results["content"][0]["content"]
+    assert "is_error" not in results["content"][0]
+
+
+def test_parallel_calls_run_concurrently_and_serial_calls_alone(fake_agent, monkeypatch):
+    barrier = threading.Barrier(2, timeout=5)
+    order = []
+
+    def meet(label):
+        barrier.wait()
+        order.append(label)
+        return f"met {label}"
+
+    def note(label):
+        order.append(f"note {label}")
+        return "noted"
+
+    monkeypatch.setitem(REGISTRY._utensils, "meet", Utensil("meet", meet, "Wait for a partner", params=(
+        Param("label", str),), read_only=True, concurrency=PARALLEL))
+    monkeypatch.setitem(REGISTRY._utensils, "note", Utensil("note", note, "Write a note", params=(
+        Param("label", str),), concurrency=SERIAL))
+    agent = tools_agent(fake_agent, [
+        [tool_use("a", "meet", label="a"), tool_use("b", "meet", label="b"), tool_use("c", "note", label="c")],
+        "done",
+    ])
+    # Both meet calls must run at once to get past the barrier
+    assert agent.run_with_utensils("go") == "done"
+
+    assert sorted(order[:2]) == ["a", "b"]
+    assert order[2] == "note c"
+    results = agent.client.requests[1]["messages"][2]["content"]
+    assert [(r["tool_use_id"], r["content"]) for r in results] == [("a", "met a"), ("b", "met b"), ("c", "noted")]
+
+
+def test_stale_tool_results_are_elided_keeping_their_ids(fake_agent, tmp_path):
+    path = tmp_path / "big.txt"
+    path.write_text("x" * 1000)
+    agent = tools_agent(fake_agent, [
+        [tool_use("r1", "read_file", file_path=str(path))],
+        [tool_use("r2", "read_file", file_path=str(path))],
+        "read twice",
+    ])
+    agent.run_with_utensils("read it twice")
+
+    elided = elide_stale_results(agent.message_history, max_age_turns=4, min_chars=200)
+    first, second = elided[2]["content"][0], elided[4]["content"][0]
+    assert first["type"] == "tool_result" and first["tool_use_id"] == "r1"
+    assert "elided" in first["content"] and "x" * 100 not in first["content"]
+    assert second["content"].count("x") >= 1000
+
+
+def test_large_writes_are_compacted_in_tool_use_input(fake_agent, tmp_path):
+    path = tmp_path / "module.py"
+    body = "".join(f"value_{i} = {i}\n" for i in range(100))
+    agent = tools_agent(fake_agent, [
+        [tool_use("w1", "write_file", file_path=str(path), content=body)],
+        "written",
+    ])
+    agent.run_with_utensils("write the module")
+
+    assert path.read_text() == body
+    stored = agent.message_history[1]["content"][0]
+    assert stored["id"] == "w1" and stored["input"]["file_path"] == str(path)
+    assert "new file, 100 lines" in stored["input"]["content"]
+
+
+def test_switching_protocol_starts_a_new_conversation(fake_agent):
+    agent = fake_agent(["hello"])
+    agent.run_with_utensils("hi")
+    assert agent.message_history
+    assert agent.set_protocol("utensils") and agent.message_history
+    assert not agent.set_protocol("carrier-pigeon")
+    assert agent.set_protocol("tools")
+    assert agent.message_history == [] and agent.native_tools
+
+
+def test_bad_calls_are_reported_as_parse_failures(fake_agent):
+    failures = []
+
+    class Recorder:
+        def on_parse_failure(self, protocol, reason, **_):
+            failures.append((protocol, reason))
+
+    agent = tools_agent(fake_agent, [[tool_use("x", "no_such_tool")], "sorry"])
+    agent.events.attach(Recorder())
+    agent.run_with_utensils("go")
+    results = agent.message_history[2]["content"]
+    assert results[0]["is_error"] and "Unknown utensil" in results[0]["content"]
+
+    agent = fake_agent(["UTENSIL:read_file\nPARAM:file_path=a.py\n"])
+    agent.events.attach(Recorder())
+    agent.run_with_utensils("go")
+    assert failures == [("tools", "unknown_utensil"), ("utensils", "incomplete_call")]
+
+
+def load_benchmark():
+    spec = importlib.util.spec_from_file_location("protocol_benchmark", ROOT / "scripts" / "protocol_benchmark.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_benchmark_runs_a_task_under_both_protocols(monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+    benchmark = load_benchmark()
+    task = {"name": "greet", "prompt": "write hello.txt", "files": {"src/keep.txt": "keep\n"},
+            "check": "grep -q hello hello.txt && test -f src/keep.txt"}
+    config = str(ROOT / "config.toml")
+    cwd = os.getcwd()
+
+    text = benchmark.run_task(task, "utensils", config, client=FakeClient([
+        format_call("write_file", {"file_path": "hello.txt", "content": "hello\n"}), "Done."]))
+    native = benchmark.run_task(task, "tools", config, client=ToolClient([
+        [tool_use("w", "write_file", file_path="hello.txt", content="hello\n")], "Done."]))
+
+    assert os.getcwd() == cwd
+    for run in (text, native):
+        assert run["status"] == "done" and run["passed"]
+        assert run["turns"] == 2 and run["utensil_calls"] == 1 and run["parse_failures"] == 0
+    summary = benchmark.summarize([text, native])
+    assert list(summary) == ["utensils", "tools"]
+    assert "tools vs utensils: turns +0%" in benchmark.format_report([text, native], summary)
+    assert [task["name"] for task in benchmark.load_suite(benchmark.DEFAULT_SUITE)]
@@ -0,0 +1,95 @@
+"""
+Native tool use: the counterpart of StreamingUtensilParser for the API's tool_use content blocks.
+Text streams through as tokens; each tool_use block becomes a utensil call as soon as the block completes.
+"""
+
+from typing import Callable, Dict, Iterator, Optional
+
+from edits import format_call
+
+
+class ToolUseParser:
+    """
+    Collects the text and tool_use blocks of one streamed response.
+
+    Offers the parts of StreamingUtensilParser's interface the agent loop uses,
+    so both protocols share it. Queued calls also carry the block's ``id``,
+    which their tool_result must name.
+    """
+
+    def __init__(self, on_param: Optional[Callable[[str, dict], None]] = None):
+        """
+        Initialize the parser.
+
+        Args:
+            on_param: Optional callback invoked with (utensil_name, params) when a
+                tool_use block is complete, so read-only calls can start early
+        """
+        self.on_param = on_param
+        self.text_buffer = ""
+        self.utensil_queue = []
+        self.completed_utensils = 0
+        # Native calls cannot be followed by invented results
+        self.fake_result_detected = False
+        # tool_use blocks started but not finished, by content block index
+        self._open_blocks: Dict[int, str] = {}
+        self.incomplete_calls = 0
+
+    def text_tokens(self, stream) -> Iterator[str]:
+        """
+        Iterate a MessageStream's events, yielding text and queueing tool_use blocks as they complete.
+
+        Args:
+            stream: An SDK MessageStream (or anything yielding the same events)
+        """
+        for event in stream:
+            kind = getattr(event, "type", None)
+            if kind == "text":
+                yield event.text
+            elif kind == "content_block_start" and event.content_block.type == "tool_use":
+                self._open_blocks[event.index] = event.content_block.name
+            elif kind == "content_block_stop":
+                block = getattr(event, "content_block", None)
+                if block is not None and block.type == "tool_use":
+                    self._open_blocks.pop(event.index, None)
+                    self.add_tool_use(block.id, block.name, block.input)
+
+    def add_token(self, token: str):
+        self.text_buffer += token
+
+    def add_tool_use(self, tool_use_id: str, name: str, params: dict):
+        """Queue a complete tool_use block as a utensil call."""
+        params = dict(params or {})
+        self.utensil_queue.append({
+            "id": tool_use_id,
+            "name": name,
+            "params": params,
+            # The equivalent text-format call, for logs and history compaction
+            "text": format_call(name, {key: str(value) for key, value in params.items()}),
+        })
+        self.completed_utensils += 1
+        if self.on_param:
+            self.on_param(name, params)
+
+    def has_utensil_call(self) -> bool:
+        return len(self.utensil_queue) > 0
+
+    def get_all_utensil_calls(self) -> list:
+        """Return and clear the queued calls, each with 'id', 'name', 'params' and 'text' keys."""
+        calls = self.utensil_queue
+        self.utensil_queue = []
+        return calls
+
+    def utensil_count(self) -> int:
+        return len(self.utensil_queue)
+
+    def get_text(self) -> str:
+        return self.text_buffer.strip()
+
+    def discard_trailing_text(self) -> str:
+        return ""
+
+    def finalize(self):
+        """Count tool_use blocks the stream ended inside of (e.g. cut off by max_tokens)."""
+        self.incomplete_calls = len(self._open_blocks)
+        self._open_blocks = {}
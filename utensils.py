@@ -1,11 +1,23 @@
 """Utensils (custom tool) definitions and implementations."""
 
 import ast
+import codecs
 import os
+import re
+import selectors
 import subprocess
+import time
 
-import os
-import subprocess
+from gitbatch import (MAX_BLOB_BYTES, GitError, format_time, get_repository, is_binary,
+                      repo_path)
+from journal import BlobStore, blob_directory
+from logsearch import search_log
+from output_filter import active_compressor
+from patch import PatchError, apply_patch_text, patched_paths
+from pyworkers import WorkerError, get_pool
+from retrieval import format_hits, get_index
+from subagents import current_agent, spawn, split_tasks
+from registry import PARALLEL, FunctionView, Param, Utensil, UtensilRegistry
 
 
 def read_file(file_path: str) -> str:
@@ -38,31 +50,93 @@ def write_file(file_path: str, content: str) -> str:
         return f"Error writing file: {str(e)}"
 
 
-def execute_command(command: str) -> str:
-    """Execute a bash command and return its output."""
-    try:
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+COMMAND_TIMEOUT = 30
+# Bytes read from a command's pipe at a time
+READ_CHUNK_BYTES = 1 << 16
 
-        output = []
-        if result.stdout:
-            output.append(result.stdout)
-        if result.stderr:
-            output.append(f"STDERR:\n{result.stderr}")
-        if result.returncode != 0:
-            output.append(f"Exit code: {result.returncode}")
 
-        return "\n".join(output) if output else "Command executed successfully with no output"
+def _pump(proc: subprocess.Popen, sinks: dict, deadline: float):
+    """
+    Read a process's pipes until they close, passing decoded text to ``sinks[pipe]`` as it arrives.
+
+    Raises:
+        subprocess.TimeoutExpired: If the pipes are still open at the deadline
+    """
+    with selectors.DefaultSelector() as selector:
+        for pipe, sink in sinks.items():
+            selector.register(pipe, selectors.EVENT_READ, (sink, codecs.getincrementaldecoder("utf-8")("replace")))
+        while selector.get_map():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(proc.args, COMMAND_TIMEOUT)
+            for key, _ in selector.select(remaining):
+                sink, decoder = key.data
+                data = os.read(key.fd, READ_CHUNK_BYTES)
+                text = decoder.decode(data, final=not data)
+                if not data:
+                    selector.unregister(key.fileobj)
+                if text:
+                    sink(text)
+
+
+def execute_command(command: str) -> str:
+    """
+    Execute a bash command and return its output.
+
+    When the agent compresses this utensil's output, stdout and stderr are fed
+    to the compressor as they are read, so only the kept head and tail of a
+    large output are ever held in memory.
+    """
+    compressor = active_compressor()
+    stdout, stderr = [], []
+    # stderr is shown after stdout, so it is compressed separately until the command ends
+    stderr_compressor = compressor.fresh() if compressor else None
+    try:
+        proc = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            _pump(proc, {
+                proc.stdout: compressor.feed if compressor else stdout.append,
+                proc.stderr: stderr_compressor.feed if compressor else stderr.append,
+            }, time.monotonic() + COMMAND_TIMEOUT)
+            returncode = proc.wait(timeout=COMMAND_TIMEOUT)
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            proc.stdout.close()
+            proc.stderr.close()
     except subprocess.TimeoutExpired:
-        return "Error: Command timed out after 30 seconds"
+        return f"Error: Command timed out after {COMMAND_TIMEOUT} seconds"
     except Exception as e:
         return f"Error executing command: {str(e)}"
 
+    if compressor is None:
+        # Universal newlines, as text-mode pipes would give
+        stdout_text = "".join(stdout).replace("\r\n", "\n").replace("\r", "\n")
+        stderr_text = "".join(stderr).replace("\r\n", "\n").replace("\r", "\n")
+        output = []
+        if stdout_text:
+            output.append(stdout_text)
+        if stderr_text:
+            output.append(f"STDERR:\n{stderr_text}")
+        if returncode != 0:
+            output.append(f"Exit code: {returncode}")
+        return "\n".join(output) if output else "Command executed successfully with no output"
+
+    wrote = compressor.input_bytes > 0
+    if stderr_compressor.input_bytes:
+        compressor.feed(("\n" if wrote else "") + "STDERR:\n" + stderr_compressor.finish() + "\n")
+        # Count stderr's original size, not its compressed size
+        compressor.input_bytes += stderr_compressor.saved_bytes
+        wrote = True
+    if returncode != 0:
+        compressor.feed(("\n" if wrote else "") + f"Exit code: {returncode}")
+        wrote = True
+    if not wrote:
+        compressor.feed("Command executed successfully with no output")
+    return compressor.finish()
+
 
 def edit_file(file_path: str, old_text: str, new_text: str) -> str:
     """
@@ -107,6 +181,352 @@ def edit_file(file_path: str, old_text: str, new_text: str) -> str:
         return f"Error editing file: {str(e)}"
 
 
+def apply_patch(patch: str, fuzz: int = 2) -> str:
+    """
+    Apply a unified diff to one or more files.
+
+    Every hunk of every file is located before anything is written, so a
+    patch either applies completely or leaves all files untouched. Hunks are
+    found near their header line numbers; if the context does not match
+    exactly, whitespace differences are ignored and up to ``fuzz`` context
+    lines at each end of a hunk may be dropped.
+
+    Args:
+        patch: Unified diff text with '--- a/path' / '+++ b/path' headers and '@@' hunks
+        fuzz: Maximum context lines that may be ignored at each end of a hunk
+
+    Returns:
+        Summary of changed files (and any inexact matches) or error description
+    """
+    try:
+        fuzz_lines = int(fuzz)
+    except (TypeError, ValueError):
+        return f"Error: fuzz must be a whole number of lines, got '{fuzz}'"
+
+    try:
+        summaries, notes = apply_patch_text(patch, fuzz=fuzz_lines)
+    except PatchError as e:
+        return f"Error: Patch not applied; no files were changed.\n{e}"
+    except PermissionError as e:
+        return f"Error: Permission denied applying patch: {str(e)}"
+    except Exception as e:
+        return f"Error applying patch: {str(e)}"
+
+    result = ["Successfully applied patch:"] + [f"  {summary}" for summary in summaries]
+    if notes:
+        result += ["Inexact matches (check the result):"] + [f"  {note}" for note in notes]
+    return "\n".join(result)
+
+
+def read_blob(sha256: str) -> str:
+    """
+    Return a file version stored by hash when an edit was compacted in the history.
+
+    Args:
+        sha256: The hash (or its first 12+ characters) shown in the compacted call
+
+    Returns:
+        The stored text or error description
+    """
+    agent = current_agent()
+    store = BlobStore(agent.blob_directory if agent else blob_directory())
+    digest = store.find(sha256.strip().removeprefix("sha256:"))
+    if digest is None:
+        return f"Error: No stored text found for hash '{sha256}'"
+    try:
+        return store.get(digest)
+    except Exception as e:
+        return f"Error reading stored text: {str(e)}"
+
+
+def git_blob(path: str, rev: str = "HEAD", start_line: int = 1, max_lines: int = 400) -> str:
+    """
+    Show a file as it is in a commit, without checking it out.
+
+    Args:
+        path: File path, relative to the current directory
+        rev: Commit, branch or tag to read from
+        start_line: First line to show (1-based)
+        max_lines: Maximum number of lines to show
+
+    Returns:
+        A header line and the requested lines, or error description
+    """
+    try:
+        repository = get_repository(path)
+        relative = repo_path(repository, path)
+        oid, kind, size = repository.resolve(f"{rev}:{relative}")
+        if kind != "blob":
+            return f"Error: '{path}' is a {kind} at {rev}; use git_tree to list it"
+        if size > MAX_BLOB_BYTES:
+            return f"blob {oid[:12]} {relative} at {rev}: {size} bytes, too large to show"
+        _, data = repository.read(oid)
+    except GitError as e:
+        return f"Error: {e}"
+    if is_binary(data):
+        return f"blob {oid[:12]} {relative} at {rev}: binary, {size} bytes"
+
+    lines = data.decode("utf-8", "replace").splitlines()
+    start = max(start_line, 1) - 1
+    shown = lines[start:start + max_lines]
+    header = f"blob {oid[:12]} {relative} at {rev}: {len(lines)} lines, {size} bytes"
+    if start or len(shown) < len(lines):
+        header += f" (showing lines {start + 1}-{start + len(shown)})"
+    result = [header] + shown
+    if start + len(shown) < len(lines):
+        result.append(f"[... {len(lines) - start - len(shown)} more lines; "
+                      f"use start_line={start + len(shown) + 1} to continue]")
+    return "\n".join(result)
+
+
+def git_tree(path: str = ".", rev: str = "HEAD", recursive: bool = False, max_entries: int = 200) -> str:
+    """
+    List a directory as it is in a commit.
+
+    Args:
+        path: Directory path, relative to the current directory
+        rev: Commit, branch or tag to read from
+        recursive: List subdirectories' contents too
+        max_entries: Maximum number of entries to list
+
+    Returns:
+        One "<type> <object id> <path>" line per entry, or error description
+    """
+    try:
+        repository = get_repository(path)
+        relative = repo_path(repository, path)
+        oid, kind, _ = repository.resolve(f"{rev}:{relative}")
+        if kind != "tree":
+            return f"Error: '{path}' is a {kind} at {rev}; use git_blob to read it"
+        entries, total = [], 0
+        pending = [("", oid)]
+        while pending:
+            prefix, tree = pending.pop(0)
+            for entry in repository.tree(tree):
+                total += 1
+                if len(entries) < max_entries:
+                    suffix = "/" if entry.kind == "tree" else ""
+                    entries.append(f"{entry.kind:<6} {entry.oid[:12]} {prefix}{entry.name}{suffix}")
+                if recursive and entry.kind == "tree":
+                    pending.append((f"{prefix}{entry.name}/", entry.oid))
+    except GitError as e:
+        return f"Error: {e}"
+    header = f"tree {oid[:12]} {relative or '.'} at {rev}: {total} entries"
+    result = [header] + entries
+    if total > len(entries):
+        result.append(f"[... {total - len(entries)} more entries not shown]")
+    return "\n".join(result)
+
+
+def git_log(rev: str = "HEAD", path: str = None, max_count: int = 20) -> str:
+    """
+    List commits, newest first.
+
+    Args:
+        rev: Commit, branch or tag to start from
+        path: Only list commits that changed this file or directory
+        max_count: Maximum number of commits to list (at most 200)
+
+    Returns:
+        One "<short id> <date> <author>: <subject>" line per commit, or error description
+    """
+    try:
+        repository = get_repository(path or ".")
+        relative = repo_path(repository, path) if path else ""
+        commits = repository.log(rev, relative, min(max_count, 200))
+    except GitError as e:
+        return f"Error: {e}"
+    if not commits:
+        return f"No commits found for {rev}" + (f" touching '{path}'" if path else "")
+    return "\n".join(f"{c.oid[:12]} {format_time(c.author_time)} {c.author}: {c.subject}" for c in commits)
+
+
+def git_commit(rev: str = "HEAD", max_files: int = 100) -> str:
+    """
+    Show one commit: its metadata, full message and the files it changed.
+
+    Args:
+        rev: Commit, branch or tag to show
+        max_files: Maximum number of changed files to list
+
+    Returns:
+        The commit description or error description
+    """
+    try:
+        repository = get_repository(".")
+        commit = repository.commit(rev)
+        parent = repository.commit(commit.parents[0]) if commit.parents else None
+        changes = repository.changed_paths(parent.tree if parent else None, commit.tree, limit=max_files + 1)
+    except GitError as e:
+        return f"Error: {e}"
+    result = [
+        f"commit {commit.oid}",
+        f"Author: {commit.author}",
+        f"Date:   {format_time(commit.author_time)}",
+    ]
+    if len(commit.parents) > 1:
+        result.append(f"Merge:  {' '.join(p[:12] for p in commit.parents)} (files compared with the first parent)")
+    result += ["", commit.message, "", f"Changed files ({min(len(changes), max_files)}):"]
+    result += [f"  {status} {path}" for status, path in changes[:max_files]]
+    if len(changes) > max_files:
+        result.append(f"  [... more than {max_files} files changed]")
+    return "\n".join(result)
+
+
+def git_status(max_entries: int = 200) -> str:
+    """
+    Show the working tree status: branch, staged, unstaged and untracked files.
+
+    Args:
+        max_entries: Maximum number of files to list per section
+
+    Returns:
+        The status grouped by section, or error description
+    """
+    try:
+        branch, entries = get_repository(".").status()
+    except GitError as e:
+        return f"Error: {e}"
+    except Exception as e:
+        return f"Error running git status: {str(e)}"
+    sections = {"Staged": [], "Unstaged": [], "Untracked": [], "Conflicts": []}
+    for code, path in entries:
+        if code == "??":
+            sections["Untracked"].append(path)
+        elif "U" in code or code in ("AA", "DD"):
+            sections["Conflicts"].append(f"{code} {path}")
+        else:
+            if code[0] != " ":
+                sections["Staged"].append(f"{code[0]} {path}")
+            if code[1] != " ":
+                sections["Unstaged"].append(f"{code[1]} {path}")
+    result = [f"Branch: {branch}" if branch else "Branch: (unknown)"]
+    for title, items in sections.items():
+        if items:
+            result.append(f"{title} ({len(items)}):")
+            result += [f"  {item}" for item in items[:max_entries]]
+            if len(items) > max_entries:
+                result.append(f"  [... {len(items) - max_entries} more]")
+    if not entries:
+        result.append("Working tree clean")
+    return "\n".join(result)
+
+
+def run_python(code: str, timeout: float = None) -> str:
+    """
+    Run a Python snippet on a warm worker interpreter.
+
+    The project directory is importable and common modules are already
+    loaded. The value of a final expression is printed, as in the REPL.
+
+    Args:
+        code: Python source to run
+        timeout: Seconds allowed before the worker is killed (default from [python] in config.toml)
+
+    Returns:
+        Captured stdout and stderr, then any traceback, or error description
+    """
+    try:
+        response = get_pool().run(code, timeout)
+    except TimeoutError as e:
+        return f"Error: run_python {e}; the worker was killed"
+    except WorkerError as e:
+        return f"Error: {e}"
+
+    result = response["output"].rstrip("\n")
+    if response["truncated"]:
+        result += "\n[output truncated]"
+    if response["error"]:
+        result = (result + "\n" if result else "") + response["error"].rstrip("\n")
+    return result or "(no output)"
+
+
+def retrieve(query: str, top_k: int = 5) -> str:
+    """
+    Find the workspace code and text most relevant to a query.
+
+    Uses a BM25 index of the workspace, brought up to date from file mtimes on each call.
+
+    Args:
+        query: Words, identifiers or a description of what to find
+        top_k: Number of chunks to return
+
+    Returns:
+        Line-numbered excerpts, best match first, or a message if nothing matched
+    """
+    try:
+        hits = get_index().retrieve(query, max(1, min(top_k, 20)))
+    except OSError as e:
+        return f"Error updating the search index: {str(e)}"
+    if not hits:
+        return f"No matches for '{query}'"
+    return format_hits(hits)
+
+
+def log_search(path: str, pattern: str = None, literal: bool = False, ignore_case: bool = False,
+               since: str = None, until: str = None, start_offset: int = None, end_offset: int = None,
+               context: int = 2, max_hits: int = 30, newest_first: bool = False, lines: int = 50,
+               follow: float = 0) -> str:
+    """
+    Search or page through a large log file without reading it into memory.
+
+    The file is memory-mapped. Output lines are prefixed with their byte
+    offsets, which can be passed back as start_offset or end_offset to page.
+
+    Args:
+        path: Log file path
+        pattern: Regular expression (or text with literal) to find; without one, lines are shown
+        literal: Match pattern as plain text
+        ignore_case: Match case-insensitively
+        since: Only lines stamped at or after this time (a timestamp, a date, or "-15m" before the newest line)
+        until: Only lines stamped at or before this time
+        start_offset: Byte offset to start from
+        end_offset: Byte offset to stop at
+        context: Lines shown before and after each matching line
+        max_hits: Distinct matching lines to show; lines differing only in numbers and ids are counted, not shown
+        newest_first: Search backwards from the end of the range
+        lines: Lines shown without a pattern: the last ones, or the first ones from start_offset or since
+        follow: Seconds to wait for the file to grow past start_offset (or its current end) first
+
+    Returns:
+        A header line and the matching lines with context, or error description
+    """
+    try:
+        return search_log(path, pattern, literal, ignore_case, since, until, start_offset, end_offset,
+                          context, max_hits, newest_first, lines, follow)
+    except FileNotFoundError:
+        return f"Error: File not found at path '{path}'"
+    except re.error as e:
+        return f"Error: Invalid pattern '{pattern}': {e}"
+    except (OSError, ValueError) as e:
+        return f"Error: {e}"
+
+
+def spawn_agents(tasks: str, instructions: str = None, max_parallel: int = None, token_budget: int = None) -> str:
+    """
+    Run independent parts of a task in parallel, one sub-agent per part.
+
+    Each sub-agent has its own history and sees only its task and the shared
+    instructions. Only their final answers are returned.
+
+    Args:
+        tasks: Task descriptions, separated by lines containing only ---
+        instructions: Context and instructions for every sub-agent
+        max_parallel: Sub-agents running at the same time (capped by [subagents] in config.toml)
+        token_budget: Tokens each sub-agent may use (capped by [subagents] in config.toml)
+
+    Returns:
+        A summary line and each sub-agent's final answer, or error description
+    """
+    parent = current_agent()
+    if parent is None:
+        return "Error: spawn_agents can only be called by an agent"
+    try:
+        return spawn(parent, split_tasks(tasks), instructions, max_parallel, token_budget)
+    except ValueError as e:
+        return f"Error: {e}"
+
+
 def validate_python(code: str = None, file_path: str = None) -> str:
     """
     Validate Python code for syntax correctness.
@@ -186,24 +606,166 @@ def validate_python(code: str = None, file_path: str = None) -> str:
         return f"Error validating Python: {str(e)}"
 
 
-# Map utensil names to their implementation functions
-UTENSIL_FUNCTIONS = {
-    "read_file": read_file,
-    "write_file": write_file,
-    "execute_command": execute_command,
-    "edit_file": edit_file,
-    "validate_python": validate_python,
-}
+# Every built-in utensil; plugins are added lazily from entry points or [utensils] plugins in config.toml
+REGISTRY = UtensilRegistry()
+
+REGISTRY.register(Utensil(
+    "read_file", read_file, "Read file contents",
+    (Param("file_path"),),
+    read_only=True, concurrency=PARALLEL, path_param="file_path", elidable=True,
+))
+REGISTRY.register(Utensil(
+    "write_file", write_file, "Write to a file (use for NEW files only)",
+    (Param("file_path"), Param("content", multiline=True)),
+    path_param="file_path",
+))
+REGISTRY.register(Utensil(
+    "edit_file", edit_file, "Edit an existing file by replacing text (PREFERRED for modifications)",
+    (Param("file_path"),
+     Param("old_text", description="exact text to replace, unique in the file", multiline=True),
+     Param("new_text", multiline=True)),
+    path_param="file_path",
+))
+REGISTRY.register(Utensil(
+    "apply_patch", apply_patch, "Apply a unified diff to one or more existing files",
+    (Param("patch", multiline=True),
+     Param("fuzz", int, description="context lines that may mismatch at each hunk edge", default=2)),
+    paths=lambda params: patched_paths(params.get("patch", "")),
+))
+REGISTRY.register(Utensil(
+    "read_blob", read_blob,
+    "Show the full text of a file version that appears only as a sha256 hash in an earlier "
+    "write_file/edit_file call",
+    (Param("sha256"),),
+    read_only=True, concurrency=PARALLEL, elidable=True,
+))
+REGISTRY.register(Utensil(
+    "retrieve", retrieve,
+    "Search the workspace for the code and text most relevant to a query (ranked by BM25); "
+    "use it instead of guessing which files to read",
+    (Param("query"), Param("top_k", int, default=5)),
+    read_only=True, concurrency=PARALLEL, elidable=True,
+))
+REGISTRY.register(Utensil(
+    "log_search", log_search,
+    "Search a large log file by regex or text, or show its last lines, without loading it "
+    "(use instead of read_file or grep on logs). Output lines start with @byte offsets; pass them back as "
+    "start_offset/end_offset to page. since/until take timestamps, dates or \"-15m\"-style times before the newest line",
+    (Param("path"), Param("pattern", default=None), Param("literal", bool, default=False),
+     Param("ignore_case", bool, default=False), Param("since", default=None), Param("until", default=None),
+     Param("start_offset", int, default=None), Param("end_offset", int, default=None),
+     Param("context", int, description="lines around each hit", default=2),
+     Param("max_hits", int, default=30), Param("newest_first", bool, default=False),
+     Param("lines", int, description="lines shown when there is no pattern", default=50),
+     Param("follow", float, description="seconds to wait for new lines after start_offset", default=0)),
+    read_only=True, concurrency=PARALLEL, elidable=True,
+))
+REGISTRY.register(Utensil(
+    "execute_command", execute_command, "Run a bash command",
+    (Param("command"),),
+    elidable=True,
+))
+REGISTRY.register(Utensil(
+    "git_blob", git_blob, "Show a file as it is in a commit (faster than git show through execute_command)",
+    (Param("path"), Param("rev", default="HEAD"), Param("start_line", int, default=1),
+     Param("max_lines", int, default=400)),
+    read_only=True, concurrency=PARALLEL, elidable=True,
+))
+REGISTRY.register(Utensil(
+    "git_tree", git_tree, "List a directory as it is in a commit",
+    (Param("path", default="."), Param("rev", default="HEAD"), Param("recursive", bool, default=False),
+     Param("max_entries", int, default=200)),
+    read_only=True, concurrency=PARALLEL, elidable=True,
+))
+REGISTRY.register(Utensil(
+    "git_log", git_log, "List commits, newest first, optionally only those touching a path",
+    (Param("rev", default="HEAD"), Param("path", default=None), Param("max_count", int, default=20)),
+    read_only=True, concurrency=PARALLEL, elidable=True,
+))
+REGISTRY.register(Utensil(
+    "git_commit", git_commit, "Show a commit's author, date, message and changed files",
+    (Param("rev", default="HEAD"), Param("max_files", int, default=100)),
+    read_only=True, concurrency=PARALLEL, elidable=True,
+))
+REGISTRY.register(Utensil(
+    "git_status", git_status, "Show the branch and the staged, unstaged and untracked files",
+    (Param("max_entries", int, default=200),),
+    read_only=True, concurrency=PARALLEL, elidable=True,
+))
+REGISTRY.register(Utensil(
+    "run_python", run_python,
+    "Run a Python snippet on a warm interpreter with the project importable (faster than python -c); "
+    "the value of a final expression is printed",
+    (Param("code", multiline=True), Param("timeout", float, description="seconds", default=None)),
+    elidable=True,
+))
+REGISTRY.register(Utensil(
+    "spawn_agents", spawn_agents,
+    "Split a task into independent parts and run one sub-agent per part in parallel, each with its own "
+    "history; returns their final answers. Use it when parts need no coordination, e.g. the same change "
+    "in several packages",
+    (Param("tasks", description="one task per part, separated by lines containing only ---", multiline=True),
+     Param("instructions", description="shared context for every sub-agent", default=None, multiline=True),
+     Param("max_parallel", int, default=None), Param("token_budget", int, description="per sub-agent",
+                                                    default=None)),
+))
+REGISTRY.register(Utensil(
+    "validate_python", validate_python,
+    "Check if Python code is syntactically correct. Give either code or file_path, not both",
+    (Param("code", multiline=True, default=None), Param("file_path", default=None)),
+    read_only=True, concurrency=PARALLEL, path_param="file_path", elidable=True,
+))
+
+# Name-to-function view of the registry, kept for callers that predate it
+UTENSIL_FUNCTIONS = FunctionView(REGISTRY)
 
 
 def get_utensils_system_prompt() -> str:
     """
     Generate the system prompt that instructs Claude on how to use utensils.
 
+    The utensil list is generated from REGISTRY and cached there.
+
     Returns:
         A formatted system prompt string describing the utensil format and available utensils
     """
-    return """You are an agent that can use utensils (tools) to complete tasks. You MUST use utensils to interact with files and the system.
+    return (UTENSILS_PROMPT.replace("{utensil_list}", REGISTRY.prompt_section())
+            .replace("{editing_guidance}", EDITING_GUIDANCE))
+
+
+def get_tools_system_prompt() -> str:
+    """
+    Generate the system prompt for the native tool use protocol.
+
+    The utensils themselves are sent as tool definitions (REGISTRY.tool_definitions()).
+
+    Returns:
+        A system prompt string with the guidance shared with the utensil format
+    """
+    return TOOLS_PROMPT.replace("{editing_guidance}", EDITING_GUIDANCE.replace("utensils", "tools"))
+
+
+# Editing and history guidance shared by both protocols' prompts
+EDITING_GUIDANCE = """IMPORTANT: When modifying existing files, ALWAYS use edit_file or apply_patch instead of write_file. This prevents accidental truncation or data loss.
+IMPORTANT: To inspect git history or status, use the git_* utensils rather than running git through execute_command. They are faster and their output is bounded.
+
+Earlier write_file and edit_file calls in this conversation may appear shortened, with the file content replaced by a hash or a diff. This only saves space in the history. Your own calls must always contain the complete content. Use read_blob or read_file if you need the full text again.
+
+Choosing between edit_file and apply_patch:
+- Use edit_file for one small, self-contained change.
+- Use apply_patch for several changes in one file, or changes across several files. A diff repeats only about 3 lines of context around each change, instead of the full old and new text, so it is much shorter to write.
+- apply_patch checks every hunk before writing anything. If one hunk does not match, no file is changed, and the error names the failing hunk so you can fix it and resend the whole patch."""
+
+TOOLS_PROMPT = """You are an agent that can use tools to complete tasks. You MUST use tools to interact with files and the system.
+
+CRITICAL: When you need to read a file, write a file, or run a command, you MUST call a tool. You cannot complete these tasks without tools.
+
+When several calls do not depend on each other (for example reading several files), make them all in the same response; read-only calls run in parallel.
+
+{editing_guidance}"""
+
+
+UTENSILS_PROMPT = """You are an agent that can use utensils (tools) to complete tasks. You MUST use utensils to interact with files and the system.
 
 CRITICAL: When you need to read a file, write a file, or run a command, you MUST use a utensil. You cannot complete these tasks without using utensils.
 
@@ -225,16 +787,12 @@ if __name__ == "__main__":
 END_VALUE
 END_UTENSIL
 
-Available utensils:
-- read_file: Read file contents. Parameters: file_path
-- write_file: Write to a file (use for NEW files only). Parameters: file_path, content (use BEGIN_VALUE/END_VALUE for multi-line content)
-- edit_file: Edit an existing file by replacing text (PREFERRED for modifications). Parameters: file_path, old_text, new_text (use BEGIN_VALUE/END_VALUE for multi-line values)
-- execute_command: Run a bash command. Parameters: command
-- validate_python: Check if Python code is syntactically correct. Parameters: Either 'code' (string) OR 'file_path' (string), not both. Use BEGIN_VALUE/END_VALUE for multi-line code.
+Available utensils (use BEGIN_VALUE/END_VALUE for parameters marked multi-line):
+{utensil_list}
 
 IMPORTANT: Do NOT use Anthropic's tool use format. Use ONLY the format shown above.
 IMPORTANT: For multi-line content, you MUST use BEGIN_VALUE and END_VALUE.
-IMPORTANT: When modifying existing files, ALWAYS use edit_file instead of write_file. This prevents accidental truncation or data loss.
+{editing_guidance}
 
 Example - reading a file:
 User asks: "read the file test.txt"
@@ -271,21 +829,28 @@ PARAM:old_text=print("Hello!")
 PARAM:new_text=print("Hello, World!")
 END_UTENSIL
 
-def greet():
-    try:
-        print("Hello, World!")
-    except Exception as e:
-        print(f"Error: {e}")
-END_VALUE
-PARAM:new_text=BEGIN_VALUE
-def greet():
-    try:
-        print("Hello, World!")
-    except Exception as e:
-        print(f"Error: {e}")
+Example - changing several places in one or more files:
+UTENSIL:apply_patch
+PARAM:patch=BEGIN_VALUE
+--- a/greeting.py
++++ b/greeting.py
+@@ -1,4 +1,4 @@
+ def greet():
+-    print("Hello!")
++    print("Hello, World!")
+ 
+ greet()
+--- a/main.py
++++ b/main.py
+@@ -10,3 +10,4 @@
+ import sys
++from greeting import greet
+ 
+ def main():
 END_VALUE
 END_UTENSIL
 
+After END_UTENSIL, stop and wait. Never write the utensil's result yourself.
 Then you'll receive the result and can respond with confirmation or analysis."""
 
 
@@ -293,6 +858,9 @@ def execute_utensil(name: str, params: dict) -> str:
     """
     Execute a utensil by name with the given parameters.
 
+    Parameters are checked against the utensil's schema and converted to
+    their declared types before the call.
+
     Args:
         name: The name of the utensil to execute
         params: Dictionary of parameters to pass to the utensil
@@ -300,13 +868,4 @@ def execute_utensil(name: str, params: dict) -> str:
     Returns:
         The result of the utensil execution as a string
     """
-    if name not in UTENSIL_FUNCTIONS:
-        return f"Error: Unknown utensil '{name}'"
-
-    try:
-        utensil_func = UTENSIL_FUNCTIONS[name]
-        return utensil_func(**params)
-    except TypeError as e:
-        return f"Error: Invalid arguments for utensil '{name}': {str(e)}"
-    except Exception as e:
-        return f"Error executing utensil '{name}': {str(e)}"
\ No newline at end of file
+    return REGISTRY.execute(name, params)